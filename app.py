@@ -1,369 +1,96 @@
-from flask import Flask, render_template, request, jsonify, send_file
-from models import db, Book, Author, Publisher, Series, Genre, Topic, Category, RecommendedBook
-from sqlalchemy import func, or_
+from flask import Flask
+from models import db
+from instrumentation import instrument
+from pooling import engine_options, env_flag
+from async_queries import init_async_queries
+from catalogue import init_catalogue
+from json_provider import FastJSONProvider
+from compression import init_compression
+from assets import init_assets
+from jobs import init_jobs
+from replicas import init_replicas
+import book_routes
+import reference_routes
+import library_routes
+import transfer_routes
+import commands
 import os
 from dotenv import load_dotenv
-import csv
-import json
-import io
-from datetime import datetime
-from collections import Counter
 
-load_dotenv()
-
-app = Flask(__name__,
-            template_folder='app/templates',
-            static_folder='app/static')
-
-database_url = os.getenv('DATABASE_URL', 'postgresql://localhost/library_db')
-if database_url.startswith('postgres://'):
-    database_url = database_url.replace('postgres://', 'postgresql://', 1)
-
-app.config['SQLALCHEMY_DATABASE_URI'] = database_url
-app.config['SECRET_KEY'] = os.getenv('SECRET_KEY', 'dev-key-change-me')
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-
-db.init_app(app)
-@app.route('/')
-def index():
-    return render_template('index.html')
-@app.route('/api/books', methods=['GET'])
-def get_books():
-    search = request.args.get('search', '')
-    status = request.args.get('status', '')
-
-    query = Book.query
-
-    if search:
-        query = query.filter(or_(
-            Book.title.ilike(f'%{search}%'),
-            Book.description.ilike(f'%{search}%')
-        ))
-
-    if status:
-        query = query.filter(Book.reading_status == status)
-
-    books = query.all()
-    return jsonify([{
-        'id': b.id,
-        'title': b.title,
-        'isbn': b.isbn,
-        'publication_year': b.publication_year,
-        'pages': b.pages,
-        'reading_status': b.reading_status,
-        'current_page': b.current_page,
-        'rating': b.rating,
-        'publisher': {'id': b.publisher.id, 'name': b.publisher.name} if b.publisher else None,
-        'authors': [{'id': a.id, 'name': f'{a.first_name} {a.last_name}'} for a in b.authors],
-        'genres': [{'id': g.id, 'name': g.name} for g in b.genres],
-        'series': {'id': b.series.id, 'name': b.series.name} if b.series else None,
-        'category': {'id': b.category.id, 'name': b.category.name} if b.category else None
-    } for b in books])
-
-
-@app.route('/api/books/<int:id>', methods=['GET'])
-def get_book(id):
-    book = Book.query.get_or_404(id)
-    return jsonify({
-        'id': book.id,
-        'title': book.title,
-        'isbn': book.isbn,
-        'publication_year': book.publication_year,
-        'pages': book.pages,
-        'language': book.language,
-        'description': book.description,
-        'reading_status': book.reading_status,
-        'current_page': book.current_page,
-        'notes': book.notes,
-        'rating': book.rating,
-        'date_started': book.date_started.isoformat() if book.date_started else None,
-        'date_completed': book.date_completed.isoformat() if book.date_completed else None,
-        'publisher_id': book.publisher_id,
-        'series_id': book.series_id,
-        'series_position': book.series_position,
-        'category_id': book.category_id,
-        'author_ids': [a.id for a in book.authors],
-        'genre_ids': [g.id for g in book.genres],
-        'topic_ids': [t.id for t in book.topics]
-    })
-
-
-@app.route('/api/books', methods=['POST'])
-def create_book():
-    data = request.json
-    book = Book(
-        title=data['title'],
-        isbn=data.get('isbn'),
-        publication_year=data.get('publication_year'),
-        pages=data.get('pages'),
-        language=data.get('language'),
-        description=data.get('description'),
-        publisher_id=data['publisher_id'],
-        series_id=data.get('series_id'),
-        series_position=data.get('series_position'),
-        category_id=data.get('category_id'),
-        reading_status=data.get('reading_status', 'unread')
-    )
-
-    if 'author_ids' in data:
-        book.authors = Author.query.filter(Author.id.in_(data['author_ids'])).all()
-    if 'genre_ids' in data:
-        book.genres = Genre.query.filter(Genre.id.in_(data['genre_ids'])).all()
-    if 'topic_ids' in data:
-        book.topics = Topic.query.filter(Topic.id.in_(data['topic_ids'])).all()
-
-    db.session.add(book)
-    db.session.commit()
-
-    return jsonify({'id': book.id, 'message': 'Book created'}), 201
-
-
-@app.route('/api/books/<int:id>', methods=['PUT'])
-def update_book(id):
-    book = Book.query.get_or_404(id)
-    data = request.json
-
-    for field in ['title', 'isbn', 'publication_year', 'pages', 'language',
-                  'description', 'publisher_id', 'series_id', 'series_position',
-                  'category_id', 'reading_status', 'current_page', 'notes', 'rating']:
-        if field in data:
-            setattr(book, field, data[field])
-
-    if 'author_ids' in data:
-        book.authors = Author.query.filter(Author.id.in_(data['author_ids'])).all()
-    if 'genre_ids' in data:
-        book.genres = Genre.query.filter(Genre.id.in_(data['genre_ids'])).all()
-    if 'topic_ids' in data:
-        book.topics = Topic.query.filter(Topic.id.in_(data['topic_ids'])).all()
-
-    db.session.commit()
-    return jsonify({'message': 'Book updated'})
-
-
-@app.route('/api/books/<int:id>', methods=['DELETE'])
-def delete_book(id):
-    book = Book.query.get_or_404(id)
-    db.session.delete(book)
-    db.session.commit()
-    return '', 204
-@app.route('/api/authors', methods=['GET', 'POST'])
-def authors():
-    if request.method == 'GET':
-        authors = Author.query.all()
-        return jsonify([{'id': a.id, 'first_name': a.first_name, 'last_name': a.last_name, 'full_name': f'{a.first_name} {a.last_name}'} for a in authors])
-    else:
-        data = request.json
-        author = Author(first_name=data['first_name'], last_name=data['last_name'], biography=data.get('biography'))
-        db.session.add(author)
-        db.session.commit()
-        return jsonify({'id': author.id}), 201
-
-
-@app.route('/api/authors/<int:id>', methods=['PUT', 'DELETE'])
-def author(id):
-    author = Author.query.get_or_404(id)
-    if request.method == 'PUT':
-        data = request.json
-        author.first_name = data.get('first_name', author.first_name)
-        author.last_name = data.get('last_name', author.last_name)
-        author.biography = data.get('biography', author.biography)
-        db.session.commit()
-        return jsonify({'message': 'Author updated'})
-    else:
-        db.session.delete(author)
-        db.session.commit()
-        return '', 204
-@app.route('/api/publishers', methods=['GET', 'POST'])
-def publishers():
-    if request.method == 'GET':
-        pubs = Publisher.query.all()
-        return jsonify([{'id': p.id, 'name': p.name, 'country': p.country} for p in pubs])
-    else:
-        data = request.json
-        pub = Publisher(name=data['name'], country=data.get('country'))
-        db.session.add(pub)
-        db.session.commit()
-        return jsonify({'id': pub.id}), 201
-@app.route('/api/genres', methods=['GET', 'POST'])
-def genres():
-    if request.method == 'GET':
-        return jsonify([{'id': g.id, 'name': g.name} for g in Genre.query.all()])
-    else:
-        genre = Genre(name=request.json['name'], description=request.json.get('description'))
-        db.session.add(genre)
-        db.session.commit()
-        return jsonify({'id': genre.id}), 201
-
-
-@app.route('/api/topics', methods=['GET', 'POST'])
-def topics():
-    if request.method == 'GET':
-        return jsonify([{'id': t.id, 'name': t.name} for t in Topic.query.all()])
-    else:
-        topic = Topic(name=request.json['name'], description=request.json.get('description'))
-        db.session.add(topic)
-        db.session.commit()
-        return jsonify({'id': topic.id}), 201
-
-
-@app.route('/api/categories', methods=['GET', 'POST'])
-def categories():
-    if request.method == 'GET':
-        return jsonify([{'id': c.id, 'name': c.name} for c in Category.query.all()])
-    else:
-        category = Category(name=request.json['name'], description=request.json.get('description'))
-        db.session.add(category)
-        db.session.commit()
-        return jsonify({'id': category.id}), 201
-
-
-@app.route('/api/series', methods=['GET', 'POST'])
-def series():
-    if request.method == 'GET':
-        return jsonify([{'id': s.id, 'name': s.name} for s in Series.query.all()])
-    else:
-        data = request.json
-        ser = Series(name=data['name'], description=data.get('description'), total_books=data.get('total_books'))
-        if 'author_ids' in data:
-            ser.authors = Author.query.filter(Author.id.in_(data['author_ids'])).all()
-        db.session.add(ser)
-        db.session.commit()
-        return jsonify({'id': ser.id}), 201
-@app.route('/api/library/stats')
-def library_stats():
-    total_books = Book.query.count()
-    status_stats = db.session.query(Book.reading_status, func.count(Book.id)).group_by(Book.reading_status).all()
-
-    return jsonify({
-        'total_books': total_books,
-        'total_authors': Author.query.count(),
-        'total_publishers': Publisher.query.count(),
-        'reading_status': {status: count for status, count in status_stats},
-        'recent_books': [{
-            'id': b.id,
-            'title': b.title,
-            'authors': [f'{a.first_name} {a.last_name}' for a in b.authors]
-        } for b in Book.query.order_by(Book.created_at.desc()).limit(5).all()]
-    })
-@app.route('/api/export/csv')
-def export_csv():
-    books = Book.query.all()
-    output = io.StringIO()
-    writer = csv.writer(output)
-    writer.writerow(['ID', 'Title', 'ISBN', 'Year', 'Pages', 'Authors', 'Publisher', 'Status', 'Rating'])
-
-    for book in books:
-        writer.writerow([
-            book.id, book.title, book.isbn, book.publication_year, book.pages,
-            ', '.join([f'{a.first_name} {a.last_name}' for a in book.authors]),
-            book.publisher.name if book.publisher else '',
-            book.reading_status, book.rating
-        ])
-
-    output.seek(0)
-    return send_file(
-        io.BytesIO(output.getvalue().encode('utf-8')),
-        mimetype='text/csv',
-        as_attachment=True,
-        download_name=f'library_{datetime.now().strftime("%Y%m%d")}.csv'
-    )
-
-
-@app.route('/api/export/json')
-def export_json():
-    books = Book.query.all()
-    data = {
-        'export_date': datetime.now().isoformat(),
-        'total': len(books),
-        'books': [{
-            'title': b.title,
-            'isbn': b.isbn,
-            'year': b.publication_year,
-            'pages': b.pages,
-            'authors': [f'{a.first_name} {a.last_name}' for a in b.authors],
-            'publisher': b.publisher.name if b.publisher else None,
-            'status': b.reading_status,
-            'rating': b.rating
-        } for b in books]
+BLUEPRINTS = (library_routes.bp, book_routes.bp, reference_routes.bp, transfer_routes.bp, commands.bp)
+
+
+def normalize_database_url(url):
+    return url.replace('postgres://', 'postgresql://', 1) if url.startswith('postgres://') else url
+
+
+def load_config():
+    # Settings from the environment and .env
+    load_dotenv()
+    return {
+        'SQLALCHEMY_DATABASE_URI': normalize_database_url(os.getenv('DATABASE_URL', 'postgresql://localhost/library_db')),
+        # Comma-separated read replicas of DATABASE_URL, see replicas.py
+        'DATABASE_REPLICA_URLS': [normalize_database_url(url.strip())
+                                  for url in os.getenv('DATABASE_REPLICA_URLS', '').split(',') if url.strip()],
+        # Replica routing: most seconds of replay lag a replica may have, how often each
+        # worker checks it, how long a client's reads stay on the primary after it
+        # writes, and the connect timeout of a replica
+        'DB_REPLICA_MAX_LAG': int(os.getenv('DB_REPLICA_MAX_LAG', 10)),
+        'DB_REPLICA_CHECK_SECONDS': int(os.getenv('DB_REPLICA_CHECK_SECONDS', 5)),
+        'DB_REPLICA_STICKY_SECONDS': int(os.getenv('DB_REPLICA_STICKY_SECONDS', 5)),
+        'DB_REPLICA_CONNECT_TIMEOUT': int(os.getenv('DB_REPLICA_CONNECT_TIMEOUT', 2)),
+        'SECRET_KEY': os.getenv('SECRET_KEY', 'dev-key-change-me'),
+        'SQLALCHEMY_TRACK_MODIFICATIONS': False,
+        # Opt-in slow-request log (with the request's SQL); unset or 0 disables a threshold
+        'SLOW_REQUEST_MS': float(os.getenv('SLOW_REQUEST_MS', 0)),
+        'SLOW_REQUEST_QUERIES': int(os.getenv('SLOW_REQUEST_QUERIES', 0)),
+        # gzip/brotli for clients that accept it; off when a proxy in front compresses.
+        # Smallest response body worth compressing; streamed exports are always compressed
+        'COMPRESSION': env_flag('COMPRESSION', True),
+        'COMPRESS_MIN_BYTES': int(os.getenv('COMPRESS_MIN_BYTES', 1024)),
+        # Run the independent queries of the stats and recommendations endpoints concurrently
+        'ASYNC_QUERIES': env_flag('ASYNC_QUERIES', False),
+        # Serve the book list, reference lists and stats from an in-memory snapshot
+        'CATALOGUE_SNAPSHOT': env_flag('CATALOGUE_SNAPSHOT', False),
+        # Background jobs: threads per web worker (0 leaves the jobs to `flask run-jobs`),
+        # files they produce (default instance/jobs) and the library size above which
+        # exports become jobs
+        'JOB_WORKERS': int(os.getenv('JOB_WORKERS', 1)),
+        'JOB_FOLDER': os.getenv('JOB_FOLDER'),
+        'EXPORT_ASYNC_ROWS': int(os.getenv('EXPORT_ASYNC_ROWS', 50000)),
     }
 
-    return send_file(
-        io.BytesIO(json.dumps(data, indent=2).encode('utf-8')),
-        mimetype='application/json',
-        as_attachment=True,
-        download_name=f'library_{datetime.now().strftime("%Y%m%d")}.json'
-    )
-
-
-@app.route('/api/recommendations')
-def get_recommendations():
-
-    completed_books = Book.query.filter_by(reading_status='completed').all()
-
-    if not completed_books:
-        recommendations = RecommendedBook.query.order_by(
-            RecommendedBook.average_rating.desc()
-        ).limit(3).all()
-    else:
-        genre_counter = Counter()
-        for book in completed_books:
-            for genre in book.genres:
-                genre_counter[genre.id] += 1
-
-        top_genres = [genre_id for genre_id, _ in genre_counter.most_common(3)]
-
-        if top_genres:
-            recommendations = db.session.query(RecommendedBook).join(
-                RecommendedBook.genres
-            ).filter(
-                Genre.id.in_(top_genres)
-            ).order_by(
-                RecommendedBook.average_rating.desc()
-            ).limit(10).all()
-
-            seen = set()
-            unique_recommendations = []
-            for rec in recommendations:
-                if rec.id not in seen:
-                    seen.add(rec.id)
-                    unique_recommendations.append(rec)
-                    if len(unique_recommendations) == 3:
-                        break
-
-            recommendations = unique_recommendations
-        else:
-            recommendations = RecommendedBook.query.order_by(
-                RecommendedBook.average_rating.desc()
-            ).limit(5).all()
 
-    return jsonify({
-        'user_reading_stats': {
-            'completed_books': len(completed_books),
-            'favorite_genres': [
-                Genre.query.get(genre_id).name
-                for genre_id, _ in Counter(
-                    genre.id for book in completed_books for genre in book.genres
-                ).most_common(3)
-            ] if completed_books else []
-        },
-        'recommendations': [{
-            'id': rec.id,
-            'title': rec.title,
-            'author': rec.author_name,
-            'publication_year': rec.publication_year,
-            'pages': rec.pages,
-            'rating': rec.average_rating,
-            'description': rec.description,
-            'genres': [{'id': g.id, 'name': g.name} for g in rec.genres]
-        } for rec in recommendations]
-    })
-@app.cli.command()
-def init_db():
-    db.create_all()
-    print('Database initialized!')
+# The app for the flask command, gunicorn (app:create_app()) and scripts; config
+# overrides the settings from the environment, e.g. a test database. Nothing here
+# connects to the database or touches the schema (`flask init-db` creates it), except
+# building the catalogue snapshot when it is enabled.
+def create_app(config=None):
+    app = Flask(__name__,
+                template_folder='app/templates',
+                static_folder='app/static')
+    # orjson for request and response bodies when installed, the stdlib otherwise
+    app.json = FastJSONProvider(app)
+    app.config.update(load_config())
+    app.config.update(config or {})
+    app.config.setdefault('SQLALCHEMY_ENGINE_OPTIONS', engine_options(app.config['SQLALCHEMY_DATABASE_URI']))
+    app.config['JOB_FOLDER'] = app.config['JOB_FOLDER'] or os.path.join(app.instance_path, 'jobs')
+
+    db.init_app(app)
+    instrument(app)
+    # Reads of GET requests and export jobs go to the replicas while they are healthy
+    init_replicas(app)
+    if app.config['COMPRESSION']:
+        init_compression(app, app.config['COMPRESS_MIN_BYTES'])
+    # Hashed, precompressed copies of the static files from `flask build-assets`
+    init_assets(app)
+    init_async_queries(app)
+    init_catalogue(app)
+    init_jobs(app, app.config['JOB_WORKERS'])
+    for blueprint in BLUEPRINTS:
+        app.register_blueprint(blueprint)
+    return app
 
 
 if __name__ == '__main__':
-    with app.app_context():
-        db.create_all()
-    app.run(debug=True)
+    create_app().run(debug=True)
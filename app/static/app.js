@@ -1,56 +1,235 @@
 // Global state
 let books = [];
-let authors = [];
-let publishers = [];
+let booksCursor = null;
+let booksHasMore = false;
+let booksLoading = false;
+let booksRequest = 0;
 let genres = [];
 let topics = [];
 let categories = [];
-let series = [];
+
+// Responses are kept in localStorage under their URL; requests revalidate them with
+// If-None-Match and reuse the stored body when the server answers 304
+const ETAG_CACHE_PREFIX = 'etag-cache:';
+const ETAG_CACHE_INDEX = 'etag-cache-index';
+const ETAG_CACHE_SIZE = 100;
+
+function readCache(key) {
+    try {
+        return JSON.parse(localStorage.getItem(key));
+    } catch (error) {
+        return null;
+    }
+}
+
+// Mark key as most recently used, storing entry if given, and evict the oldest entries
+function writeCache(key, entry) {
+    try {
+        const index = (readCache(ETAG_CACHE_INDEX) || []).filter(k => k !== key);
+        index.push(key);
+        while (index.length > ETAG_CACHE_SIZE) {
+            localStorage.removeItem(index.shift());
+        }
+        if (entry) localStorage.setItem(key, JSON.stringify(entry));
+        localStorage.setItem(ETAG_CACHE_INDEX, JSON.stringify(index));
+    } catch (error) {
+        // Storage full or disabled: the response just isn't cached
+    }
+}
+
+async function fetchJSON(url) {
+    const key = ETAG_CACHE_PREFIX + url;
+    const cached = readCache(key);
+    const response = await fetch(url, {
+        cache: 'no-store',
+        headers: cached ? { 'If-None-Match': cached.etag } : {}
+    });
+    if (response.status === 304 && cached) {
+        writeCache(key);
+        return cached.data;
+    }
+
+    const data = await response.json();
+    const etag = response.headers.get('ETag');
+    if (response.ok && etag) writeCache(key, { etag, data });
+    return data;
+}
 
 // Initialize app
 document.addEventListener('DOMContentLoaded', () => {
-    loadStats();
-    loadBooks();
-    loadAuthors();
-    loadPublishers();
-    loadGenres();
-    loadTopics();
-    loadCategories();
-    loadSeries();
-    loadRecommendations();
+    setupPicker('bookAuthors', 'authors', true);
+    setupPicker('bookPublisher', 'publishers');
+    setupPicker('bookSeries', 'series');
+    setupInfiniteScroll();
+    loadBootstrap();
 });
 
-// Load library statistics
-async function loadStats() {
-    try {
-        const response = await fetch('/api/library/stats');
-        const data = await response.json();
+// Parts of the page filled from /api/bootstrap; after a book is saved or deleted
+// only the parts that depend on books are reloaded. Authors, publishers and series
+// can be large, so the form looks them up as the user types instead.
+const BOOTSTRAP_PARTS = ['stats', 'books', 'genres', 'topics', 'categories', 'recommendations'];
+const LIBRARY_PARTS = ['stats', 'books', 'recommendations'];
+
+// Load several parts of the page with a single request
+async function loadBootstrap(parts = BOOTSTRAP_PARTS) {
+    const params = bookListParams();
+    params.set('include', parts.join(','));
+    const pending = fetchJSON(`/api/bootstrap?${params}`);
+
+    if (parts.includes('books')) {
+        resetBooks();
+        requestBooks(async () => (await pending).books);
+    }
 
-        document.getElementById('totalBooks').textContent = data.total_books;
-        document.getElementById('totalAuthors').textContent = data.total_authors;
-        document.getElementById('readingBooks').textContent = data.reading_status.reading || 0;
-        document.getElementById('completedBooks').textContent = data.reading_status.completed || 0;
+    try {
+        const data = await pending;
+        if (data.stats) renderStats(data.stats);
+        applyReferenceData(data);
+        if (data.recommendations) renderRecommendations(data.recommendations);
     } catch (error) {
-        console.error('Error loading stats:', error);
+        console.error('Error loading library:', error);
+    }
+}
+
+// Show library statistics
+function renderStats(data) {
+    document.getElementById('totalBooks').textContent = data.total_books;
+    document.getElementById('totalAuthors').textContent = data.total_authors;
+    document.getElementById('readingBooks').textContent = data.reading_status.reading || 0;
+    document.getElementById('completedBooks').textContent = data.reading_status.completed || 0;
+    document.getElementById('pagesRead').textContent = data.pages_read.toLocaleString();
+    document.getElementById('averageRating').textContent = data.average_rating !== null ? `⭐ ${data.average_rating}` : '-';
+}
+
+// Fields the book cards actually render
+const BOOK_LIST_FIELDS = 'id,title,authors,publisher,publication_year,pages,rating,reading_status,current_page';
+const BOOKS_PAGE_SIZE = 50;
+
+// Facets shown as checkbox lists, and the values ticked in each
+const FACET_LABELS = {
+    genre: 'Genre', topic: 'Topic', author: 'Author', category: 'Category',
+    publisher: 'Publisher', series: 'Series', language: 'Language'
+};
+const selectedFacets = {};
+
+// Query parameters for the book list under the current filters
+function bookListParams() {
+    const params = new URLSearchParams({
+        search: document.getElementById('searchInput').value,
+        status: document.getElementById('statusFilter').value,
+        sort: document.getElementById('sortOrder').value,
+        fields: BOOK_LIST_FIELDS,
+        limit: BOOKS_PAGE_SIZE,
+        facets: 1
+    });
+    for (const [name, values] of Object.entries(selectedFacets)) {
+        if (values.size) params.set(name, [...values].join(','));
+    }
+    const ranges = { year_min: 'yearMin', year_max: 'yearMax', rating_min: 'ratingMin' };
+    for (const [param, inputId] of Object.entries(ranges)) {
+        const value = document.getElementById(inputId).value;
+        if (value) params.set(param, value);
     }
+    return params;
 }
 
-// Load books
+function toggleFacet(name, value) {
+    selectedFacets[name] = selectedFacets[name] || new Set();
+    if (!selectedFacets[name].delete(value)) selectedFacets[name].add(value);
+    loadBooks();
+}
+
+function clearFacets() {
+    Object.keys(selectedFacets).forEach(name => delete selectedFacets[name]);
+    ['yearMin', 'yearMax', 'ratingMin'].forEach(id => document.getElementById(id).value = '');
+    loadBooks();
+}
+
+// Show each facet's values with the number of books selecting it would give
+function renderFacets(facets, total) {
+    document.getElementById('facetTotal').textContent = `${total.toLocaleString()} books`;
+    document.getElementById('facetGroups').innerHTML = Object.entries(FACET_LABELS)
+        .filter(([name]) => facets[name].length)
+        .map(([name, label]) => `
+            <details class="facet-group" ${selectedFacets[name] && selectedFacets[name].size ? 'open' : ''}>
+                <summary>${label}</summary>
+                ${facets[name].map(item => {
+                    const value = item.id !== undefined ? item.id : item.value;
+                    const checked = selectedFacets[name] && selectedFacets[name].has(value) ? 'checked' : '';
+                    return `<label>
+                        <input type="checkbox" ${checked} onchange='toggleFacet("${name}", ${JSON.stringify(value)})'>
+                        ${item.name || item.value} <span class="facet-count">${item.count}</span>
+                    </label>`;
+                }).join('')}
+            </details>
+        `).join('');
+}
+
+function resetBooks() {
+    books = [];
+    booksCursor = null;
+    booksHasMore = false;
+    booksLoading = false;
+    document.getElementById('booksGrid').innerHTML = '';
+}
+
+// Load the first page of books for the current filters
 async function loadBooks() {
-    const search = document.getElementById('searchInput').value;
-    const status = document.getElementById('statusFilter').value;
+    resetBooks();
+    await loadMoreBooks();
+}
+
+// Fetch the next page of books and append it to the grid
+async function loadMoreBooks() {
+    if (booksLoading) return;
+    const params = bookListParams();
+    if (booksCursor) params.set('cursor', booksCursor);
+    await requestBooks(() => fetchJSON(`/api/books?${params}`));
+}
+
+// Append the page fetchPage() resolves to, unless a newer request has started since
+async function requestBooks(fetchPage) {
+    booksLoading = true;
+    const request = ++booksRequest;
 
     try {
-        const response = await fetch(`/api/books?search=${search}&status=${status}`);
-        books = await response.json();
-        renderBooks();
+        const data = await fetchPage();
+        if (request !== booksRequest) return;
+
+        books = books.concat(data.books);
+        if (data.facets) renderFacets(data.facets, data.total);
+        booksCursor = data.next_cursor;
+        booksHasMore = data.has_more;
+        renderBooks(data.books);
     } catch (error) {
         console.error('Error loading books:', error);
+    } finally {
+        if (request === booksRequest) booksLoading = false;
+    }
+
+    // A short page may leave the sentinel on screen, which won't re-trigger the observer
+    if (request === booksRequest && booksHasMore && sentinelVisible()) {
+        loadMoreBooks();
     }
 }
 
-// Render books grid
-function renderBooks() {
+function sentinelVisible() {
+    const rect = document.getElementById('booksSentinel').getBoundingClientRect();
+    return rect.top < window.innerHeight + 400;
+}
+
+// Load the next page when the sentinel below the grid scrolls into view
+function setupInfiniteScroll() {
+    const observer = new IntersectionObserver(entries => {
+        if (entries.some(entry => entry.isIntersecting) && booksHasMore) {
+            loadMoreBooks();
+        }
+    }, { rootMargin: '400px' });
+    observer.observe(document.getElementById('booksSentinel'));
+}
+
+// Append a page of books to the grid
+function renderBooks(page) {
     const grid = document.getElementById('booksGrid');
 
     if (books.length === 0) {
@@ -58,7 +237,7 @@ function renderBooks() {
         return;
     }
 
-    grid.innerHTML = books.map(book => `
+    grid.insertAdjacentHTML('beforeend', page.map(book => `
         <div class="book-card">
             <h3>${book.title}</h3>
             <p class="book-meta">
@@ -80,71 +259,203 @@ function renderBooks() {
                 <button onclick="deleteBook(${book.id})" class="btn-danger">Delete</button>
             </div>
         </div>
-    `).join('');
+    `).join(''));
+}
+
+// Store and show whichever reference lists data contains
+function applyReferenceData(data) {
+    if (data.genres) {
+        genres = data.genres;
+        populateSelect('bookGenres', genres, 'name');
+    }
+    if (data.topics) {
+        topics = data.topics;
+    }
+    if (data.categories) {
+        categories = data.categories;
+        populateSelect('bookCategory', categories, 'name');
+    }
 }
 
-// Load reference data
-async function loadAuthors() {
-    const response = await fetch('/api/authors');
-    authors = await response.json();
-    populateSelect('bookAuthors', authors, 'full_name');
+// Populate select dropdown
+function populateSelect(selectId, data, labelField, includeEmpty = false) {
+    const select = document.getElementById(selectId);
+    select.innerHTML = includeEmpty ? '<option value="">Select...</option>' : '';
+
+    data.forEach(item => {
+        const option = document.createElement('option');
+        option.value = item.id;
+        option.textContent = item[labelField];
+        select.appendChild(option);
+    });
 }
 
-async function loadPublishers() {
-    const response = await fetch('/api/publishers');
-    publishers = await response.json();
-    populateSelect('bookPublisher', publishers, 'name', true);
+// Type-ahead pickers for the form's authors, publisher and series. Each asks
+// /api/suggest/<entity> as the user types and keeps the chosen items as chips.
+const SUGGEST_DELAY_MS = 150;
+const SUGGEST_LIMIT = 10;
+const pickers = {};
+
+function setupPicker(id, entity, multiple = false) {
+    const root = document.getElementById(id);
+    root.innerHTML = `
+        <div class="picker-chips"></div>
+        <input type="text" class="picker-input" autocomplete="off" placeholder="Type to search...">
+        <ul class="picker-suggestions"></ul>`;
+    const picker = { entity, multiple, root, selected: [], items: [], active: -1, request: 0, timer: null };
+    pickers[id] = picker;
+
+    const input = root.querySelector('input');
+    input.addEventListener('input', () => {
+        clearTimeout(picker.timer);
+        picker.timer = setTimeout(() => suggestPickerItems(id), SUGGEST_DELAY_MS);
+    });
+    input.addEventListener('keydown', event => pickerKeyDown(id, event));
+    input.addEventListener('blur', () => showPickerItems(id, []));
 }
 
-async function loadGenres() {
-    const response = await fetch('/api/genres');
-    genres = await response.json();
-    populateSelect('bookGenres', genres, 'name');
+async function suggestPickerItems(id) {
+    const picker = pickers[id];
+    const q = picker.root.querySelector('input').value.trim();
+    const request = ++picker.request;
+    if (!q) {
+        showPickerItems(id, []);
+        return;
+    }
+    try {
+        const response = await fetch(`/api/suggest/${picker.entity}?${new URLSearchParams({ q, limit: SUGGEST_LIMIT })}`);
+        const items = await response.json();
+        if (request !== picker.request || !response.ok) return;
+        showPickerItems(id, items.filter(item => !picker.selected.some(s => s.id === item.id)));
+    } catch (error) {
+        console.error('Error loading suggestions:', error);
+    }
 }
 
-async function loadTopics() {
-    const response = await fetch('/api/topics');
-    topics = await response.json();
+function showPickerItems(id, items) {
+    const picker = pickers[id];
+    picker.items = items;
+    picker.active = items.length ? 0 : -1;
+    const list = picker.root.querySelector('.picker-suggestions');
+    list.innerHTML = '';
+    items.forEach(item => {
+        const option = document.createElement('li');
+        option.textContent = item.name;
+        if (item.book_count !== undefined) {
+            const count = document.createElement('span');
+            count.className = 'picker-count';
+            count.textContent = `${item.book_count} books`;
+            option.appendChild(count);
+        }
+        // mousedown rather than click, which would come after the input's blur
+        option.addEventListener('mousedown', event => {
+            event.preventDefault();
+            choosePickerItem(id, item);
+        });
+        list.appendChild(option);
+    });
+    highlightPickerItem(id);
 }
 
-async function loadCategories() {
-    const response = await fetch('/api/categories');
-    categories = await response.json();
-    populateSelect('bookCategory', categories, 'name');
+function highlightPickerItem(id) {
+    const picker = pickers[id];
+    picker.root.querySelectorAll('.picker-suggestions li').forEach((option, i) => {
+        option.classList.toggle('active', i === picker.active);
+    });
 }
 
-async function loadSeries() {
-    const response = await fetch('/api/series');
-    series = await response.json();
-    populateSelect('bookSeries', series, 'name');
+function pickerKeyDown(id, event) {
+    const picker = pickers[id];
+    const input = picker.root.querySelector('input');
+    if (event.key === 'ArrowDown' || event.key === 'ArrowUp') {
+        event.preventDefault();
+        if (!picker.items.length) return;
+        const step = event.key === 'ArrowDown' ? 1 : -1;
+        picker.active = (picker.active + step + picker.items.length) % picker.items.length;
+        highlightPickerItem(id);
+    } else if (event.key === 'Enter') {
+        // Enter picks a suggestion instead of submitting the form
+        event.preventDefault();
+        if (picker.active >= 0) choosePickerItem(id, picker.items[picker.active]);
+    } else if (event.key === 'Escape') {
+        showPickerItems(id, []);
+    } else if (event.key === 'Backspace' && !input.value && picker.selected.length) {
+        setPicker(id, picker.selected.slice(0, -1));
+    }
 }
 
-// Populate select dropdown
-function populateSelect(selectId, data, labelField, includeEmpty = false) {
-    const select = document.getElementById(selectId);
-    select.innerHTML = includeEmpty ? '<option value="">Select...</option>' : '';
+function choosePickerItem(id, item) {
+    const picker = pickers[id];
+    const selected = picker.multiple ? picker.selected.filter(s => s.id !== item.id).concat([item]) : [item];
+    picker.root.querySelector('input').value = '';
+    showPickerItems(id, []);
+    setPicker(id, selected);
+}
 
-    data.forEach(item => {
-        const option = document.createElement('option');
-        option.value = item.id;
-        option.textContent = item[labelField];
-        select.appendChild(option);
+// Set the chosen items, [{id, name}, ...]
+function setPicker(id, items) {
+    const picker = pickers[id];
+    picker.selected = items;
+    const chips = picker.root.querySelector('.picker-chips');
+    chips.innerHTML = '';
+    items.forEach(item => {
+        const chip = document.createElement('span');
+        chip.className = 'picker-chip';
+        chip.textContent = item.name;
+        const remove = document.createElement('button');
+        remove.type = 'button';
+        remove.textContent = '×';
+        remove.addEventListener('click', () => setPicker(id, picker.selected.filter(s => s.id !== item.id)));
+        chip.appendChild(remove);
+        chips.appendChild(chip);
     });
 }
 
+function pickerValues(id) {
+    return pickers[id].selected.map(item => item.id);
+}
+
+// Title suggestions for the search box
+let titleSuggestTimer = null;
+
+function suggestTitles() {
+    clearTimeout(titleSuggestTimer);
+    titleSuggestTimer = setTimeout(async () => {
+        const q = document.getElementById('searchInput').value.trim();
+        const list = document.getElementById('titleSuggestions');
+        if (!q) {
+            list.innerHTML = '';
+            return;
+        }
+        try {
+            const response = await fetch(`/api/suggest/titles?${new URLSearchParams({ q, limit: SUGGEST_LIMIT })}`);
+            if (!response.ok) return;
+            const titles = [...new Set((await response.json()).map(item => item.name))];
+            list.innerHTML = '';
+            titles.forEach(title => {
+                const option = document.createElement('option');
+                option.value = title;
+                list.appendChild(option);
+            });
+        } catch (error) {
+            console.error('Error loading title suggestions:', error);
+        }
+    }, SUGGEST_DELAY_MS);
+}
+
 // Show add book form
 function showAddBookForm() {
     document.getElementById('modalTitle').textContent = 'Add Book';
     document.getElementById('bookForm').reset();
     document.getElementById('bookId').value = '';
+    ['bookAuthors', 'bookPublisher', 'bookSeries'].forEach(id => setPicker(id, []));
     document.getElementById('bookModal').style.display = 'block';
 }
 
 // Edit book
 async function editBook(id) {
     try {
-        const response = await fetch(`/api/books/${id}`);
-        const book = await response.json();
+        const book = await fetchJSON(`/api/books/${id}`);
 
         document.getElementById('modalTitle').textContent = 'Edit Book';
         document.getElementById('bookId').value = book.id;
@@ -154,16 +465,15 @@ async function editBook(id) {
         document.getElementById('bookPages').value = book.pages || '';
         document.getElementById('bookLanguage').value = book.language || '';
         document.getElementById('bookDescription').value = book.description || '';
-        document.getElementById('bookPublisher').value = book.publisher_id;
-        document.getElementById('bookSeries').value = book.series_id || '';
+        setPicker('bookPublisher', book.publisher ? [book.publisher] : []);
+        setPicker('bookSeries', book.series ? [book.series] : []);
         document.getElementById('bookCategory').value = book.category_id || '';
         document.getElementById('bookStatus').value = book.reading_status;
         document.getElementById('bookCurrentPage').value = book.current_page || 0;
         document.getElementById('bookRating').value = book.rating || '';
         document.getElementById('bookNotes').value = book.notes || '';
 
-        // Set multiple select values
-        setMultipleSelect('bookAuthors', book.author_ids);
+        setPicker('bookAuthors', book.authors);
         setMultipleSelect('bookGenres', book.genre_ids);
 
         document.getElementById('bookModal').style.display = 'block';
@@ -185,6 +495,11 @@ async function saveBook(event) {
     event.preventDefault();
 
     const id = document.getElementById('bookId').value;
+    const publisherId = pickerValues('bookPublisher')[0];
+    if (!publisherId) {
+        alert('Choose a publisher');
+        return;
+    }
     const data = {
         title: document.getElementById('bookTitle').value,
         isbn: document.getElementById('bookIsbn').value || null,
@@ -192,14 +507,14 @@ async function saveBook(event) {
         pages: document.getElementById('bookPages').value || null,
         language: document.getElementById('bookLanguage').value || null,
         description: document.getElementById('bookDescription').value || null,
-        publisher_id: parseInt(document.getElementById('bookPublisher').value),
-        series_id: document.getElementById('bookSeries').value || null,
+        publisher_id: publisherId,
+        series_id: pickerValues('bookSeries')[0] || null,
         category_id: document.getElementById('bookCategory').value || null,
         reading_status: document.getElementById('bookStatus').value,
         current_page: document.getElementById('bookCurrentPage').value || 0,
         rating: document.getElementById('bookRating').value || null,
         notes: document.getElementById('bookNotes').value || null,
-        author_ids: Array.from(document.getElementById('bookAuthors').selectedOptions).map(o => parseInt(o.value)),
+        author_ids: pickerValues('bookAuthors'),
         genre_ids: Array.from(document.getElementById('bookGenres').selectedOptions).map(o => parseInt(o.value))
     };
 
@@ -215,8 +530,7 @@ async function saveBook(event) {
 
         if (response.ok) {
             closeModal();
-            loadBooks();
-            loadStats();
+            loadBootstrap(LIBRARY_PARTS);
             alert(id ? 'Book updated successfully!' : 'Book added successfully!');
         }
     } catch (error) {
@@ -232,8 +546,7 @@ async function deleteBook(id) {
     try {
         const response = await fetch(`/api/books/${id}`, { method: 'DELETE' });
         if (response.ok) {
-            loadBooks();
-            loadStats();
+            loadBootstrap(LIBRARY_PARTS);
             alert('Book deleted successfully!');
         }
     } catch (error) {
@@ -246,8 +559,8 @@ function closeModal() {
     document.getElementById('bookModal').style.display = 'none';
 }
 
-// Quick add author or publisher
-function showQuickAdd(type) {
+// Quick add author or publisher, and pick it for the book
+async function showQuickAdd(type) {
     const name = prompt(`Enter ${type} name:`);
     if (!name) return;
 
@@ -256,23 +569,60 @@ function showQuickAdd(type) {
         const firstName = parts[0];
         const lastName = parts.slice(1).join(' ') || parts[0];
 
-        fetch('/api/authors', {
+        const response = await fetch('/api/authors', {
             method: 'POST',
             headers: { 'Content-Type': 'application/json' },
             body: JSON.stringify({ first_name: firstName, last_name: lastName })
-        }).then(() => loadAuthors());
+        });
+        if (response.ok) choosePickerItem('bookAuthors', { id: (await response.json()).id, name: `${firstName} ${lastName}` });
     } else if (type === 'publisher') {
-        fetch('/api/publishers', {
+        const response = await fetch('/api/publishers', {
             method: 'POST',
             headers: { 'Content-Type': 'application/json' },
             body: JSON.stringify({ name: name })
-        }).then(() => loadPublishers());
+        });
+        if (response.ok) choosePickerItem('bookPublisher', { id: (await response.json()).id, name });
+    }
+}
+
+// Export data. Small libraries are streamed straight away; large ones are exported
+// by a background job (202), which is polled until its file can be downloaded
+const JOB_POLL_MS = 1000;
+
+async function exportData(format, button) {
+    const label = button.textContent;
+    button.disabled = true;
+    try {
+        const response = await fetch(`/api/export/${format}`);
+        if (response.status !== 202) {
+            const blob = await response.blob();
+            const name = (response.headers.get('Content-Disposition') || '').split('filename=')[1] || `library.${format}`;
+            downloadURL(URL.createObjectURL(blob), name);
+            return;
+        }
+        let job = await response.json();
+        while (job.status === 'queued' || job.status === 'running') {
+            button.textContent = job.total ? `Exporting ${Math.floor(100 * job.progress / job.total)}%` : 'Export queued';
+            await new Promise(resolve => setTimeout(resolve, JOB_POLL_MS));
+            job = await (await fetch(`/api/jobs/${job.id}`, { cache: 'no-store' })).json();
+        }
+        if (job.status === 'done') {
+            downloadURL(job.download_url);
+        } else {
+            alert(`Export failed: ${job.error}`);
+        }
+    } finally {
+        button.textContent = label;
+        button.disabled = false;
     }
 }
 
-// Export data
-function exportData(format) {
-    window.location.href = `/api/export/${format}`;
+function downloadURL(url, name = '') {
+    const link = document.createElement('a');
+    link.href = url;
+    link.download = name;
+    link.click();
+    if (url.startsWith('blob:')) setTimeout(() => URL.revokeObjectURL(url), 1000);
 }
 
 // Close modal on outside click
@@ -283,47 +633,40 @@ window.onclick = function(event) {
     }
 }
 
-// Load recommendations
-async function loadRecommendations() {
-    try {
-        const response = await fetch('/api/recommendations');
-        const data = await response.json();
-
-        const section = document.getElementById('recommendationsSection');
-        const intro = document.getElementById('recommendationsIntro');
-        const grid = document.getElementById('recommendationsGrid');
-
-        // Show recommendations section if we have data
-        if (data.recommendations && data.recommendations.length > 0) {
-            section.style.display = 'block';
-
-            // Update intro text
-            const stats = data.user_reading_stats;
-            if (stats.completed_books > 0 && stats.favorite_genres.length > 0) {
-                intro.textContent = `Based on your ${stats.completed_books} completed book(s) in ${stats.favorite_genres.join(', ')}, here are some recommendations:`;
-            } else {
-                intro.textContent = 'Here are some top-rated books to get you started:';
-            }
-
-            // Render recommendations
-            grid.innerHTML = data.recommendations.map(rec => `
-                <div class="recommendation-card">
-                    <h3>${rec.title}</h3>
-                    <p class="recommendation-author">by ${rec.author}</p>
-                    <div class="recommendation-info">
-                        <span class="recommendation-year">${rec.publication_year || 'N/A'}</span>
-                        <span class="recommendation-pages">${rec.pages || 'N/A'} pages</span>
-                    </div>
-                    <div class="recommendation-genres">
-                        ${rec.genres.map(g => `<span class="genre-tag">${g.name}</span>`).join('')}
-                    </div>
-                    <p class="recommendation-description">${rec.description || ''}</p>
-                </div>
-            `).join('');
+// Show recommendations
+function renderRecommendations(data) {
+    const section = document.getElementById('recommendationsSection');
+    const intro = document.getElementById('recommendationsIntro');
+    const grid = document.getElementById('recommendationsGrid');
+
+    // Show recommendations section if we have data
+    if (data.recommendations && data.recommendations.length > 0) {
+        section.style.display = 'block';
+
+        // Update intro text
+        const stats = data.user_reading_stats;
+        if (stats.completed_books > 0 && stats.favorite_genres.length > 0) {
+            intro.textContent = `Based on your ${stats.completed_books} completed book(s) in ${stats.favorite_genres.join(', ')}, here are some recommendations:`;
         } else {
-            section.style.display = 'none';
+            intro.textContent = 'Here are some top-rated books to get you started:';
         }
-    } catch (error) {
-        console.error('Error loading recommendations:', error);
+
+        // Render recommendations
+        grid.innerHTML = data.recommendations.map(rec => `
+            <div class="recommendation-card">
+                <h3>${rec.title}</h3>
+                <p class="recommendation-author">by ${rec.author}</p>
+                <div class="recommendation-info">
+                    <span class="recommendation-year">${rec.publication_year || 'N/A'}</span>
+                    <span class="recommendation-pages">${rec.pages || 'N/A'} pages</span>
+                </div>
+                <div class="recommendation-genres">
+                    ${rec.genres.map(g => `<span class="genre-tag">${g.name}</span>`).join('')}
+                </div>
+                <p class="recommendation-description">${rec.description || ''}</p>
+            </div>
+        `).join('');
+    } else {
+        section.style.display = 'none';
     }
 }
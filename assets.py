@@ -0,0 +1,76 @@
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+from flask import abort, request, send_from_directory, url_for
+from compression import brotli
+
+# Static files built by `flask build-assets` into BUILD_FOLDER under content-hashed
+# names, each with .gz and (with brotli installed) .br copies at maximum compression
+ASSET_FILES = ('app.js', 'style.css')
+BUILD_FOLDER = 'dist'
+MANIFEST = 'manifest.json'
+# A hashed name never changes content, so clients may keep it for a year unchecked
+ASSET_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+PRECOMPRESSED = (('br', '.br'), ('gzip', '.gz'))
+
+
+def hashed_name(name, content):
+    stem, extension = os.path.splitext(name)
+    return f'{stem}.{hashlib.sha1(content).hexdigest()[:12]}{extension}'
+
+
+# Writes the hashed and precompressed copies of ASSET_FILES and their manifest,
+# removing earlier builds; returns name -> (hashed name, {suffix: size})
+def build_assets(static_folder):
+    build_folder = os.path.join(static_folder, BUILD_FOLDER)
+    os.makedirs(build_folder, exist_ok=True)
+    for old in os.listdir(build_folder):
+        os.remove(os.path.join(build_folder, old))
+    manifest, sizes = {}, {}
+    for name in ASSET_FILES:
+        with open(os.path.join(static_folder, name), 'rb') as f:
+            content = f.read()
+        manifest[name] = hashed_name(name, content)
+        versions = {'': content, '.gz': gzip.compress(content, compresslevel=9, mtime=0)}
+        if brotli:
+            versions['.br'] = brotli.compress(content, quality=11)
+        for suffix, data in versions.items():
+            with open(os.path.join(build_folder, manifest[name] + suffix), 'wb') as f:
+                f.write(data)
+        sizes[name] = (manifest[name], {suffix: len(data) for suffix, data in versions.items()})
+    with open(os.path.join(build_folder, MANIFEST), 'w') as f:
+        json.dump(manifest, f, indent=2)
+    return sizes
+
+
+def init_assets(app):
+    build_folder = os.path.join(app.static_folder, BUILD_FOLDER)
+    try:
+        with open(os.path.join(build_folder, MANIFEST)) as f:
+            manifest = json.load(f)
+    except FileNotFoundError:
+        manifest = {}
+    hashed = set(manifest.values())
+
+    @app.template_global()
+    def asset_url(name):
+        # The built copy when there is one; in debug mode the source file, so edits
+        # show up without a rebuild
+        if name in manifest and not app.debug:
+            return url_for('asset', filename=manifest[name])
+        return url_for('static', filename=name)
+
+    @app.route('/assets/<filename>')
+    def asset(filename):
+        if filename not in hashed:
+            abort(404)
+        encoding, suffix = next(((e, s) for e, s in PRECOMPRESSED if request.accept_encodings[e]
+                                 and os.path.exists(os.path.join(build_folder, filename + s))), (None, ''))
+        response = send_from_directory(build_folder, filename + suffix, mimetype=mimetypes.guess_type(filename)[0])
+        if encoding:
+            response.headers['Content-Encoding'] = encoding
+        response.vary.add('Accept-Encoding')
+        response.headers['Cache-Control'] = ASSET_CACHE_CONTROL
+        return response
@@ -0,0 +1,110 @@
+import asyncio
+import os
+import threading
+from sqlalchemy.engine import make_url
+from instrumentation import current_metrics, bind_metrics
+from models import db
+from replicas import current_replica
+
+# How each query's result is returned, the same for db.session and the async sessions
+SHAPES = {
+    'all': lambda result: result.all(),
+    'scalar': lambda result: result.scalar(),
+    'scalars': lambda result: result.scalars().all(),
+}
+
+runner = None
+
+
+class QueryRunner:
+    # An event loop on a background thread with its own async engines, one for the
+    # primary and one per read replica used. Request threads hand it a batch of
+    # independent statements and block until all of them are done; each runs on its
+    # own pooled connection, so the batch costs one round trip.
+    def __init__(self, url, options):
+        self.url = url
+        self.options = options
+        self.lock = threading.Lock()
+        self.pid = None
+
+    def start(self):
+        self.loop = asyncio.new_event_loop()
+        threading.Thread(target=self.loop.run_forever, name='async-queries', daemon=True).start()
+        self.engines = {}
+        self.sessions = {}
+        self.pid = os.getpid()
+
+    def submit(self, coroutine):
+        # Started lazily, and again in a forked worker: threads don't survive a fork
+        with self.lock:
+            if self.pid != os.getpid():
+                self.start()
+        return asyncio.run_coroutine_threadsafe(coroutine, self.loop)
+
+    def session_factory(self, url):
+        # Only called on the loop's thread. The asyncio extension is only loaded by
+        # processes that use it.
+        from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+        if url not in self.sessions:
+            self.engines[url] = create_async_engine(url, **dict(self.options, isolation_level='AUTOCOMMIT'))
+            self.sessions[url] = async_sessionmaker(self.engines[url], expire_on_commit=False)
+        return self.sessions[url]
+
+    async def fetch(self, metrics, url, statement, shape):
+        bind_metrics(metrics)
+        async with self.session_factory(url)() as session:
+            return SHAPES[shape](await session.execute(statement))
+
+    async def gather(self, metrics, url, queries):
+        return await asyncio.gather(*(self.fetch(metrics, url, statement, shape) for statement, shape in queries))
+
+    def run(self, queries, url=None):
+        return self.submit(self.gather(current_metrics(), url or self.url, queries)).result()
+
+    async def dispose(self):
+        for engine in self.engines.values():
+            await engine.dispose()
+
+    def shutdown(self):
+        if self.pid == os.getpid():
+            self.submit(self.dispose()).result()
+            self.loop.call_soon_threadsafe(self.loop.stop)
+
+
+def async_url(database_url):
+    url = make_url(database_url)
+    if url.get_backend_name() != 'postgresql':
+        raise RuntimeError('ASYNC_QUERIES needs PostgreSQL')
+    # psycopg 3 serves both the sync and the asyncio engine
+    return url.set(drivername='postgresql+psycopg')
+
+
+def init_async_queries(app):
+    global runner
+    runner = None
+    if app.config.get('ASYNC_QUERIES'):
+        runner = QueryRunner(async_url(app.config['SQLALCHEMY_DATABASE_URI']),
+                             app.config.get('SQLALCHEMY_ENGINE_OPTIONS', {}))
+
+
+def shutdown_async_queries():
+    if runner is not None:
+        runner.shutdown()
+
+
+# Runs independent (statement, shape) queries and returns their results in order:
+# concurrently when ASYNC_QUERIES is on, one after another on db.session otherwise,
+# on the request's read replica if it has one. Statements must be read-only; ORM
+# entities come back fully loaded and detached from db.session in async mode.
+def run_queries(*queries):
+    if runner is None:
+        return [SHAPES[shape](db.session.execute(statement)) for statement, shape in queries]
+    replica = current_replica()
+    return runner.run(queries, async_url(replica.url) if replica is not None else None)
+
+
+# name -> (queries, build): runs every batch's queries together and returns
+# name -> build(*that batch's results)
+def run_batches(batches):
+    results = iter(run_queries(*[query for queries, _ in batches.values() for query in queries]))
+    return {name: build(*[next(results) for _ in queries]) for name, (queries, build) in batches.items()}
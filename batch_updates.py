@@ -0,0 +1,181 @@
+from collections import defaultdict
+from sqlalchemy import bindparam, delete, select, tuple_, update
+from changes import publish, load_book_states, STATE_COLUMNS, STATE_LINKS
+from matchkeys import match_keys
+from models import db, Author, Book, Genre, Topic
+
+# Fields a book update may set, as in PUT /api/books/<id>
+UPDATE_FIELDS = ('title', 'isbn', 'publication_year', 'pages', 'language', 'description', 'publisher_id',
+                 'series_id', 'series_position', 'category_id', 'reading_status', 'current_page', 'notes',
+                 'rating')
+LINK_MODELS = {'author_ids': Author, 'genre_ids': Genre, 'topic_ids': Topic}
+READING_STATUSES = ('unread', 'reading', 'completed')
+MAX_BATCH = 1000
+# Checked and converted like the import's columns (importer.parse_row); numbers may
+# come as strings, as the book form sends them
+INT_FIELDS = ('publication_year', 'pages', 'current_page', 'series_position', 'publisher_id', 'series_id',
+              'category_id')
+NON_NEGATIVE_FIELDS = ('pages', 'current_page')
+REQUIRED_FIELDS = ('title', 'publisher_id', 'reading_status')
+
+
+class BatchError(ValueError):
+    pass
+
+
+def parse_value(field, value):
+    if value is None:
+        if field in REQUIRED_FIELDS:
+            raise BatchError(f'{field} is required')
+        return None
+    if field in INT_FIELDS:
+        try:
+            value = int(value)
+        except (TypeError, ValueError):
+            raise BatchError(f'{field} must be an integer')
+        if field in NON_NEGATIVE_FIELDS and value < 0:
+            raise BatchError(f'{field} must not be negative')
+    elif field == 'rating':
+        try:
+            value = float(value)
+        except (TypeError, ValueError):
+            raise BatchError('rating must be a number')
+        if not 0 <= value <= 5:
+            raise BatchError('rating must be between 0 and 5')
+    elif field == 'reading_status':
+        if value not in READING_STATUSES:
+            raise BatchError(f'reading_status must be one of {", ".join(READING_STATUSES)}')
+    elif not isinstance(value, str):
+        raise BatchError(f'{field} must be a string')
+    elif field == 'title' and not value.strip():
+        raise BatchError('title is required')
+    return value
+
+
+def parse_updates(data):
+    updates = data.get('updates') if isinstance(data, dict) else data
+    if not isinstance(updates, list) or not updates:
+        raise BatchError('Expected a non-empty list of updates')
+    if len(updates) > MAX_BATCH:
+        raise BatchError(f'At most {MAX_BATCH} updates per batch')
+    seen = set()
+    for i, item in enumerate(updates):
+        if not isinstance(item, dict) or not isinstance(item.get('id'), int):
+            raise BatchError(f'updates[{i}]: an object with an integer id is required')
+        unknown = set(item) - {'id', *UPDATE_FIELDS, *LINK_MODELS}
+        if unknown:
+            raise BatchError(f'updates[{i}]: unknown fields {", ".join(sorted(unknown))}')
+        if item['id'] in seen:
+            raise BatchError(f'updates[{i}]: book {item["id"]} appears more than once')
+        for key in LINK_MODELS:
+            if key in item and not (isinstance(item[key], list) and all(isinstance(v, int) for v in item[key])):
+                raise BatchError(f'updates[{i}]: {key} must be a list of ids')
+        for field in UPDATE_FIELDS:
+            if field in item:
+                try:
+                    item[field] = parse_value(field, item[field])
+                except BatchError as e:
+                    raise BatchError(f'updates[{i}]: {e}')
+        seen.add(item['id'])
+    return updates
+
+
+def update_columns(connection, updates):
+    # One executemany UPDATE per distinct set of fields
+    table = Book.__table__
+    groups = defaultdict(list)
+    for item in updates:
+        fields = tuple(sorted(f for f in UPDATE_FIELDS if f in item))
+        if fields:
+            groups[fields].append(item)
+    for fields, items in groups.items():
+        # Plus the match keys of the title and ISBN, when they are set
+        params = [{'book_id': item['id'], **{f: item[f] for f in fields},
+                   **match_keys(table.name, {f: item[f] for f in fields})} for item in items]
+        stmt = (update(table).where(table.c.id == bindparam('book_id'))
+                .values({f: bindparam(f) for f in params[0] if f != 'book_id'}))
+        connection.execute(stmt, params)
+    return bool(groups)
+
+
+def update_links(connection, updates, before, after):
+    # Insert and delete only the link rows that differ from the current ones. Ids that
+    # don't exist are ignored, as PUT /api/books/<id> does.
+    touched = set()
+    for key, model in LINK_MODELS.items():
+        items = [item for item in updates if key in item]
+        if not items:
+            continue
+        requested = {ref_id for item in items for ref_id in item[key]}
+        existing = set(connection.execute(select(model.id).where(model.id.in_(requested))).scalars()) \
+            if requested else set()
+        _, column = STATE_LINKS[key]
+        added, removed = [], []
+        for item in items:
+            current = set(before[item['id']][key])
+            wanted = set(item[key]) & existing
+            after[item['id']][key] = sorted(wanted)
+            added += [(item['id'], ref_id) for ref_id in sorted(wanted - current)]
+            removed += [(item['id'], ref_id) for ref_id in sorted(current - wanted)]
+        table = column.table
+        if removed:
+            connection.execute(delete(table).where(tuple_(table.c.book_id, column).in_(removed)))
+        if added:
+            connection.execute(table.insert(), [{'book_id': b, column.name: r} for b, r in added])
+        if added or removed:
+            touched.add(table.name)
+    return touched
+
+
+# Applies partial updates to many books in the current transaction and publishes
+# the changes; the caller commits. Raises BatchError (nothing applied) for unknown ids.
+def apply_updates(updates):
+    connection = db.session.connection()
+    ids = [item['id'] for item in updates]
+    before = load_book_states(connection, ids)
+    missing = [id for id in ids if id not in before]
+    if missing:
+        raise BatchError(f'Books not found: {", ".join(map(str, missing))}')
+
+    after = {item['id']: dict(before[item['id']], **{c: item[c] for c in STATE_COLUMNS if c in item})
+             for item in updates}
+    tables = set()
+    if update_columns(connection, updates):
+        tables.add(Book.__tablename__)
+    tables |= update_links(connection, updates, before, after)
+    publish(connection, [(before[id], after[id]) for id in ids], tables=tables, ids=ids)
+    return ids
+
+
+def progress_status(state, current_page):
+    # Starting a book marks it as being read; reaching its last page finishes it
+    if state['pages'] and current_page >= state['pages']:
+        return 'completed'
+    if current_page > 0 and state['reading_status'] == 'unread':
+        return 'reading'
+    return state['reading_status']
+
+
+# Sets current_page (and reading_status, given or derived from the page) without
+# loading the book through the ORM. Returns None for an unknown book.
+def record_progress(id, current_page, reading_status=None):
+    # Checked and converted as in a batch update, so both take the same input
+    if current_page is None:
+        raise BatchError('current_page is required')
+    current_page = parse_value('current_page', current_page)
+    if reading_status is not None:
+        reading_status = parse_value('reading_status', reading_status)
+    connection = db.session.connection()
+    # Links only matter to the change listeners when the status (and so the
+    # book's weight in the reader profile) changes
+    old = load_book_states(connection, [id], links=False).get(id)
+    if old is None:
+        return None
+    status = reading_status or progress_status(old, current_page)
+    if status != old['reading_status']:
+        old = load_book_states(connection, [id])[id]
+    connection.execute(update(Book.__table__).where(Book.__table__.c.id == id)
+                       .values(current_page=current_page, reading_status=status))
+    publish(connection, [(old, dict(old, current_page=current_page, reading_status=status))],
+            tables=[Book.__tablename__])
+    return {'id': id, 'current_page': current_page, 'reading_status': status}
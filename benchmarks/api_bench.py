@@ -0,0 +1,273 @@
+"""Benchmark every API route against the current database.
+
+Drives the read routes (book list variants, detail, stats, recommendations,
+bootstrap, reference lists, exports) and a write scenario (create, update and
+delete a book and an author) either in-process through the Flask test client
+or against a running server with --url. Prints, per route, p50/p95/p99 latency
+in ms, throughput and the SQL statements per request (from the Server-Timing
+header) as JSON. Fill the database with benchmarks/generate_library.py first:
+
+    python benchmarks/generate_library.py 100000
+    python benchmarks/api_bench.py --output before.json
+    python benchmarks/api_bench.py --compare before.json
+    python benchmarks/api_bench.py --url http://localhost:8000 --concurrency 8
+"""
+import argparse
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+parser = argparse.ArgumentParser(description='Benchmark the API routes')
+parser.add_argument('--requests', type=int, default=200, help='timed requests per route (default 200)')
+parser.add_argument('--warmup', type=int, default=10, help='untimed requests per route first (default 10)')
+parser.add_argument('--concurrency', type=int, default=1, help='requests in flight at once (default 1)')
+parser.add_argument('--url', help='benchmark a running server instead of the in-process test client')
+parser.add_argument('--sqlite', metavar='PATH', help='use this SQLite file instead of DATABASE_URL')
+parser.add_argument('--routes', help='only run routes whose name contains one of these (comma separated)')
+parser.add_argument('--output', metavar='FILE', help='also write the results to FILE')
+parser.add_argument('--compare', metavar='FILE', help='print p50/p95 changes against an earlier --output')
+args = parser.parse_args()
+if args.sqlite:
+    os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.abspath(args.sqlite)
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+SERVER_TIMING_QUERIES = re.compile(r'(\d+) queries')
+# Exports read the whole library; run them less often
+EXPORT_SHARE = 10
+
+
+class TestClient:
+    def __init__(self):
+        from app import create_app
+        app = create_app()
+        self.client = app.test_client()
+
+    def request(self, method, path, body=None):
+        response = self.client.open(path, method=method, json=body)
+        return response.status_code, response.headers, response.get_data()
+
+
+class HTTPClient:
+    def __init__(self, base):
+        self.base = base.rstrip('/')
+
+    def request(self, method, path, body=None):
+        data = json.dumps(body).encode() if body is not None else None
+        req = urllib.request.Request(self.base + path, data=data, method=method,
+                                     headers={'Content-Type': 'application/json'} if data else {})
+        try:
+            with urllib.request.urlopen(req) as response:
+                return response.status, response.headers, response.read()
+        except urllib.error.HTTPError as e:
+            return e.code, e.headers, e.read()
+
+
+def call(client, method, path, body=None, expect=200):
+    status, headers, content = client.request(method, path, body)
+    if status != expect:
+        raise RuntimeError(f'{method} {path} returned {status}: {content[:200]!r}')
+    match = SERVER_TIMING_QUERIES.search(headers.get('Server-Timing', ''))
+    data = json.loads(content) if headers.get('Content-Type', '').startswith('application/json') else None
+    return data, int(match.group(1)) if match else None
+
+
+def read_routes(client):
+    books, _ = call(client, 'GET', '/api/books?limit=50')
+    ids = [b['id'] for b in books['books']] or [1]
+    cursor = books['next_cursor']
+    status_page, _ = call(client, 'GET', '/api/books?limit=50&status=completed&sort=-rating')
+    routes = [
+        ('books', '/api/books'),
+        ('books sort=-created_at', '/api/books?sort=-created_at'),
+        ('books sort=-rating', '/api/books?sort=-rating'),
+        ('books status=reading', '/api/books?status=reading'),
+        ('books status=completed sort=-rating', '/api/books?status=completed&sort=-rating'),
+        ('books search', '/api/books?search=the%20river'),
+        ('books fields=id,title', '/api/books?fields=id,title&limit=200'),
+        ('books facets', '/api/books?facets=1'),
+        ('books genre+year facets', '/api/books?genre=1,2&year_min=1990&facets=1'),
+        ('book detail', [f'/api/books/{id}' for id in ids]),
+        ('stats', '/api/library/stats'),
+        ('recommendations', '/api/recommendations'),
+        ('bootstrap', '/api/bootstrap'),
+        ('authors', '/api/authors'),
+        ('publishers', '/api/publishers'),
+        ('genres', '/api/genres'),
+        ('topics', '/api/topics'),
+        ('categories', '/api/categories'),
+        ('series', '/api/series'),
+        ('export csv', '/api/export/csv?async=0'),
+        ('export json', '/api/export/json?async=0'),
+        ('export ndjson', '/api/export/ndjson?async=0'),
+    ]
+    if cursor:
+        routes.insert(1, ('books page 2', f'/api/books?limit=50&cursor={cursor}'))
+    if status_page['next_cursor']:
+        routes.insert(6, ('books status=completed sort=-rating page 2',
+                          f'/api/books?limit=50&status=completed&sort=-rating&cursor={status_page["next_cursor"]}'))
+    return routes
+
+
+def write_routes(client):
+    publishers, _ = call(client, 'GET', '/api/publishers')
+    authors, _ = call(client, 'GET', '/api/authors')
+    genres, _ = call(client, 'GET', '/api/genres')
+    book = {
+        'title': 'Benchmark Book', 'publisher_id': publishers[0]['id'], 'pages': 320,
+        'author_ids': [a['id'] for a in authors[:2]], 'genre_ids': [g['id'] for g in genres[:2]],
+    }
+    update = {'reading_status': 'completed', 'current_page': 320, 'rating': 4}
+    author = {'first_name': 'Bench', 'last_name': 'Mark'}
+
+    # Each step gets the id created by the step before it in the same iteration
+    return [
+        ('POST book', lambda ctx: ('POST', '/api/books', book, 201), 'book'),
+        ('PUT book', lambda ctx: ('PUT', f'/api/books/{ctx["book"]}', update, 200), None),
+        ('POST book progress', lambda ctx: ('POST', f'/api/books/{ctx["book"]}/progress', {'current_page': 10}, 200),
+         None),
+        ('PATCH books batch', lambda ctx: ('PATCH', '/api/books/batch', {'updates': [
+            dict(update, id=ctx['book'], genre_ids=[g['id'] for g in genres[1:3]])]}, 200), None),
+        ('DELETE book', lambda ctx: ('DELETE', f'/api/books/{ctx["book"]}', None, 204), None),
+        ('POST author', lambda ctx: ('POST', '/api/authors', author, 201), 'author'),
+        ('PUT author', lambda ctx: ('PUT', f'/api/authors/{ctx["author"]}', {'biography': 'x'}, 200), None),
+        ('DELETE author', lambda ctx: ('DELETE', f'/api/authors/{ctx["author"]}', None, 204), None),
+    ]
+
+
+def summarize(samples, queries, elapsed):
+    samples = sorted(samples)
+    if len(samples) > 1:
+        percentiles = statistics.quantiles(samples, n=100, method='inclusive')
+        p50, p95, p99 = percentiles[49], percentiles[94], percentiles[98]
+    else:
+        p50 = p95 = p99 = samples[0]
+    queries = [q for q in queries if q is not None]
+    return {
+        'requests': len(samples),
+        'p50_ms': round(p50, 2), 'p95_ms': round(p95, 2), 'p99_ms': round(p99, 2),
+        'max_ms': round(samples[-1], 2),
+        'throughput_rps': round(len(samples) / elapsed, 1),
+        'sql_statements': round(statistics.mean(queries), 1) if queries else None,
+    }
+
+
+def run_reads(client, paths, count, warmup, concurrency):
+    paths = paths if isinstance(paths, list) else [paths]
+    for i in range(warmup):
+        call(client, 'GET', paths[i % len(paths)])
+
+    def timed(i):
+        start = time.perf_counter()
+        _, queries = call(client, 'GET', paths[i % len(paths)])
+        return (time.perf_counter() - start) * 1000, queries
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as pool:
+        results = list(pool.map(timed, range(count)))
+    elapsed = time.perf_counter() - start
+    return summarize([r[0] for r in results], [r[1] for r in results], elapsed)
+
+
+def run_writes(client, steps, count, warmup, concurrency):
+    samples = {name: [] for name, _, _ in steps}
+    queries = {name: [] for name, _, _ in steps}
+    lock = threading.Lock()
+
+    def iteration(record):
+        ctx = {}
+        for name, make, saves in steps:
+            method, path, body, expect = make(ctx)
+            start = time.perf_counter()
+            data, count = call(client, method, path, body, expect)
+            elapsed = (time.perf_counter() - start) * 1000
+            if saves:
+                ctx[saves] = data['id']
+            if record:
+                with lock:
+                    samples[name].append(elapsed)
+                    queries[name].append(count)
+
+    for _ in range(warmup):
+        iteration(False)
+    start = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as pool:
+        list(pool.map(lambda _: iteration(True), range(count)))
+    elapsed = time.perf_counter() - start
+    return {name: summarize(samples[name], queries[name], elapsed) for name, _, _ in steps}
+
+
+def environment(client):
+    stats, _ = call(client, 'GET', '/api/library/stats')
+    try:
+        revision = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True,
+                                  text=True).stdout.strip() or None
+    except OSError:
+        revision = None
+    info = {'revision': revision, 'books': stats['total_books'], 'concurrency': args.concurrency,
+            'requests': args.requests}
+    if args.url:
+        info['url'] = args.url
+    else:
+        from app import create_app
+        from models import db
+        app = create_app()
+        with app.app_context():
+            info['database'] = db.engine.dialect.name
+    return info
+
+
+def compare(results, baseline_path):
+    with open(baseline_path) as f:
+        baseline = json.load(f)['routes']
+    lines = [f'{"route":<45} {"p50 ms":>18} {"p95 ms":>18}']
+    for name, result in results.items():
+        before = baseline.get(name)
+        if not before:
+            continue
+        cells = []
+        for key in ('p50_ms', 'p95_ms'):
+            change = (result[key] - before[key]) / before[key] * 100 if before[key] else 0
+            cells.append(f'{before[key]:>7} -> {result[key]:<7}{change:+.0f}%')
+        lines.append(f'{name:<45} {cells[0]:>18} {cells[1]:>18}')
+    return '\n'.join(lines)
+
+
+def main():
+    client = HTTPClient(args.url) if args.url else TestClient()
+    selected = [r.strip() for r in args.routes.split(',')] if args.routes else None
+    wanted = lambda name: not selected or any(s in name for s in selected)
+
+    results = {}
+    for name, paths in read_routes(client):
+        if not wanted(name):
+            continue
+        count = max(1, args.requests // EXPORT_SHARE) if name.startswith('export') else args.requests
+        warmup = min(args.warmup, 1) if name.startswith('export') else args.warmup
+        results[name] = run_reads(client, paths, count, warmup, args.concurrency)
+        print(f'{name:<45} p50 {results[name]["p50_ms"]:>8} ms', file=sys.stderr)
+    steps = write_routes(client)
+    if any(wanted(name) for name, _, _ in steps):
+        results.update(run_writes(client, steps, max(1, args.requests // len(steps)), min(args.warmup, 2),
+                                  args.concurrency))
+
+    output = {'environment': environment(client), 'routes': results}
+    print(json.dumps(output, indent=2))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(output, f, indent=2)
+    if args.compare:
+        print(compare(results, args.compare), file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
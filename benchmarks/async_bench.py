@@ -0,0 +1,118 @@
+"""Compare the multi-query endpoints with ASYNC_QUERIES off and on.
+
+Times /api/library/stats, /api/recommendations and /api/bootstrap through the
+test client, first running their independent queries one after another on
+db.session, then concurrently on the asyncio engine, and prints the median and
+p95 latency of both as JSON. The gain is the round trips saved, so on a local
+database it is small; --latency-ms routes the connections through a proxy that
+delays each direction by half that many ms, like a database on another host:
+
+    python benchmarks/async_bench.py --latency-ms 2
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy.engine import make_url
+
+URLS = ['/api/library/stats', '/api/recommendations', '/api/bootstrap']
+
+
+async def pipe(reader, writer, delay):
+    # Forward in order, each chunk delay seconds after it arrived
+    loop = asyncio.get_running_loop()
+    queue = asyncio.Queue()
+
+    async def send():
+        while True:
+            due, data = await queue.get()
+            await asyncio.sleep(max(0.0, due - loop.time()))
+            if not data:
+                writer.close()
+                return
+            writer.write(data)
+            await writer.drain()
+
+    sender = asyncio.create_task(send())
+    try:
+        while data := await reader.read(65536):
+            queue.put_nowait((loop.time() + delay, data))
+    except ConnectionError:
+        pass
+    queue.put_nowait((loop.time() + delay, b''))
+    await sender
+
+
+def start_proxy(url, latency_ms):
+    # Returns DATABASE_URL pointing at a local TCP proxy in front of url's server
+    url = make_url(url)
+    socket_dir = url.query.get('host')
+    delay = latency_ms / 2000
+    loop = asyncio.new_event_loop()
+
+    async def connect():
+        if socket_dir:
+            return await asyncio.open_unix_connection(f'{socket_dir}/.s.PGSQL.{url.port or 5432}')
+        return await asyncio.open_connection(url.host or 'localhost', url.port or 5432)
+
+    async def handle(client_reader, client_writer):
+        server_reader, server_writer = await connect()
+        await asyncio.gather(pipe(client_reader, server_writer, delay), pipe(server_reader, client_writer, delay))
+
+    server = loop.run_until_complete(asyncio.start_server(handle, '127.0.0.1', 0))
+    threading.Thread(target=loop.run_forever, daemon=True).start()
+    port = server.sockets[0].getsockname()[1]
+    return url.difference_update_query(['host']).set(host='127.0.0.1', port=port).render_as_string(
+        hide_password=False)
+
+
+def measure(client, url, runs):
+    samples = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        response = client.get(url)
+        samples.append((time.perf_counter() - start) * 1000)
+        assert response.status_code == 200, response.status_code
+    percentiles = statistics.quantiles(samples, n=100, method='inclusive')
+    return {'p50_ms': round(percentiles[49], 2), 'p95_ms': round(percentiles[94], 2)}, response.get_json()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Sequential vs concurrent queries on the aggregate endpoints')
+    parser.add_argument('--runs', type=int, default=100)
+    parser.add_argument('--latency-ms', type=float, default=0, help='simulated database round-trip time')
+    args = parser.parse_args()
+
+    if args.latency_ms:
+        from dotenv import load_dotenv
+        load_dotenv()
+        os.environ['DATABASE_URL'] = start_proxy(os.environ['DATABASE_URL'], args.latency_ms)
+    from app import create_app
+    import async_queries
+
+    results = {}
+    for mode in ('sequential', 'concurrent'):
+        client = create_app({'ASYNC_QUERIES': mode == 'concurrent'}).test_client()
+        for url in URLS:
+            client.get(url)
+            timing, payload = measure(client, url, args.runs)
+            results.setdefault(url, {})[mode] = timing
+            results[url].setdefault('payloads', []).append(payload)
+    async_queries.shutdown_async_queries()
+
+    for url, result in results.items():
+        sequential, concurrent = result.pop('payloads')
+        result['same_response'] = sequential == concurrent
+        result['p50_change'] = f'{(result["concurrent"]["p50_ms"] / result["sequential"]["p50_ms"] - 1) * 100:+.0f}%'
+    print(json.dumps({'latency_ms': args.latency_ms, 'runs': args.runs, 'endpoints': results}, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,94 @@
+"""Compare the read endpoints served by the ORM and by the catalogue snapshot.
+
+Builds the snapshot once to report its build time and memory (traced Python
+allocations, and per 100,000 books), then times each URL through the test
+client with CATALOGUE_SNAPSHOT off and on and prints the median and p95 latency
+of both as JSON, with whether the two responses are identical:
+
+    python benchmarks/generate_library.py 100000
+    python benchmarks/catalogue_bench.py
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+URLS = [
+    '/api/books',
+    '/api/books?sort=-created_at',
+    '/api/books?sort=-rating&status=completed',
+    '/api/books?fields=id,title&limit=200',
+    '/api/books?genre=1&year_min=1990&sort=-publication_year',
+    '/api/books?author=1',
+    '/api/authors',
+    '/api/genres',
+    '/api/library/stats',
+    '/api/bootstrap',
+]
+
+
+def measure(client, url, runs):
+    samples = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        response = client.get(url)
+        samples.append((time.perf_counter() - start) * 1000)
+        assert response.status_code == 200, response.status_code
+    percentiles = statistics.quantiles(samples, n=100, method='inclusive')
+    return {'p50_ms': round(percentiles[49], 2), 'p95_ms': round(percentiles[94], 2)}, response.get_json()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='ORM vs in-memory catalogue snapshot on the read endpoints')
+    parser.add_argument('--runs', type=int, default=50)
+    args = parser.parse_args()
+
+    from app import create_app
+    import catalogue
+
+    app = create_app({'CATALOGUE_SNAPSHOT': False})
+
+    with app.app_context():
+        versions = catalogue.table_versions(catalogue.CATALOGUE_TABLES)
+        start = time.perf_counter()
+        snapshot = catalogue.Catalogue.load(versions)
+        build_s = time.perf_counter() - start
+        books = len(snapshot.records)
+        del snapshot
+        # Traced separately: tracing slows the build down several times
+        tracemalloc.start()
+        snapshot = catalogue.Catalogue.load(versions)
+        memory = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        del snapshot
+
+    results = {}
+    for mode in ('orm', 'snapshot'):
+        client = create_app({'CATALOGUE_SNAPSHOT': mode == 'snapshot'}).test_client()
+        for url in URLS:
+            client.get(url)
+            timing, payload = measure(client, url, args.runs)
+            results.setdefault(url, {})[mode] = timing
+            results[url].setdefault('payloads', []).append(payload)
+
+    for url, result in results.items():
+        orm, snapshot = result.pop('payloads')
+        result['same_response'] = orm == snapshot
+        result['p50_change'] = f'{(result["snapshot"]["p50_ms"] / result["orm"]["p50_ms"] - 1) * 100:+.0f}%'
+    print(json.dumps({
+        'books': books,
+        'build_s': round(build_s, 2),
+        'memory_mb': round(memory / 2 ** 20, 1),
+        'memory_mb_per_100k_books': round(memory / 2 ** 20 * 100000 / books, 1) if books else None,
+        'runs': args.runs,
+        'endpoints': results,
+    }, indent=2))
+
+
+if __name__ == '__main__':
+    main()
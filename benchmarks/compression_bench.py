@@ -0,0 +1,77 @@
+"""Measure bytes on the wire with and without response compression.
+
+Fetches each URL through the test client as identity, gzip and (with brotli
+installed) br, and the static assets from a fresh `flask build-assets`, then
+prints the transferred bytes, the saving against identity and, for the API
+responses, the median time spent compressing as JSON:
+
+    python benchmarks/generate_library.py 100000
+    python benchmarks/compression_bench.py
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+URLS = [
+    '/api/books',
+    '/api/books?limit=200',
+    '/api/books?genre=1&facets=1',
+    '/api/authors',
+    '/api/library/stats',
+    '/api/bootstrap',
+    '/api/export/json?async=0',
+    '/api/export/ndjson?async=0',
+    '/api/export/csv?async=0',
+    '/',
+]
+
+
+def compress_ms(body, encoding, runs):
+    from compression import compress
+    samples = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        compress(body, encoding)
+        samples.append((time.perf_counter() - start) * 1000)
+    return round(statistics.median(samples), 2)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Response sizes with gzip and brotli compression')
+    parser.add_argument('--runs', type=int, default=5)
+    args = parser.parse_args()
+
+    from app import create_app
+    from assets import build_assets
+    from compression import ENCODINGS
+    app = create_app()
+
+    client = app.test_client()
+    results = {}
+    for url in URLS:
+        body = client.get(url, headers={'Accept-Encoding': 'identity'}).data
+        result = {'identity_bytes': len(body)}
+        for encoding in ENCODINGS:
+            response = client.get(url, headers={'Accept-Encoding': encoding})
+            size = len(response.data)
+            result[encoding] = {'bytes': size, 'saving': f'{(1 - size / len(body)) * 100:.1f}%',
+                                'compress_ms': compress_ms(body, encoding, args.runs)}
+        results[url] = result
+
+    assets = {}
+    for name, (_, sizes) in build_assets(app.static_folder).items():
+        assets[name] = {'identity_bytes': sizes['']}
+        for encoding, suffix in (('br', '.br'), ('gzip', '.gz')):
+            if suffix in sizes:
+                assets[name][encoding] = {'bytes': sizes[suffix],
+                                          'saving': f'{(1 - sizes[suffix] / sizes[""]) * 100:.1f}%'}
+    print(json.dumps({'responses': results, 'static_assets': assets}, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,55 @@
+"""Time duplicate detection and the recommendations with owned books hidden.
+
+Run after `flask rebuild-match-keys` so every book has its keys. Prints the median
+time and size of the duplicate report, the number of groups found, and the time of
+the recommendations query as JSON:
+
+    python benchmarks/generate_library.py 100000
+    flask rebuild-match-keys
+    python benchmarks/dedupe_bench.py
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def measure(fn, runs):
+    samples = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        result = fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return round(statistics.median(samples), 2), result
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Duplicate detection and owned-book filtering')
+    parser.add_argument('--runs', type=int, default=5)
+    args = parser.parse_args()
+
+    from app import create_app
+    from dedupe import duplicate_groups
+    from recommendations import recommend_query
+    app = create_app()
+
+    client = app.test_client()
+    results = {}
+    with app.app_context():
+        ms, groups = measure(duplicate_groups, args.runs)
+        results['duplicate_groups'] = {'ms': ms, 'groups': len(groups),
+                                       'books': sum(len(ids) for _, ids in groups)}
+        ms, _ = measure(lambda: recommend_query().all(), args.runs)
+        results['recommend_query'] = {'ms': ms}
+    for url in ['/api/books/duplicates', '/api/recommendations']:
+        ms, response = measure(lambda: client.get(url), args.runs)
+        results[url] = {'ms': ms, 'bytes': len(response.data)}
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
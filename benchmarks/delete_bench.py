@@ -0,0 +1,59 @@
+"""Compare deleting books through the ORM with the set-based delete_books().
+
+For each size, deletes that many books both ways inside a transaction that is
+rolled back, so the library is left as it was, and prints the SQL statements
+and time each way took as JSON:
+
+    python benchmarks/generate_library.py 100000
+    python benchmarks/delete_bench.py 100 1000 10000
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='ORM vs set-based book deletes')
+    parser.add_argument('sizes', nargs='*', type=int, default=[100, 1000, 10000])
+    parser.add_argument('--orm-limit', type=int, default=10000,
+                        help='Skip the ORM delete above this many books (it takes long)')
+    args = parser.parse_args()
+
+    from sqlalchemy import event, select
+    from app import create_app
+    from deletes import delete_books
+    from models import db, Book
+    app = create_app()
+
+    statements = []
+    results = {}
+    with app.app_context():
+        event.listen(db.engine, 'before_cursor_execute', lambda *a: statements.append(1))
+
+        def orm_delete(ids):
+            for book in Book.query.filter(Book.id.in_(ids)):
+                db.session.delete(book)
+            db.session.flush()
+
+        for size in args.sizes:
+            ids = db.session.execute(select(Book.id).order_by(Book.id.desc()).limit(size)).scalars().all()
+            db.session.rollback()
+            results[size] = {}
+            for name, run in (('orm', orm_delete), ('set_based', delete_books)):
+                if name == 'orm' and size > args.orm_limit:
+                    continue
+                statements.clear()
+                start = time.perf_counter()
+                run(ids)
+                elapsed = time.perf_counter() - start
+                db.session.rollback()
+                results[size][name] = {'statements': len(statements), 'seconds': round(elapsed, 3)}
+    print(json.dumps({'books_deleted': results}, indent=2))
+
+
+if __name__ == '__main__':
+    main()
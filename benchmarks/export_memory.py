@@ -0,0 +1,68 @@
+"""Check that the streaming exports keep memory flat as the library grows.
+
+Fills a scratch SQLite database (or the database in DATABASE_URL when
+--use-database is given) with synthetic books, streams every export format
+through the Flask test client and reports the tracemalloc peak per size:
+
+    python benchmarks/export_memory.py 10000 100000
+"""
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+if '--use-database' not in sys.argv:
+    os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'export_memory.db')
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app
+from models import db, Book, Author, Publisher, book_authors
+
+app = create_app()
+
+FORMATS = ['csv', 'json', 'ndjson']
+BATCH = 10000
+
+
+def fill(total):
+    db.drop_all()
+    db.create_all()
+    db.session.execute(Publisher.__table__.insert(), [{'id': 1, 'name': 'Synthetic Press'}])
+    db.session.execute(Author.__table__.insert(),
+                       [{'id': i, 'first_name': 'Author', 'last_name': str(i)} for i in range(1, 1001)])
+    for start in range(1, total + 1, BATCH):
+        ids = range(start, min(start + BATCH, total + 1))
+        db.session.execute(Book.__table__.insert(), [{
+            'id': i, 'title': f'Synthetic Book {i}', 'isbn': f'{i:013d}', 'publication_year': 1900 + i % 120,
+            'pages': 100 + i % 900, 'publisher_id': 1, 'reading_status': 'unread', 'current_page': 0,
+        } for i in ids])
+        db.session.execute(book_authors.insert(), [{'book_id': i, 'author_id': 1 + i % 1000} for i in ids])
+    db.session.commit()
+
+
+def measure(client, fmt):
+    tracemalloc.start()
+    start = time.perf_counter()
+    response = client.get(f'/api/export/{fmt}?async=0')
+    size = sum(len(chunk) for chunk in response.response)
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {'bytes': size, 'seconds': round(elapsed, 2), 'peak_mb': round(peak / 1024 / 1024, 2)}
+
+
+def main(sizes):
+    results = []
+    with app.app_context():
+        for total in sizes:
+            fill(total)
+            client = app.test_client()
+            results.append({'books': total, **{fmt: measure(client, fmt) for fmt in FORMATS}})
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main([int(a) for a in sys.argv[1:] if a.isdigit()] or [10000, 100000])
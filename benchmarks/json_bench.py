@@ -0,0 +1,94 @@
+"""Time JSON encoding per 10,000 books with the stdlib encoder and with orjson.
+
+Loads up to --books books once, then encodes the same data repeatedly and
+prints the median time per 10,000 books as JSON:
+
+- the /api/books payload (serialized books, sorted keys, compact), as Flask's
+  stdlib provider and as the orjson provider encode it
+- the NDJSON export lines
+- plain book rows, built into dicts first (as a serializer would) or passed to
+  the provider as SQLAlchemy Rows
+
+    python benchmarks/generate_library.py 100000
+    python benchmarks/json_bench.py
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+ROW_COLUMNS = ('id', 'title', 'isbn', 'publication_year', 'pages', 'language', 'reading_status',
+               'current_page', 'rating')
+
+
+def median_ms(encode, runs):
+    samples = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        encode()
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='JSON encode time per 10,000 books, stdlib vs orjson')
+    parser.add_argument('--books', type=int, default=10000)
+    parser.add_argument('--runs', type=int, default=20)
+    args = parser.parse_args()
+
+    from flask.json.provider import DefaultJSONProvider
+    from sqlalchemy import select
+    from app import create_app
+    from json_provider import FastJSONProvider, dumps, encode_default, orjson
+    from models import db, Book
+    from serializers import book_list_query, book_export_query, serialize_book, serialize_book_export
+    app = create_app()
+
+    if orjson is None:
+        sys.exit('orjson is not installed: pip install orjson')
+
+    with app.app_context():
+        books = book_list_query().order_by(Book.id).limit(args.books).all()
+        payload = {'books': [serialize_book(b) for b in books], 'next_cursor': None, 'has_more': False}
+        exports = [serialize_book_export(b) for b in book_export_query().order_by(Book.id).limit(args.books)]
+        rows = db.session.execute(select(*[getattr(Book, c) for c in ROW_COLUMNS])
+                                  .order_by(Book.id).limit(args.books)).all()
+        count = len(books)
+    if not count:
+        sys.exit('No books; run benchmarks/generate_library.py first')
+
+    stock, fast = DefaultJSONProvider(app), FastJSONProvider(app)
+    cases = {
+        'book_list': {
+            'stdlib': lambda: stock.response(payload),
+            'orjson': lambda: fast.response(payload),
+        },
+        'ndjson_export': {
+            'stdlib': lambda: ''.join(json.dumps(book, ensure_ascii=False) + '\n' for book in exports),
+            'orjson': lambda: ''.join(dumps(book) + '\n' for book in exports),
+        },
+        'rows': {
+            'stdlib_dicts': lambda: stock.response([{c: getattr(row, c) for c in ROW_COLUMNS} for row in rows]),
+            'stdlib_rows': lambda: stock.response([encode_default(row) for row in rows]),
+            'orjson_dicts': lambda: fast.response([{c: getattr(row, c) for c in ROW_COLUMNS} for row in rows]),
+            'orjson_rows': lambda: fast.response(rows),
+        },
+    }
+    with app.app_context():
+        results = {}
+        for name, encoders in cases.items():
+            timings = {mode: median_ms(encode, args.runs) * 10000 / count for mode, encode in encoders.items()}
+            baseline = next(iter(timings.values()))
+            results[name] = {mode: {'ms_per_10k_books': round(ms, 2),
+                                    'speedup': round(baseline / ms, 2)} for mode, ms in timings.items()}
+        results['book_list']['bytes'] = len(fast.response(payload).data)
+    print(json.dumps({'books': count, 'runs': args.runs, 'orjson': orjson.__version__, 'encode': results},
+                     indent=2))
+
+
+if __name__ == '__main__':
+    main()
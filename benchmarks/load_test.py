@@ -0,0 +1,134 @@
+"""Measure throughput as gunicorn workers are added, against one database.
+
+For each worker count, starts gunicorn (gunicorn.conf.py) on a local port
+against DATABASE_URL, drives it with concurrent keep-alive clients cycling
+through the main read routes for a fixed time, stops it with SIGTERM and
+prints requests/s, latency percentiles, errors and the pool metrics as JSON:
+
+    python benchmarks/generate_library.py 100000
+    python benchmarks/load_test.py --workers 1,2,4,8 --clients 32 --duration 20
+"""
+import argparse
+import http.client
+import json
+import os
+import re
+import signal
+import statistics
+import subprocess
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PATHS = [
+    '/api/books',
+    '/api/books?sort=-created_at',
+    '/api/books?status=completed&sort=-rating',
+    '/api/books?search=the%20river',
+    '/api/library/stats',
+    '/api/recommendations',
+    '/api/bootstrap',
+    '/api/genres',
+] + [f'/api/books/{id}' for id in range(1, 9)]
+POOL_METRICS = re.compile(r'^(db_pool_(?:exhausted|timeouts)_total) (\d+)', re.MULTILINE)
+
+
+def client(port, duration, offset):
+    # One keep-alive connection per client process, cycling through PATHS
+    connection = http.client.HTTPConnection('127.0.0.1', port, timeout=60)
+    latencies, errors = [], 0
+    end = time.perf_counter() + duration
+    i = offset
+    while time.perf_counter() < end:
+        start = time.perf_counter()
+        try:
+            connection.request('GET', PATHS[i % len(PATHS)])
+            response = connection.getresponse()
+            response.read()
+            if response.status != 200:
+                errors += 1
+            else:
+                latencies.append((time.perf_counter() - start) * 1000)
+        except (OSError, http.client.HTTPException):
+            errors += 1
+            connection.close()
+        i += 1
+    return latencies, errors
+
+
+def wait_until_ready(port, process, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError('gunicorn exited during startup')
+        try:
+            connection = http.client.HTTPConnection('127.0.0.1', port, timeout=5)
+            connection.request('GET', '/api/library/stats')
+            if connection.getresponse().status == 200:
+                return
+        except OSError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError('gunicorn did not start in time')
+
+
+def scrape_pool_metrics(port):
+    # /metrics is per worker, so this samples whichever worker answers
+    connection = http.client.HTTPConnection('127.0.0.1', port, timeout=5)
+    connection.request('GET', '/metrics')
+    text = connection.getresponse().read().decode()
+    counts = {'db_pool_exhausted_total': 0, 'db_pool_timeouts_total': 0}
+    counts.update((name, int(value)) for name, value in POOL_METRICS.findall(text))
+    return counts
+
+
+def run(workers, args):
+    env = dict(os.environ, WEB_WORKERS=str(workers), WEB_BIND=f'127.0.0.1:{args.port}', WEB_ACCESS_LOG='')
+    process = subprocess.Popen([sys.executable, '-m', 'gunicorn'], cwd=ROOT, env=env)
+    try:
+        wait_until_ready(args.port, process)
+        # Warm every worker's pool and the per-process caches before timing
+        with ProcessPoolExecutor(args.clients) as pool:
+            list(pool.map(client, [args.port] * args.clients, [1] * args.clients, range(args.clients)))
+            start = time.perf_counter()
+            results = list(pool.map(client, [args.port] * args.clients, [args.duration] * args.clients,
+                                    range(args.clients)))
+            elapsed = time.perf_counter() - start
+        pool_metrics = scrape_pool_metrics(args.port)
+    finally:
+        process.send_signal(signal.SIGTERM)
+        exit_code = process.wait(timeout=60)
+
+    latencies = sorted(l for result in results for l in result[0])
+    percentiles = statistics.quantiles(latencies, n=100, method='inclusive')
+    return {
+        'workers': workers,
+        'requests': len(latencies),
+        'errors': sum(result[1] for result in results),
+        'throughput_rps': round(len(latencies) / elapsed, 1),
+        'p50_ms': round(percentiles[49], 2),
+        'p95_ms': round(percentiles[94], 2),
+        'p99_ms': round(percentiles[98], 2),
+        'pool': pool_metrics,
+        'clean_shutdown': exit_code == 0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Throughput across gunicorn worker counts')
+    parser.add_argument('--workers', default='1,2,4', help='comma separated worker counts (default 1,2,4)')
+    parser.add_argument('--clients', type=int, default=16, help='concurrent client processes (default 16)')
+    parser.add_argument('--duration', type=float, default=10, help='seconds per worker count (default 10)')
+    parser.add_argument('--port', type=int, default=8765)
+    args = parser.parse_args()
+
+    results = []
+    for workers in [int(w) for w in args.workers.split(',')]:
+        results.append(run(workers, args))
+        print(f'{workers} worker(s): {results[-1]["throughput_rps"]} req/s', file=sys.stderr)
+    print(json.dumps({'cpus': os.cpu_count(), 'clients': args.clients, 'results': results}, indent=2))
+
+
+if __name__ == '__main__':
+    main()
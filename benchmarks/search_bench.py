@@ -0,0 +1,65 @@
+"""Compare the old ILIKE search with the full-text search path.
+
+Runs each query against the database in DATABASE_URL and prints median
+wall time and the scan nodes of the plan for both variants as JSON:
+
+    python benchmarks/search_bench.py harry "lord of the" tolkein
+"""
+import json
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app
+from models import db, Book
+from search import apply_search, substring_match
+
+app = create_app()
+
+RUNS = 20
+DEFAULT_QUERIES = ['harry', 'lord of the', 'tolkein', 'dystopian', 'war']
+
+
+def timed(query):
+    samples = []
+    for _ in range(RUNS):
+        start = time.perf_counter()
+        query.all()
+        samples.append((time.perf_counter() - start) * 1000)
+    return round(statistics.median(samples), 3)
+
+
+def plan(query):
+    compiled = query.statement.compile(db.engine)
+    rows = db.session.connection().exec_driver_sql(f'EXPLAIN {compiled}', compiled.params).scalars().all()
+    return [line.strip().lstrip('-> ') for line in rows if 'Scan' in line]
+
+
+def main(queries):
+    results = []
+    with app.app_context():
+        total = Book.query.count()
+        base = Book.query.with_entities(Book.id)
+        for q in queries:
+            ilike = base.filter(substring_match(q)).limit(50)
+            searched, rank = apply_search(base, q)
+            if rank is not None:
+                searched = searched.order_by(rank.desc())
+            searched = searched.limit(50)
+            results.append({
+                'query': q,
+                'ilike_ms': timed(ilike),
+                'search_ms': timed(searched),
+                'ilike_hits': ilike.count(),
+                'search_hits': searched.count(),
+                'ilike_plan': plan(ilike) if db.engine.dialect.name == 'postgresql' else None,
+                'search_plan': plan(searched) if db.engine.dialect.name == 'postgresql' else None,
+            })
+    print(json.dumps({'books': total, 'results': results}, indent=2))
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:] or DEFAULT_QUERIES)
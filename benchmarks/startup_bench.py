@@ -0,0 +1,89 @@
+"""Time a cold start of the app and fail when it goes over budget.
+
+Each run is a fresh Python process, like a new worker or a test process: it
+imports app.py, calls create_app() and serves one request. Prints the median
+milliseconds of each step as JSON, and exits non-zero when importing plus
+create_app() takes longer than --budget-ms or when create_app() sent any SQL to
+the database (the schema is only created by `flask init-db`):
+
+    python benchmarks/startup_bench.py
+    python benchmarks/startup_bench.py --runs 20 --budget-ms 400
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+DEFAULT_URL = '/api/books?limit=1'
+
+
+def child(url):
+    start = time.perf_counter()
+    from app import create_app
+    imported = time.perf_counter()
+    from sqlalchemy import event
+    from sqlalchemy.engine import Engine
+    statements = []
+    event.listen(Engine, 'before_cursor_execute', lambda conn, cursor, statement, *args: statements.append(statement))
+    app = create_app()
+    created = time.perf_counter()
+    startup_sql = list(statements)
+    status = None
+    if url:
+        status = app.test_client().get(url).status_code
+    served = time.perf_counter()
+    print(json.dumps({
+        'import_ms': (imported - start) * 1000,
+        'create_app_ms': (created - imported) * 1000,
+        'first_request_ms': (served - created) * 1000 if url else None,
+        'first_request_status': status,
+        'startup_sql': startup_sql,
+        'catalogue_snapshot': app.config['CATALOGUE_SNAPSHOT'],
+    }))
+
+
+def run_child(url):
+    output = subprocess.run([sys.executable, os.path.abspath(__file__), '--child', '--url', url],
+                            cwd=ROOT, capture_output=True, text=True, check=True).stdout
+    return json.loads(output.splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Cold start time of the app, with a budget')
+    parser.add_argument('--runs', type=int, default=10)
+    parser.add_argument('--budget-ms', type=float, default=600,
+                        help='most the median import plus create_app() may take')
+    parser.add_argument('--url', default=DEFAULT_URL, help='first request to time; empty to skip it')
+    parser.add_argument('--child', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        return child(args.url)
+
+    # The first run also warms the OS file cache and the bytecode, like a deploy would
+    run_child(args.url)
+    runs = [run_child(args.url) for _ in range(args.runs)]
+    result = {key: round(statistics.median(run[key] for run in runs), 1)
+              for key in ('import_ms', 'create_app_ms', 'first_request_ms') if runs[0][key] is not None}
+    result['startup_ms'] = round(statistics.median(run['import_ms'] + run['create_app_ms'] for run in runs), 1)
+    result['first_request_status'] = runs[0]['first_request_status']
+    result['startup_sql'] = runs[0]['startup_sql']
+    result['budget_ms'] = args.budget_ms
+    print(json.dumps(result, indent=2))
+
+    failures = []
+    if result['startup_ms'] > args.budget_ms:
+        failures.append(f'startup took {result["startup_ms"]} ms, over the {args.budget_ms} ms budget')
+    if result['startup_sql'] and not runs[0]['catalogue_snapshot']:
+        failures.append(f'create_app() ran {len(result["startup_sql"])} SQL statement(s)')
+    if failures:
+        sys.exit('; '.join(failures))
+
+
+if __name__ == '__main__':
+    main()
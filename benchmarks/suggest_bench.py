@@ -0,0 +1,57 @@
+"""Compare loading whole reference lists with the type-ahead suggestions.
+
+The book form used to fetch every author, publisher and series when the page
+loaded; it now asks /api/suggest/<entity> as the user types. This prints the
+median time and bytes of each full list and of the suggestions for a few
+prefixes of growing length as JSON:
+
+    python benchmarks/generate_library.py 100000
+    python benchmarks/suggest_bench.py
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+from urllib.parse import urlencode
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+LISTS = ['/api/authors', '/api/publishers', '/api/series']
+QUERIES = {
+    'authors': ['j', 'jo', 'mur', 'haruki mur', 'ishigur'],
+    'publishers': ['w', 'wil', 'johnson & s'],
+    'series': ['t', 'the riv', 'cycle 12'],
+    'titles': ['t', 'the br', 'broken city'],
+}
+
+
+def measure(client, url, runs):
+    samples = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        response = client.get(url)
+        samples.append((time.perf_counter() - start) * 1000)
+    return {'ms': round(statistics.median(samples), 2), 'bytes': len(response.data)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Full reference lists vs type-ahead suggestions')
+    parser.add_argument('--runs', type=int, default=5)
+    args = parser.parse_args()
+
+    from app import create_app
+    app = create_app()
+
+    client = app.test_client()
+    results = {'full_lists': {url: measure(client, url, args.runs) for url in LISTS}, 'suggest': {}}
+    for entity, queries in QUERIES.items():
+        for q in queries:
+            url = f'/api/suggest/{entity}?{urlencode({"q": q})}'
+            results['suggest'][url] = measure(client, url, args.runs)
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
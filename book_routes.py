@@ -0,0 +1,179 @@
+from flask import Blueprint, request, jsonify
+from sqlalchemy.exc import StatementError
+from models import db, Book, Author, Genre, Topic
+from serializers import (book_list_query, book_detail_query, serialize_book, serialize_book_detail,
+                         parse_fields)
+from pagination import paginate, parse_sort, sort_columns, PaginationError
+from search import search_filter
+from facets import parse_filters, filter_conditions, facet_counts
+from caching import cached_get, BOOK_LIST_TABLES, BOOK_DETAIL_TABLES, DUPLICATE_TABLES
+from batch_updates import UPDATE_FIELDS, BatchError, parse_updates, apply_updates, record_progress
+from catalogue import current_catalogue
+from deletes import parse_delete, delete_books
+from dedupe import find_duplicates, merge_books
+
+bp = Blueprint('books', __name__)
+
+
+def book_list_payload(args):
+    # Raises ValueError (including PaginationError) for invalid parameters
+    fields = parse_fields(args.get('fields'))
+    sort = args.get('sort')
+    filters = parse_filters(args)
+    search = args.get('search', '')
+    search_condition = None
+    # Searches need the database's text search
+    catalogue = current_catalogue() if not search else None
+    if catalogue is not None and catalogue.serves_sort(sort):
+        payload = catalogue.book_list(fields, filters, sort, args.get('cursor'), args.get('limit'))
+    else:
+        query = book_list_query(fields, extra_columns=sort_columns(parse_sort(sort)[0]))
+        rank = None
+        if search:
+            search_condition, rank = search_filter(search)
+            query = query.filter(search_condition)
+        query = query.filter(*filter_conditions(filters).values())
+
+        books, next_cursor, has_more = paginate(query, sort, args.get('cursor'), args.get('limit'), rank=rank)
+        payload = {
+            'books': [serialize_book(b, fields) for b in books],
+            'next_cursor': next_cursor,
+            'has_more': has_more
+        }
+    # Facet counts describe the whole result, so only the first page carries them
+    if args.get('facets') in ('1', 'true') and not args.get('cursor'):
+        payload.update(facet_counts(filters, search_condition))
+    return payload
+
+
+@bp.route('/api/books', methods=['GET'])
+@cached_get(*BOOK_LIST_TABLES)
+def get_books():
+    try:
+        return jsonify(book_list_payload(request.args))
+    except (ValueError, PaginationError) as e:
+        return jsonify({'error': str(e)}), 400
+
+
+@bp.route('/api/books/<int:id>', methods=['GET'])
+@cached_get(*BOOK_DETAIL_TABLES)
+def get_book(id):
+    book = book_detail_query().get_or_404(id)
+    return jsonify(serialize_book_detail(book))
+
+
+@bp.route('/api/books', methods=['POST'])
+def create_book():
+    data = request.json
+    book = Book(
+        title=data['title'],
+        isbn=data.get('isbn'),
+        publication_year=data.get('publication_year'),
+        pages=data.get('pages'),
+        language=data.get('language'),
+        description=data.get('description'),
+        publisher_id=data['publisher_id'],
+        series_id=data.get('series_id'),
+        series_position=data.get('series_position'),
+        category_id=data.get('category_id'),
+        reading_status=data.get('reading_status', 'unread')
+    )
+
+    if 'author_ids' in data:
+        book.authors = Author.query.filter(Author.id.in_(data['author_ids'])).all()
+    if 'genre_ids' in data:
+        book.genres = Genre.query.filter(Genre.id.in_(data['genre_ids'])).all()
+    if 'topic_ids' in data:
+        book.topics = Topic.query.filter(Topic.id.in_(data['topic_ids'])).all()
+
+    db.session.add(book)
+    db.session.commit()
+
+    return jsonify({'id': book.id, 'message': 'Book created'}), 201
+
+
+@bp.route('/api/books/<int:id>', methods=['PUT'])
+def update_book(id):
+    book = Book.query.get_or_404(id)
+    data = request.json
+
+    for field in UPDATE_FIELDS:
+        if field in data:
+            setattr(book, field, data[field])
+
+    if 'author_ids' in data:
+        book.authors = Author.query.filter(Author.id.in_(data['author_ids'])).all()
+    if 'genre_ids' in data:
+        book.genres = Genre.query.filter(Genre.id.in_(data['genre_ids'])).all()
+    if 'topic_ids' in data:
+        book.topics = Topic.query.filter(Topic.id.in_(data['topic_ids'])).all()
+
+    db.session.commit()
+    return jsonify({'message': 'Book updated'})
+
+
+@bp.route('/api/books/batch', methods=['PATCH'])
+def update_books():
+    try:
+        ids = apply_updates(parse_updates(request.json))
+        db.session.commit()
+    except BatchError as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 400
+    except StatementError as e:
+        # Integrity and data errors, and values the driver can't bind
+        db.session.rollback()
+        return jsonify({'error': f'Rejected by the database: {e.orig}'}), 400
+    return jsonify({'updated': len(ids), 'ids': ids})
+
+
+@bp.route('/api/books/<int:id>/progress', methods=['POST'])
+def book_progress(id):
+    data = request.json or {}
+    try:
+        progress = record_progress(id, data.get('current_page'), data.get('reading_status'))
+    except BatchError as e:
+        return jsonify({'error': str(e)}), 400
+    if progress is None:
+        return jsonify({'error': 'Book not found'}), 404
+    db.session.commit()
+    return jsonify(progress)
+
+
+@bp.route('/api/books/<int:id>', methods=['DELETE'])
+def delete_book(id):
+    if not delete_books([id]):
+        return jsonify({'error': 'Book not found'}), 404
+    db.session.commit()
+    return '', 204
+
+
+@bp.route('/api/books', methods=['DELETE'])
+def delete_books_bulk():
+    try:
+        ids = delete_books(parse_delete(request.args, request.get_json(silent=True)))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    db.session.commit()
+    return jsonify({'deleted': len(ids), 'ids': ids})
+
+
+@bp.route('/api/books/duplicates', methods=['GET'])
+@cached_get(*DUPLICATE_TABLES)
+def book_duplicates():
+    try:
+        return jsonify(find_duplicates(request.args.get('limit')))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+
+@bp.route('/api/books/<int:id>/merge', methods=['POST'])
+def merge_book(id):
+    book = book_detail_query().get_or_404(id)
+    try:
+        merge_books(book, (request.get_json(silent=True) or {}).get('ids'))
+    except ValueError as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 400
+    db.session.commit()
+    return jsonify(serialize_book_detail(book))
@@ -0,0 +1,82 @@
+import hashlib
+import random
+from functools import wraps
+from flask import request, make_response
+from sqlalchemy import select
+from changes import on_tables_changed
+from models import db, TableVersion
+from sqlhelpers import dialect_insert
+
+# Part of every ETag; bump when a response format changes so clients drop cached bodies
+CACHE_VERSION = 2
+# Clients may store responses but must revalidate them on every use
+CACHE_CONTROL = 'private, no-cache'
+
+# Tables each read endpoint's response is built from
+REFERENCE_TABLES = {
+    'authors': ('authors',),
+    'publishers': ('publishers',),
+    'genres': ('genres',),
+    'topics': ('topics',),
+    'categories': ('categories',),
+    'series': ('series',),
+}
+BOOK_LIST_TABLES = ('books', 'book_authors', 'book_genres', 'book_topics', 'authors', 'publishers', 'genres',
+                    'topics', 'series', 'categories')
+BOOK_DETAIL_TABLES = ('books', 'book_authors', 'book_genres', 'book_topics', 'authors', 'publishers', 'series')
+STATS_TABLES = ('books', 'book_genres', 'authors', 'publishers', 'genres', 'categories')
+RECOMMENDATION_TABLES = ('books', 'book_authors', 'book_genres', 'book_topics', 'authors', 'genres',
+                         'topics', 'recommended_books', 'recommended_book_genres',
+                         'recommended_book_topics', 'recommendation_scores')
+DUPLICATE_TABLES = ('books', 'book_authors', 'authors', 'publishers')
+# Suggestions rank names by how many books use them
+SUGGEST_TABLES = ('books', 'book_authors', 'authors', 'publishers', 'series')
+BOOTSTRAP_TABLES = tuple(sorted({t for tables in REFERENCE_TABLES.values() for t in tables}
+                                .union(BOOK_LIST_TABLES, STATS_TABLES, RECOMMENDATION_TABLES)))
+
+
+@on_tables_changed
+def bump_versions(connection, tables):
+    # New counters start at a random value so a recreated database doesn't hand out
+    # ETags that clients cached from the old one
+    table = TableVersion.__table__
+    stmt = dialect_insert(connection, table)
+    stmt = stmt.on_conflict_do_update(index_elements=['name'], set_={'version': table.c.version + 1})
+    connection.execute(stmt, [{'name': name, 'version': random.randrange(1, 2 ** 30)}
+                              for name in sorted(tables)])
+
+
+def table_versions(tables, connection=None):
+    rows = (connection or db.session).execute(select(TableVersion.name, TableVersion.version)
+                                              .where(TableVersion.name.in_(tables)))
+    return dict(rows.all())
+
+
+def current_etag(tables):
+    # Read before the view runs, so a concurrent write can only make the body newer
+    # than its tag, never older
+    versions = table_versions(tables)
+    key = [str(CACHE_VERSION), request.full_path] + [f'{t}={versions.get(t, 0)}' for t in sorted(tables)]
+    return hashlib.sha1('\n'.join(key).encode('utf-8')).hexdigest()
+
+
+def cached_get(*tables):
+    # Strong ETag from the versions of the tables a GET response depends on; a matching
+    # If-None-Match gets a 304 without running the view
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            if request.method != 'GET':
+                return view(*args, **kwargs)
+            etag = current_etag(tables)
+            if request.if_none_match.contains_weak(etag):
+                response = make_response('', 304)
+            else:
+                response = make_response(view(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+            response.set_etag(etag)
+            response.headers['Cache-Control'] = CACHE_CONTROL
+            return response
+        return wrapper
+    return decorator
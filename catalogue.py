@@ -0,0 +1,354 @@
+import threading
+from bisect import bisect_left, bisect_right, insort
+from collections import Counter
+from sqlalchemy import event, select, text
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import Session
+from caching import table_versions
+from changes import STATE_COLUMNS, STATE_LINKS, on_books_written, on_tables_changed
+from facets import LINK_FACETS, COLUMN_FACETS, VALUE_FACETS, RANGE_FACETS, in_range
+from models import db, Book
+from pagination import RELEVANCE, SORTS, PaginationError, decode_cursor, encode_cursor, parse_limit, parse_sort
+from references import REFERENCE_MODELS, reference_lists_query, build_reference_lists
+from replicas import read_from_primary
+from serializers import author_name
+from stats import RECENT_BOOKS, book_counters, summarize
+
+# Optional read model (CATALOGUE_SNAPSHOT=1): the book list, reference lists and stats
+# served from an in-memory copy of the catalogue instead of the ORM. Writes in this
+# process are applied to it when they commit; a write by another process shows up as
+# a changed table version and the snapshot is rebuilt on the next read.
+CATALOGUE_TABLES = ('books', 'book_authors', 'book_genres', 'book_topics', 'authors', 'publishers',
+                    'genres', 'topics', 'categories', 'series')
+RECORD_COLUMNS = ('title', 'isbn', 'publication_year', 'pages', 'language', 'reading_status',
+                  'current_page', 'rating', 'publisher_id', 'series_id', 'category_id', 'created_at')
+# Values repeated across records (statuses, years, reference ids) are stored once
+SHARED_COLUMNS = ('publication_year', 'pages', 'language', 'reading_status', 'current_page', 'rating',
+                  'publisher_id', 'series_id', 'category_id')
+# Keyset order of each sort in pagination.SORTS, as (key, id). Titles compare by code
+# point, which is the database's order only under a byte-order collation (see
+# sorts_titles_by_code_point); otherwise title sorts are left to the database.
+SORT_KEYS = {
+    'title': lambda r: (r.title, r.id),
+    'created_at': lambda r: (r.created_at, r.id),
+    'rating': lambda r: (r.rating if r.rating is not None else -1.0, r.id),
+    'publication_year': lambda r: (r.publication_year if r.publication_year is not None else -100000, r.id),
+}
+# Same fields and output as serializers.BOOK_FIELDS
+RECORD_FIELDS = {
+    'id': lambda c, r: r.id,
+    'title': lambda c, r: r.title,
+    'isbn': lambda c, r: r.isbn,
+    'publication_year': lambda c, r: r.publication_year,
+    'pages': lambda c, r: r.pages,
+    'reading_status': lambda c, r: r.reading_status,
+    'current_page': lambda c, r: r.current_page,
+    'rating': lambda c, r: r.rating,
+    'publisher': lambda c, r: c.refs['publishers'].get(r.publisher_id),
+    'authors': lambda c, r: [c.refs['authors'][id] for id in r.author_ids if id in c.refs['authors']],
+    'genres': lambda c, r: [c.refs['genres'][id] for id in r.genre_ids if id in c.refs['genres']],
+    'series': lambda c, r: c.refs['series'].get(r.series_id),
+    'category': lambda c, r: c.refs['categories'].get(r.category_id),
+}
+
+
+# Collations under which PostgreSQL orders text by code point, like Python
+CODE_POINT_COLLATIONS = ('C', 'POSIX', 'C.UTF-8', 'C.utf8', 'ucs_basic')
+
+
+def sorts_titles_by_code_point(connection):
+    if connection.dialect.name == 'sqlite':
+        # BINARY, SQLite's default, compares the UTF-8 bytes
+        return True
+    if connection.dialect.name != 'postgresql':
+        return False
+    collation = connection.execute(text(
+        "SELECT coalesce((SELECT collation_name FROM information_schema.columns"
+        "                 WHERE table_name = 'books' AND column_name = 'title'"
+        "                 AND table_schema = current_schema()),"
+        "                (SELECT datcollate FROM pg_database WHERE datname = current_database()))")).scalar()
+    return collation in CODE_POINT_COLLATIONS
+
+
+class BookRecord:
+    __slots__ = ('id', *RECORD_COLUMNS, *STATE_LINKS)
+
+    def state(self):
+        # Same shape as changes.book_state()
+        data = {'id': self.id}
+        for column in STATE_COLUMNS:
+            data[column] = getattr(self, column)
+        for key in STATE_LINKS:
+            data[key] = list(getattr(self, key))
+        return data
+
+
+def load_records(connection, ids=None):
+    # id -> BookRecord for the given books, or for all of them
+    columns = [Book.id] + [getattr(Book, c) for c in RECORD_COLUMNS]
+    stmt = select(*columns)
+    if ids is not None:
+        stmt = stmt.where(Book.id.in_(ids))
+    records = {}
+    shared = {}
+    for row in connection.execute(stmt):
+        record = BookRecord()
+        record.id = row[0]
+        for column, value in zip(RECORD_COLUMNS, row[1:]):
+            if column in SHARED_COLUMNS:
+                value = shared.setdefault((type(value), value), value)
+            setattr(record, column, value)
+        records[record.id] = record
+    for key, (_, column) in STATE_LINKS.items():
+        links = {id: [] for id in records}
+        stmt = select(column.table.c.book_id, column).order_by(column)
+        if ids is not None:
+            stmt = stmt.where(column.table.c.book_id.in_(ids))
+        for book_id, ref_id in connection.execute(stmt):
+            if book_id in links:
+                links[book_id].append(shared.setdefault((int, ref_id), ref_id))
+        for id, record in records.items():
+            setattr(record, key, tuple(links[id]))
+    return records
+
+
+def load_references(connection, kinds):
+    rows = {kind: [] for kind in kinds}
+    for row in connection.execute(reference_lists_query(kinds)):
+        rows[row.kind].append(row)
+    return rows
+
+
+def record_filter(filters):
+    # Predicate on BookRecord for facets.parse_filters() output; matches filter_conditions()
+    tests = []
+    for name, selected in filters.items():
+        if name in LINK_FACETS:
+            tests.append(lambda r, key=f'{name}_ids', ids=set(selected): not ids.isdisjoint(getattr(r, key)))
+        elif name in COLUMN_FACETS or name in VALUE_FACETS:
+            column = COLUMN_FACETS[name][0] if name in COLUMN_FACETS else VALUE_FACETS[name]
+            tests.append(lambda r, key=column.key, values=set(selected): getattr(r, key) in values)
+        else:
+            column = RANGE_FACETS[name][0]
+            tests.append(lambda r, key=column.key, bounds=selected:
+                         getattr(r, key) is not None and in_range(getattr(r, key), *bounds))
+    return lambda r: all(test(r) for test in tests)
+
+
+class Catalogue:
+    def __init__(self, versions, records, references, code_point_titles=True):
+        self.versions = versions
+        # Whether title sorts can be served from here, see serves_sort()
+        self.code_point_titles = code_point_titles
+        self.records = records
+        self.rows, self.refs, self.lists = {}, {}, {}
+        for kind, rows in references.items():
+            self.set_references(kind, rows)
+        self.orders = {name: sorted(records.values(), key=key) for name, key in SORT_KEYS.items()}
+        self.counters = Counter()
+        for record in records.values():
+            self.counters.update(book_counters(record.state()))
+        self.summary_cache = None
+
+    @classmethod
+    def load(cls, versions):
+        connection = db.session.connection()
+        return cls(versions, load_records(connection), load_references(connection, REFERENCE_MODELS),
+                   sorts_titles_by_code_point(connection))
+
+    def set_references(self, kind, rows):
+        self.rows[kind] = rows
+        if kind == 'authors':
+            self.refs[kind] = {row.id: {'id': row.id, 'name': author_name(row)} for row in rows}
+        else:
+            self.refs[kind] = {row.id: {'id': row.id, 'name': row.name} for row in rows}
+        self.lists.pop(kind, None)
+
+    def apply(self, pending):
+        # Called with the lock held, after the transaction that loaded pending committed
+        for kind, rows in pending['references'].items():
+            self.set_references(kind, rows)
+        # Copied so a request paging through the old lists isn't disturbed
+        orders = {name: list(order) for name, order in self.orders.items()}
+        for id, record in pending['records'].items():
+            old = self.records.pop(id, None)
+            if old is not None:
+                self.counters.subtract(book_counters(old.state()))
+                for name, key in SORT_KEYS.items():
+                    order = orders[name]
+                    del order[bisect_left(order, key(old), key=key)]
+            if record is not None:
+                self.records[id] = record
+                self.counters.update(book_counters(record.state()))
+                for name, key in SORT_KEYS.items():
+                    insort(orders[name], record, key=key)
+        self.orders = orders
+        self.versions = dict(self.versions, **pending['versions'])
+        self.summary_cache = None
+
+    def serves_sort(self, sort):
+        # A linguistic collation can't be reproduced in Python, so under one the title
+        # sorts always go to the database; the choice holds for the snapshot's lifetime
+        # and a client's pagination never switches between the two orders
+        return parse_sort(sort)[0] != 'title' or self.code_point_titles
+
+    def book_list(self, fields, filters, sort=None, cursor=None, limit=None):
+        # Same page, cursor and errors as pagination.paginate() over book_list_query()
+        name, descending = parse_sort(sort)
+        if name == RELEVANCE:
+            raise PaginationError('relevance sort requires a search')
+        limit = parse_limit(limit)
+        cursor_name = f'-{name}' if descending else name
+        order, key = self.orders[name], SORT_KEYS[name]
+
+        if cursor:
+            position = decode_cursor(cursor, cursor_name)
+            try:
+                if descending:
+                    start = bisect_left(order, position, key=key) - 1
+                else:
+                    start = bisect_right(order, position, key=key)
+            except TypeError:
+                raise PaginationError('Invalid cursor')
+        else:
+            start = len(order) - 1 if descending else 0
+        step = -1 if descending else 1
+        match = record_filter(filters)
+
+        books = []
+        i = start
+        while 0 <= i < len(order) and len(books) <= limit:
+            if match(order[i]):
+                books.append(order[i])
+            i += step
+        has_more = len(books) > limit
+        books = books[:limit]
+        next_cursor = encode_cursor(cursor_name, SORTS[name][1](books[-1]), books[-1].id) if has_more else None
+        getters = [(field, RECORD_FIELDS[field]) for field in fields]
+        return {
+            'books': [{field: getter(self, b) for field, getter in getters} for b in books],
+            'next_cursor': next_cursor,
+            'has_more': has_more
+        }
+
+    def reference_lists(self, kinds):
+        for kind in kinds:
+            if kind not in self.lists:
+                self.lists[kind] = build_reference_lists([kind], self.rows[kind])[kind]
+        return {kind: self.lists[kind] for kind in kinds}
+
+    def library_summary(self):
+        if self.summary_cache is None:
+            values = dict(self.counters, authors=len(self.refs['authors']),
+                          publishers=len(self.refs['publishers']))
+            names = {(prefix, id): ref['name'] for prefix, kind in (('genre', 'genres'), ('category', 'categories'),
+                                                                    ('publisher', 'publishers'))
+                     for id, ref in self.refs[kind].items()}
+            recent = self.orders['created_at'][:-RECENT_BOOKS - 1:-1]
+            self.summary_cache = summarize(values, names, [
+                {'id': b.id, 'title': b.title, 'authors': [self.refs['authors'][id]['name'] for id in b.author_ids
+                                                           if id in self.refs['authors']]}
+                for b in recent])
+        return self.summary_cache
+
+
+enabled = False
+snapshot = None
+lock = threading.Lock()
+
+
+def init_catalogue(app):
+    # Built at startup when the database is ready (before gunicorn forks, with
+    # preload_app); otherwise on the first read
+    global enabled, snapshot
+    enabled = bool(app.config.get('CATALOGUE_SNAPSHOT'))
+    snapshot = None
+    if not enabled:
+        return
+    try:
+        with app.app_context():
+            current_catalogue()
+    except SQLAlchemyError as e:
+        app.logger.warning(f'Catalogue snapshot not built at startup: {e}')
+
+
+def current_catalogue():
+    # The snapshot if enabled and up to date with the tables, rebuilding it if needed;
+    # None when disabled. A request that finds another thread rebuilding waits for it
+    # rather than reading from the database, so a client paging through the list never
+    # mixes pages of the two paths, and rather than serving the old snapshot under the
+    # newer versions' ETag.
+    global snapshot
+    if not enabled:
+        return None
+    # The snapshot follows the primary (writes in this process update it), so a
+    # replica's older versions would look like changes
+    read_from_primary()
+    versions = table_versions(CATALOGUE_TABLES)
+    current = snapshot
+    if current is not None and current.versions == versions:
+        return current
+    with lock:
+        if snapshot is None or snapshot.versions != versions:
+            snapshot = Catalogue.load(versions)
+        return snapshot
+
+
+def pending_changes():
+    return db.session.info.setdefault('catalogue_pending', {
+        'ids': set(), 'records': {}, 'references': {}, 'versions': {}, 'bumps': Counter(), 'stale': False})
+
+
+@on_books_written
+def books_written(connection, ids):
+    if enabled:
+        pending_changes()['ids'].update(ids)
+
+
+@on_tables_changed
+def tables_changed(connection, tables):
+    # Runs after caching.bump_versions: loads what this write changed while the
+    # transaction can still see it, with the table versions it leaves behind
+    if not enabled:
+        return
+    pending = pending_changes()
+    if pending['ids']:
+        records = load_records(connection, pending['ids'])
+        pending['records'].update({id: records.get(id) for id in pending['ids']})
+        pending['ids'] = set()
+    kinds = [kind for kind, model in REFERENCE_MODELS.items() if model.__tablename__ in tables]
+    if kinds:
+        pending['references'].update(load_references(connection, kinds))
+    tracked = [t for t in CATALOGUE_TABLES if t in tables]
+    pending['bumps'].update(tracked)
+    pending['versions'].update(table_versions(tracked, connection))
+
+
+@event.listens_for(Session, 'after_commit')
+def _apply_committed(session):
+    pending = session.info.pop('catalogue_pending', None)
+    if pending is None or not enabled:
+        return
+    with lock:
+        current = snapshot
+        if current is None:
+            return
+        # Each write bumps its tables' versions by one; any other difference is a write
+        # this process didn't see, so the snapshot is left to be rebuilt
+        consistent = not pending['stale'] and not pending['ids'] and all(
+            t in current.versions and current.versions[t] + n == pending['versions'].get(t)
+            for t, n in pending['bumps'].items())
+        if consistent:
+            current.apply(pending)
+        else:
+            current.versions = {}
+
+
+@event.listens_for(Session, 'after_soft_rollback')
+def _discard(session, previous_transaction):
+    if previous_transaction.nested:
+        # A rolled back savepoint may have undone writes already loaded
+        if 'catalogue_pending' in session.info:
+            session.info['catalogue_pending']['stale'] = True
+    else:
+        session.info.pop('catalogue_pending', None)
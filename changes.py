@@ -0,0 +1,173 @@
+from collections import Counter
+from sqlalchemy import event, inspect, select
+from sqlalchemy.orm import Session
+from models import Book, book_authors, book_genres, book_topics
+
+# Book state handed to change listeners: the columns and links that derived data
+# (recommendation profile, statistics) is computed from
+STATE_COLUMNS = ('reading_status', 'rating', 'pages', 'current_page', 'publication_year',
+                 'language', 'publisher_id', 'category_id', 'series_id')
+STATE_LINKS = {'author_ids': ('authors', book_authors.c.author_id),
+               'genre_ids': ('genres', book_genres.c.genre_id),
+               'topic_ids': ('topics', book_topics.c.topic_id)}
+
+_book_listeners = []
+_write_listeners = []
+_table_listeners = []
+_count_listeners = []
+
+
+def on_book_changes(fn):
+    # fn(connection, changes) with changes a list of (old state or None, new state or None)
+    _book_listeners.append(fn)
+    return fn
+
+
+def on_books_written(fn):
+    # fn(connection, ids) with the ids of every book inserted, updated or deleted, even
+    # when only columns outside its state changed
+    _write_listeners.append(fn)
+    return fn
+
+
+def on_tables_changed(fn):
+    # fn(connection, table names) for every flush or bulk write that touched those tables
+    _table_listeners.append(fn)
+    return fn
+
+
+def on_row_counts(fn):
+    # fn(connection, counts) with counts a Counter of table name -> rows inserted minus deleted
+    _count_listeners.append(fn)
+    return fn
+
+
+def publish(connection, changes=(), tables=(), counts=None, ids=()):
+    # Bulk code paths that bypass the ORM call this directly with what they changed
+    ids = set(ids) | {(old or new)['id'] for old, new in changes}
+    changes = [(old, new) for old, new in changes if old != new]
+    tables = set(tables)
+    counts = Counter({table: n for table, n in (counts or {}).items() if n})
+    if changes:
+        tables.add(Book.__tablename__)
+        for fn in _book_listeners:
+            fn(connection, changes)
+    if ids:
+        for fn in _write_listeners:
+            fn(connection, ids)
+    if counts:
+        tables.update(counts)
+        for fn in _count_listeners:
+            fn(connection, counts)
+    if tables:
+        for fn in _table_listeners:
+            fn(connection, tables)
+
+
+def _old_value_unknown(state):
+    # A column set while unloaded/expired has no recorded previous value
+    for column in STATE_COLUMNS:
+        history = state.attrs[column].history
+        if history.added and not history.deleted and not history.unchanged:
+            return True
+    return False
+
+
+def _attr_value(state, key, before):
+    history = state.attrs[key].history
+    if before and history.deleted:
+        return history.deleted[0]
+    return getattr(state.obj(), key)
+
+
+def _link_ids(state, key, before):
+    history = state.attrs[key].history
+    if before and history.has_changes():
+        return sorted(o.id for o in history.unchanged + history.deleted)
+    return sorted(o.id for o in getattr(state.obj(), key))
+
+
+def book_state(book, before=False):
+    state = inspect(book)
+    data = {'id': book.id}
+    for column in STATE_COLUMNS:
+        data[column] = _attr_value(state, column, before)
+    for key, (relationship, _) in STATE_LINKS.items():
+        data[key] = _link_ids(state, relationship, before)
+    return data
+
+
+def load_book_states(connection, ids, links=True):
+    # Same shape as book_state(), read with plain queries for bulk code paths. Without
+    # links the link lists are left empty: only for a before/after pair whose links
+    # don't change, where they would cancel out anyway.
+    ids = list(ids)
+    if not ids:
+        return {}
+    columns = [Book.id] + [getattr(Book, c) for c in STATE_COLUMNS]
+    states = {row.id: dict(row._mapping, **{k: [] for k in STATE_LINKS})
+              for row in connection.execute(select(*columns).where(Book.id.in_(ids)))}
+    if not links:
+        return states
+    for key, (_, column) in STATE_LINKS.items():
+        table = column.table
+        for book_id, ref_id in connection.execute(
+                select(table.c.book_id, column).where(table.c.book_id.in_(ids)).order_by(column)):
+            states[book_id][key].append(ref_id)
+    return states
+
+
+def _table_names(objects):
+    names = set()
+    for obj in objects:
+        mapper = inspect(obj).mapper
+        names.update(t.name for t in mapper.tables)
+        for rel in mapper.relationships:
+            if rel.secondary is not None and inspect(obj).attrs[rel.key].history.has_changes():
+                names.add(rel.secondary.name)
+    return names
+
+
+@event.listens_for(Session, 'before_flush')
+def _capture_before(session, flush_context, instances):
+    before = session.info.setdefault('book_states_before', {})
+    unknown = {}
+    for obj in list(session.dirty) + list(session.deleted):
+        if isinstance(obj, Book) and obj.id is not None and id(obj) not in before:
+            if _old_value_unknown(inspect(obj)):
+                unknown[obj.id] = id(obj)
+            else:
+                before[id(obj)] = book_state(obj, before=True)
+    if unknown:
+        for book_id, state in load_book_states(session.connection(), unknown).items():
+            before[unknown[book_id]] = state
+    session.info['touched_tables'] = _table_names(list(session.new) + list(session.dirty) + list(session.deleted))
+
+
+@event.listens_for(Session, 'after_flush')
+def _publish_after(session, flush_context):
+    before = session.info.pop('book_states_before', {})
+    tables = session.info.pop('touched_tables', set())
+    changes = []
+    counts = Counter()
+    ids = {obj.id for obj in list(session.new) + list(session.dirty) + list(session.deleted)
+           if isinstance(obj, Book)}
+    for obj in session.new:
+        counts[inspect(obj).mapper.local_table.name] += 1
+        if isinstance(obj, Book):
+            changes.append((None, book_state(obj)))
+    for obj in session.dirty:
+        if isinstance(obj, Book) and id(obj) in before:
+            changes.append((before[id(obj)], book_state(obj)))
+    for obj in session.deleted:
+        counts[inspect(obj).mapper.local_table.name] -= 1
+        if isinstance(obj, Book) and id(obj) in before:
+            changes.append((before[id(obj)], None))
+    if changes or tables or counts or ids:
+        publish(session.connection(), changes, tables, counts, ids)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _forget(session):
+    session.info.pop('book_states_before', None)
+    session.info.pop('touched_tables', None)
@@ -0,0 +1,106 @@
+import click
+from flask import Blueprint, current_app
+from models import db
+from migrate import upgrade
+from importer import import_books, read_rows, detect_format
+from recommendations import rebuild_profile, scores_built
+from stats import counters_built, rebuild_counters
+from index_check import check_indexes
+from assets import build_assets
+from jobs import JobWorkers
+from dedupe import rebuild_match_keys
+
+# The flask commands; cli_group=None puts them at the top level (flask init-db, ...)
+bp = Blueprint('commands', __name__, cli_group=None)
+
+
+# Derived data that requests only read: the statistics counters and the recommendation
+# scores, built here when the database doesn't have them yet
+def build_derived_data():
+    if not counters_built():
+        rebuild_counters()
+        print('Built the library counters')
+    if not scores_built():
+        rebuild_profile()
+        print('Built the reader profile and recommendation scores')
+
+
+# The only place the schema is created: serving never runs DDL
+@bp.cli.command()
+def init_db():
+    db.create_all()
+    upgrade()
+    build_derived_data()
+    print('Database initialized!')
+
+
+@bp.cli.command('import-books')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--format', 'fmt', type=click.Choice(['csv', 'ndjson']), help='Defaults to the file extension')
+def import_books_command(path, fmt):
+    fmt = fmt or detect_format(path)
+    if not fmt:
+        raise click.UsageError('Cannot tell the format from the file name, pass --format')
+    with open(path, encoding='utf-8-sig', newline='') as f:
+        report = import_books(read_rows(f, fmt))
+    for error in report['errors']:
+        print(f'row {error["row"]}: {error["error"]}')
+    print(f'Imported {report["imported"]} of {report["processed"]} rows')
+
+
+@bp.cli.command()
+def rebuild_recommendations():
+    count = rebuild_profile()
+    print(f'Rebuilt the reader profile from {count} book(s)')
+
+
+@bp.cli.command()
+def rebuild_stats():
+    values = rebuild_counters()
+    print(f'Rebuilt {len(values)} library counters')
+
+
+@bp.cli.command('rebuild-match-keys')
+def rebuild_match_keys_command():
+    changed = rebuild_match_keys()
+    print(f'Updated the match keys of {sum(changed.values())} row(s)')
+
+
+@bp.cli.command()
+def db_upgrade():
+    applied = upgrade()
+    print(f'Applied {len(applied)} migration(s): {", ".join(applied)}' if applied else 'Database is up to date')
+    build_derived_data()
+
+
+@bp.cli.command('build-assets')
+def build_assets_command():
+    for name, (hashed, sizes) in build_assets(current_app.static_folder).items():
+        print(f'{name} -> {hashed}: ' + ', '.join(f'{suffix or "raw"} {size} bytes'
+                                                 for suffix, size in sizes.items()))
+    print('Restart the server to serve the new build')
+
+
+@bp.cli.command('run-jobs')
+@click.option('--threads', default=2, show_default=True, help='Jobs run at once by this process')
+def run_jobs_command(threads):
+    runner = JobWorkers(current_app._get_current_object(), threads, current_app.config['JOB_FOLDER'])
+    runner.start()
+    print(f'Running jobs on {threads} thread(s), Ctrl+C to stop')
+    try:
+        runner.stopping.wait()
+    except KeyboardInterrupt:
+        runner.stop()
+
+
+@bp.cli.command('check-indexes')
+def check_indexes_command():
+    try:
+        failures = check_indexes(current_app.test_client())
+    except RuntimeError as e:
+        raise click.ClickException(str(e))
+    for url, statement, tables in failures:
+        print(f'{url}: full scan of {", ".join(tables)}\n    {" ".join(statement.split())}')
+    if failures:
+        raise click.ClickException(f'{len(failures)} quer{"y" if len(failures) == 1 else "ies"} without an index')
+    print('All checked queries use indexes')
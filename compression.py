@@ -0,0 +1,90 @@
+import zlib
+from flask import request
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Content-Encodings offered, preferred first when the client accepts several equally
+ENCODINGS = ('br', 'gzip') if brotli else ('gzip',)
+COMPRESSIBLE_TYPES = ('application/json', 'application/x-ndjson', 'application/javascript', 'text/csv',
+                      'text/css', 'text/html', 'text/javascript', 'text/plain')
+# Levels for responses compressed per request: most of the size reduction for a
+# fraction of the CPU of the maximum levels (used for the prebuilt static assets)
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+
+
+class Compressor:
+    # Incremental gzip or brotli stream; flush() emits everything given so far, so
+    # each chunk of a streamed response reaches the client without waiting for the next
+    def __init__(self, encoding):
+        self.encoding = encoding
+        if encoding == 'br':
+            self.stream = brotli.Compressor(quality=BROTLI_QUALITY)
+        else:
+            self.stream = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+    def compress(self, data):
+        if self.encoding == 'br':
+            return self.stream.process(data) + self.stream.flush()
+        return self.stream.compress(data) + self.stream.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self):
+        return self.stream.finish() if self.encoding == 'br' else self.stream.flush()
+
+
+def compress(data, encoding):
+    compressor = Compressor(encoding)
+    return compressor.compress(data) + compressor.finish()
+
+
+def compressed_chunks(chunks, encoding):
+    compressor = Compressor(encoding)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.finish()
+
+
+def accepted_encoding():
+    # Best of ENCODINGS by the request's Accept-Encoding qualities, or None
+    return request.accept_encodings.best_match(ENCODINGS)
+
+
+# Compresses compressible responses for clients that accept gzip or brotli: bodies
+# of at least min_bytes at once, streamed bodies (exports) chunk by chunk. Files sent
+# by send_file are left alone; the static assets are compressed ahead of time.
+def init_compression(app, min_bytes):
+    @app.after_request
+    def compress_response(response):
+        if response.status_code == 304:
+            # Revalidations carry the tag the compressed 200 would have
+            etag, weak = response.get_etag()
+            if etag and not weak and accepted_encoding():
+                response.set_etag(etag, weak=True)
+            return response
+        if (response.status_code != 200 or request.method == 'HEAD' or response.direct_passthrough
+                or 'Content-Encoding' in response.headers or response.mimetype not in COMPRESSIBLE_TYPES):
+            return response
+        response.vary.add('Accept-Encoding')
+        encoding = accepted_encoding()
+        if encoding is None:
+            return response
+        if response.is_streamed:
+            response.response = compressed_chunks(response.iter_encoded(), encoding)
+            response.headers.pop('Content-Length', None)
+        else:
+            body = response.get_data()
+            if len(body) < min_bytes:
+                return response
+            response.set_data(compress(body, encoding))
+        response.headers['Content-Encoding'] = encoding
+        # The compressed bytes differ from the identity ones, so a strong tag no
+        # longer identifies them; a weak one still validates If-None-Match
+        etag, weak = response.get_etag()
+        if etag and not weak:
+            response.set_etag(etag, weak=True)
+        return response
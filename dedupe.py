@@ -0,0 +1,173 @@
+from collections import defaultdict
+from itertools import groupby
+from sqlalchemy import bindparam, event, func, inspect, select, text, update
+from changes import publish
+from deletes import delete_books
+from matchkeys import MATCH_KEYS, authors_key, match_keys
+from models import db, Author, Book, RecommendedBook, book_authors
+from serializers import book_detail_query, book_list_query, serialize_book
+
+DUPLICATE_LIMIT = 100
+MAX_DUPLICATE_LIMIT = 1000
+DUPLICATE_FIELDS = ('id', 'title', 'isbn', 'publication_year', 'authors', 'publisher', 'reading_status')
+# Columns a merged book takes from its duplicates when it has no value of its own
+MERGE_COLUMNS = ('isbn', 'publication_year', 'pages', 'language', 'description', 'notes', 'rating',
+                 'date_started', 'date_completed', 'series_id', 'series_position', 'category_id')
+MERGE_LINKS = ('authors', 'genres', 'topics')
+READING_ORDER = ('unread', 'reading', 'completed')
+KEYED_MODELS = (Book, RecommendedBook, Author)
+REBUILD_BATCH = 5000
+
+
+class MergeError(ValueError):
+    pass
+
+
+def refresh_match_keys(mapper, connection, target):
+    # ORM updates recompute the keys whose source columns changed; inserts get them
+    # from the column defaults
+    state = inspect(target)
+    for key, (fn, sources) in MATCH_KEYS[mapper.local_table.name].items():
+        if any(state.attrs[c].history.has_changes() for c in sources):
+            setattr(target, key, fn(*[getattr(target, c) for c in sources]))
+
+
+for model in KEYED_MODELS:
+    event.listen(model, 'before_update', refresh_match_keys)
+
+
+def rebuild_match_keys():
+    # Recomputes every stored key, for rows written before the keys existed (see
+    # migrations/006_match_keys.sql) or after the normalization changed; returns the
+    # rows changed per table
+    connection = db.session.connection()
+    changed = {}
+    for model in KEYED_MODELS:
+        table = model.__table__
+        keys = MATCH_KEYS[table.name]
+        sources = sorted({c for _, columns in keys.values() for c in columns})
+        stmt = (update(table).where(table.c.id == bindparam('row_id'))
+                .values({key: bindparam(key) for key in keys}))
+        last_id = 0
+        while rows := connection.execute(
+                select(table.c.id, *[table.c[c] for c in sources], *[table.c[k] for k in keys])
+                .where(table.c.id > last_id).order_by(table.c.id).limit(REBUILD_BATCH)).all():
+            params = []
+            for row in rows:
+                values = row._mapping
+                new = match_keys(table.name, values)
+                if any(new[key] != values[key] for key in keys):
+                    params.append({'row_id': row.id, **new})
+            if params:
+                connection.execute(stmt, params)
+                changed[table.name] = changed.get(table.name, 0) + len(params)
+            last_id = rows[-1].id
+    # The planner needs the new key statistics to probe the key indexes (see
+    # recommendations.owned_condition) instead of filtering every candidate
+    for name in changed:
+        connection.execute(text(f'ANALYZE {name}'))
+    publish(connection, tables=changed)
+    db.session.commit()
+    return changed
+
+
+def shared_key_blocks(key):
+    # Lists of ids of the books that share a value of the indexed key with another book
+    shared = select(key).where(key.isnot(None)).group_by(key).having(func.count() > 1)
+    rows = db.session.execute(select(key, Book.id).where(key.in_(shared)).order_by(key, Book.id))
+    return [[id for _, id in block] for _, block in groupby(rows, key=lambda row: row[0])]
+
+
+def title_author_blocks():
+    # Books with the same normalized title and the same authors. Only books whose
+    # title key is shared are read, and their author keys split each title block.
+    shared = select(Book.title_key).where(Book.title_key.isnot(None)).group_by(Book.title_key) \
+        .having(func.count() > 1)
+    candidates = select(Book.id).where(Book.title_key.in_(shared))
+    names = defaultdict(list)
+    for book_id, name_key in db.session.execute(
+            select(book_authors.c.book_id, Author.name_key).join(Author, Author.id == book_authors.c.author_id)
+            .where(book_authors.c.book_id.in_(candidates))):
+        names[book_id].append(name_key or '')
+    blocks = defaultdict(list)
+    for title, id in db.session.execute(select(Book.title_key, Book.id).where(Book.id.in_(candidates))
+                                        .order_by(Book.id)):
+        blocks[title, authors_key(names[id])].append(id)
+    return [ids for ids in blocks.values() if len(ids) > 1]
+
+
+# Groups of books that look like copies of one another: the same ISBN, or the same
+# title and authors. Candidates come from GROUP BY on the indexed keys, so no pair of
+# books is ever compared. Returns [(reasons, ids)] ordered by their lowest id.
+def duplicate_groups():
+    parent = {}
+
+    def root(id):
+        while parent.setdefault(id, id) != id:
+            parent[id] = parent[parent[id]]
+            id = parent[id]
+        return id
+
+    blocks = [('isbn', ids) for ids in shared_key_blocks(Book.isbn_key)]
+    blocks += [('title_authors', ids) for ids in title_author_blocks()]
+    for _, ids in blocks:
+        for id in ids[1:]:
+            parent[root(id)] = root(ids[0])
+    groups = defaultdict(lambda: (set(), set()))
+    for reason, ids in blocks:
+        reasons, members = groups[root(ids[0])]
+        reasons.add(reason)
+        members.update(ids)
+    return sorted(((sorted(reasons), sorted(members)) for reasons, members in groups.values()),
+                  key=lambda group: group[1][0])
+
+
+def parse_limit(value):
+    try:
+        limit = DUPLICATE_LIMIT if value is None else int(value)
+    except ValueError:
+        raise MergeError('limit must be an integer')
+    if not 1 <= limit <= MAX_DUPLICATE_LIMIT:
+        raise MergeError(f'limit must be between 1 and {MAX_DUPLICATE_LIMIT}')
+    return limit
+
+
+def find_duplicates(limit=None):
+    groups = duplicate_groups()
+    shown = groups[:parse_limit(limit)]
+    ids = [id for _, members in shown for id in members]
+    books = {b.id: b for b in book_list_query(DUPLICATE_FIELDS).filter(Book.id.in_(ids))} if ids else {}
+    return {
+        'total': len(groups),
+        'groups': [{'reasons': reasons, 'books': [serialize_book(books[id], DUPLICATE_FIELDS) for id in members]}
+                   for reasons, members in shown]
+    }
+
+
+# Folds the duplicates into book and deletes them: empty columns take the first
+# duplicate's value, links are combined and the reading status is the furthest one.
+# The caller commits.
+def merge_books(book, ids):
+    if not isinstance(ids, list) or not ids or not all(isinstance(id, int) for id in ids):
+        raise MergeError('ids must be a non-empty list of book ids')
+    if book.id in ids:
+        raise MergeError('A book cannot be merged into itself')
+    ids = sorted(set(ids))
+    duplicates = book_detail_query().filter(Book.id.in_(ids)).order_by(Book.id).all()
+    missing = set(ids) - {d.id for d in duplicates}
+    if missing:
+        raise MergeError(f'Unknown book ids: {", ".join(map(str, sorted(missing)))}')
+
+    for duplicate in duplicates:
+        for column in MERGE_COLUMNS:
+            if getattr(book, column) in (None, ''):
+                setattr(book, column, getattr(duplicate, column))
+        for key in MERGE_LINKS:
+            links = getattr(book, key)
+            links.extend(ref for ref in getattr(duplicate, key) if ref not in links)
+        book.reading_status = max(book.reading_status or 'unread', duplicate.reading_status or 'unread',
+                                  key=READING_ORDER.index)
+        book.current_page = max(book.current_page or 0, duplicate.current_page or 0)
+    db.session.flush()
+    delete_books(ids)
+    return book
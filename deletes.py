@@ -0,0 +1,94 @@
+from sqlalchemy import delete, func, select
+from changes import publish, load_book_states
+from facets import parse_filters, filter_conditions
+from models import (db, Author, Book, Genre, Publisher, Topic, book_authors, book_genres, book_topics,
+                    series_authors, recommended_book_genres, recommended_book_topics)
+from search import search_filter
+from sqlhelpers import id_in
+
+# Books deleted per round of statements; the ids of a round are sent as one array
+DELETE_BATCH = 10000
+BOOK_LINK_TABLES = (book_authors, book_genres, book_topics)
+# model -> (link column to the books, other link columns to clear)
+REFERENCE_LINKS = {
+    Author: (book_authors.c.author_id, (series_authors.c.author_id,)),
+    Genre: (book_genres.c.genre_id, (recommended_book_genres.c.genre_id,)),
+    Topic: (book_topics.c.topic_id, (recommended_book_topics.c.topic_id,)),
+    Publisher: (None, ()),
+}
+
+
+class DeleteError(ValueError):
+    pass
+
+
+def parse_delete(args, data):
+    # Ids of the books a DELETE /api/books asks for: an id list in the body, or the
+    # filters of GET /api/books in the query string. Raises DeleteError or FilterError.
+    if isinstance(data, dict) and 'ids' in data:
+        ids = data['ids']
+        if not isinstance(ids, list) or not all(isinstance(id, int) for id in ids):
+            raise DeleteError('ids must be a list of book ids')
+        return sorted(set(ids))
+    filters = parse_filters(args)
+    search = args.get('search', '')
+    if not filters and not search:
+        raise DeleteError('Give ids, or filters as for GET /api/books')
+    query = select(Book.id).where(*filter_conditions(filters).values())
+    if search:
+        query = query.where(search_filter(search)[0])
+    return db.session.execute(query.order_by(Book.id)).scalars().all()
+
+
+# Deletes books and their link rows with a few set-based statements per batch and
+# publishes their last states; the caller commits. Returns the ids that existed.
+def delete_books(ids):
+    connection = db.session.connection()
+    table = Book.__table__
+    deleted = []
+    for start in range(0, len(ids), DELETE_BATCH):
+        before = load_book_states(connection, ids[start:start + DELETE_BATCH])
+        if not before:
+            continue
+        batch = list(before)
+        tables = {table.name} | {link.name for link in BOOK_LINK_TABLES}
+        if connection.dialect.name == 'sqlite':
+            # SQLite doesn't enforce foreign keys, so its ON DELETE CASCADE never fires
+            for link in BOOK_LINK_TABLES:
+                connection.execute(delete(link).where(id_in(connection, link.c.book_id, batch)))
+        # Elsewhere the cascade removes the link rows. Deleting them first would have the
+        # search triggers (migrations/001_book_search.sql) refresh every book just deleted.
+        connection.execute(delete(table).where(id_in(connection, table.c.id, batch)))
+        publish(connection, [(before[id], None) for id in batch], tables=tables,
+                counts={table.name: -len(batch)}, ids=batch)
+        deleted += batch
+    return deleted
+
+
+# Deletes an author, genre, topic or publisher with its link rows. The books that
+# linked to it publish their states before and after. Returns False when it doesn't
+# exist; raises DeleteError for a publisher that still has books.
+def delete_reference(model, id):
+    connection = db.session.connection()
+    table = model.__table__
+    if connection.execute(select(table.c.id).where(table.c.id == id)).first() is None:
+        return False
+    if model is Publisher:
+        count = connection.execute(select(func.count()).where(Book.publisher_id == id)).scalar()
+        if count:
+            raise DeleteError(f'The publisher has {count} book(s); delete or move them first')
+
+    book_column, other_columns = REFERENCE_LINKS[model]
+    ids, before, tables = [], {}, {table.name}
+    if book_column is not None:
+        ids = connection.execute(select(book_column.table.c.book_id).where(book_column == id)
+                                 .order_by(book_column.table.c.book_id)).scalars().all()
+        before = load_book_states(connection, ids)
+    for column in (book_column, *other_columns):
+        if column is not None and connection.execute(delete(column.table).where(column == id)).rowcount:
+            tables.add(column.table.name)
+    connection.execute(delete(table).where(table.c.id == id))
+    after = load_book_states(connection, ids)
+    publish(connection, [(before[book_id], after[book_id]) for book_id in ids], tables=tables,
+            counts={table.name: -1}, ids=ids)
+    return True
@@ -0,0 +1,66 @@
+import csv
+import io
+from datetime import datetime
+from flask import Response, stream_with_context
+from json_provider import dumps
+from models import Book
+from serializers import book_export_query, book_csv_row, serialize_book_export, CSV_HEADER
+
+# Rows per server-side cursor fetch, and per chunk written to the client
+EXPORT_BATCH = 1000
+
+
+def iter_export_books():
+    # yield_per streams from a server-side cursor; the publisher join and the
+    # batched selectin load of authors are issued once per batch, not per row
+    return book_export_query().order_by(Book.id).yield_per(EXPORT_BATCH)
+
+
+def csv_chunks(books):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(CSV_HEADER)
+    for i, book in enumerate(books, 1):
+        writer.writerow(book_csv_row(book))
+        if i % EXPORT_BATCH == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+def json_chunks(books, total):
+    yield '{\n  "export_date": %s,\n  "total": %d,\n  "books": [' % (
+        dumps(datetime.now().isoformat()), total)
+    chunk = []
+    separator = '\n    '
+    for book in books:
+        chunk.append(separator + dumps(serialize_book_export(book)))
+        separator = ',\n    '
+        if len(chunk) == EXPORT_BATCH:
+            yield ''.join(chunk)
+            chunk = []
+    chunk.append('\n  ]\n}\n')
+    yield ''.join(chunk)
+
+
+def ndjson_chunks(books):
+    chunk = []
+    for book in books:
+        chunk.append(dumps(serialize_book_export(book)) + '\n')
+        if len(chunk) == EXPORT_BATCH:
+            yield ''.join(chunk)
+            chunk = []
+    yield ''.join(chunk)
+
+
+def export_filename(extension):
+    return f'library_{datetime.now().strftime("%Y%m%d")}.{extension}'
+
+
+def streaming_download(chunks, mimetype, extension):
+    return Response(
+        stream_with_context(chunk.encode('utf-8') for chunk in chunks if chunk),
+        mimetype=mimetype,
+        headers={'Content-Disposition': f'attachment; filename={export_filename(extension)}'}
+    )
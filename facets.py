@@ -0,0 +1,272 @@
+import threading
+from array import array
+from collections import defaultdict
+from sqlalchemy import and_, select
+from caching import bump_versions, table_versions
+from changes import on_book_changes, on_tables_changed
+from models import (db, Author, Book, Category, Genre, Publisher, Series, Topic,
+                    book_authors, book_genres, book_topics)
+
+# Filters on /api/books. Id and value filters take comma-separated lists and match
+# any of them; different filters must all match.
+LINK_FACETS = {
+    'genre': (book_genres, book_genres.c.genre_id, Genre, Genre.name),
+    'topic': (book_topics, book_topics.c.topic_id, Topic, Topic.name),
+    'author': (book_authors, book_authors.c.author_id, Author, Author.first_name + ' ' + Author.last_name),
+}
+COLUMN_FACETS = {
+    'category': (Book.category_id, Category, Category.name),
+    'publisher': (Book.publisher_id, Publisher, Publisher.name),
+    'series': (Book.series_id, Series, Series.name),
+}
+VALUE_FACETS = {
+    'status': Book.reading_status,
+    'language': Book.language,
+}
+# Counted per value, filtered as ranges
+RANGE_FACETS = {
+    'year': (Book.publication_year, 'year_min', 'year_max'),
+    'rating': (Book.rating, 'rating_min', 'rating_max'),
+}
+FACETS = (*LINK_FACETS, *COLUMN_FACETS, *VALUE_FACETS, *RANGE_FACETS)
+# The facet index is rebuilt when this version changes. It is bumped by writes that
+# change a book's facet values (the fields below of changes.py's book state) or the
+# names of the facets' reference tables, not by every write to books: reading
+# progress, notes and titles leave the index in place.
+FACET_VERSION = 'facets'
+FACET_FIELDS = (*(f'{name}_ids' for name in LINK_FACETS),
+                *(column.key for column, _, _ in COLUMN_FACETS.values()),
+                *(column.key for column in VALUE_FACETS.values()),
+                *(column.key for column, _, _ in RANGE_FACETS.values()))
+FACET_NAME_TABLES = {model.__tablename__ for _, _, model, _ in LINK_FACETS.values()} | \
+                    {model.__tablename__ for _, model, _ in COLUMN_FACETS.values()}
+# Values returned per facet, most frequent first; years, ratings and statuses are
+# returned in full
+FACET_LIMIT = 20
+UNLIMITED_FACETS = ('status', 'year', 'rating')
+
+# byte -> its 8 bits as 0/1 bytes, least significant first
+EXPAND_BITS = [bytes((b >> i) & 1 for i in range(8)) for b in range(256)]
+
+
+class FilterError(ValueError):
+    pass
+
+
+def parse_list(args, name, type=str):
+    values = [v.strip() for v in args.get(name, '').split(',') if v.strip()]
+    try:
+        return [type(v) for v in values]
+    except ValueError:
+        raise FilterError(f'{name} must be a comma-separated list of ids')
+
+
+def parse_number(args, name):
+    value = args.get(name, '')
+    if value == '':
+        return None
+    try:
+        return float(value) if name.startswith('rating') else int(value)
+    except ValueError:
+        raise FilterError(f'{name} must be a number')
+
+
+# facet -> selected ids or values, or (low, high) for ranges, for the filters in args
+def parse_filters(args):
+    filters = {}
+    for name in (*LINK_FACETS, *COLUMN_FACETS):
+        ids = parse_list(args, name, int)
+        if ids:
+            filters[name] = ids
+    for name in VALUE_FACETS:
+        values = parse_list(args, name)
+        if values:
+            filters[name] = values
+    for name, (_, low_param, high_param) in RANGE_FACETS.items():
+        low, high = parse_number(args, low_param), parse_number(args, high_param)
+        if low is not None or high is not None:
+            filters[name] = (low, high)
+    return filters
+
+
+def in_range(value, low, high):
+    return (low is None or value >= low) and (high is None or value <= high)
+
+
+def filter_conditions(filters):
+    # facet -> condition on Book
+    conditions = {}
+    for name, selected in filters.items():
+        if name in LINK_FACETS:
+            table, column, _, _ = LINK_FACETS[name]
+            conditions[name] = Book.id.in_(select(table.c.book_id).where(column.in_(selected)))
+        elif name in COLUMN_FACETS:
+            conditions[name] = COLUMN_FACETS[name][0].in_(selected)
+        elif name in VALUE_FACETS:
+            conditions[name] = VALUE_FACETS[name].in_(selected)
+        else:
+            column = RANGE_FACETS[name][0]
+            low, high = selected
+            bounds = []
+            if low is not None:
+                bounds.append(column >= low)
+            if high is not None:
+                bounds.append(column <= high)
+            conditions[name] = and_(*bounds)
+    return conditions
+
+
+class FacetIndex:
+    # Every book gets a position; each facet value keeps the positions of its books,
+    # as a bitmap (an int, bit i for position i) when it is common and as an array
+    # of positions otherwise. Filtering ANDs and ORs bitmaps; counting a value is
+    # a popcount, or a lookup per book in a 0/1 byte mask for the rare values.
+    def __init__(self, versions, book_ids, postings, names):
+        self.versions = versions
+        self.size = len(book_ids)
+        self.positions = {id: position for position, id in enumerate(book_ids)}
+        self.all = (1 << self.size) - 1
+        self.names = names
+        self.bitmaps = {}
+        self.sparse = {}
+        for name, values in postings.items():
+            self.bitmaps[name], self.sparse[name] = {}, {}
+            for value, positions in values.items():
+                if len(positions) * 32 >= self.size:
+                    self.bitmaps[name][value] = self.bitmap(positions)
+                else:
+                    self.sparse[name][value] = positions
+
+    @classmethod
+    def load(cls, versions):
+        columns = {name: column for name, (column, _, _) in COLUMN_FACETS.items()}
+        columns.update(VALUE_FACETS)
+        columns.update({name: column for name, (column, _, _) in RANGE_FACETS.items()})
+        rows = db.session.execute(select(Book.id, *columns.values()).order_by(Book.id)).all()
+        book_ids = [row[0] for row in rows]
+        positions = {id: position for position, id in enumerate(book_ids)}
+
+        postings = {name: defaultdict(lambda: array('I')) for name in FACETS}
+        for position, row in enumerate(rows):
+            for name, value in zip(columns, row[1:]):
+                if value is not None and value != '':
+                    postings[name][value].append(position)
+        names = {}
+        for name, (table, column, model, label) in LINK_FACETS.items():
+            for book_id, ref_id in db.session.execute(select(table.c.book_id, column)):
+                if book_id in positions:
+                    postings[name][ref_id].append(positions[book_id])
+            names[name] = dict(db.session.execute(select(model.id, label)).all())
+        for name, (_, model, label) in COLUMN_FACETS.items():
+            names[name] = dict(db.session.execute(select(model.id, label)).all())
+        return cls(versions, book_ids, postings, names)
+
+    def bitmap(self, positions):
+        bits = bytearray((self.size + 7) // 8)
+        for position in positions:
+            bits[position >> 3] |= 1 << (position & 7)
+        return int.from_bytes(bits, 'little')
+
+    def value_bitmap(self, name, value):
+        if value in self.bitmaps[name]:
+            return self.bitmaps[name][value]
+        return self.bitmap(self.sparse[name].get(value, ()))
+
+    def filter_bitmap(self, name, selected):
+        if name in RANGE_FACETS:
+            low, high = selected
+            selected = [value for value in (*self.bitmaps[name], *self.sparse[name])
+                        if in_range(value, low, high)]
+        result = 0
+        for value in selected:
+            result |= self.value_bitmap(name, value)
+        return result
+
+    def ids_bitmap(self, ids):
+        return self.bitmap(self.positions[id] for id in ids if id in self.positions)
+
+    def mask(self, bitmap):
+        return b''.join(map(EXPAND_BITS.__getitem__, bitmap.to_bytes((self.size + 7) // 8, 'little')))
+
+    def counts(self, name, matching, masks):
+        counts = [(value, (matching & bitmap).bit_count()) for value, bitmap in self.bitmaps[name].items()]
+        if self.sparse[name]:
+            if matching not in masks:
+                masks[matching] = self.mask(matching)
+            mask = masks[matching]
+            counts += [(value, sum(map(mask.__getitem__, positions)))
+                       for value, positions in self.sparse[name].items()]
+        return [(value, count) for value, count in counts if count]
+
+    def facet_counts(self, filters, search_ids=None):
+        bitmaps = {name: self.filter_bitmap(name, selected) for name, selected in filters.items()}
+        base = self.all if search_ids is None else self.ids_bitmap(search_ids)
+        matching = base
+        for bitmap in bitmaps.values():
+            matching &= bitmap
+
+        facets, masks = {}, {}
+        for name in FACETS:
+            # Every filter but the facet's own, so the counts show what selecting
+            # another value of that facet would give
+            scope = matching
+            if name in bitmaps:
+                scope = base
+                for other, bitmap in bitmaps.items():
+                    if other != name:
+                        scope &= bitmap
+            counts = self.counts(name, scope, masks)
+            if name in RANGE_FACETS:
+                facets[name] = [{'value': value, 'count': count} for value, count in sorted(counts)]
+                continue
+            counts.sort(key=lambda item: (-item[1], item[0]))
+            if name not in UNLIMITED_FACETS:
+                counts = counts[:FACET_LIMIT]
+            if name in VALUE_FACETS:
+                facets[name] = [{'value': value, 'count': count} for value, count in counts]
+            else:
+                facets[name] = [{'id': id, 'name': self.names[name].get(id), 'count': count}
+                                for id, count in counts]
+        return {'total': matching.bit_count(), 'facets': facets}
+
+
+def facet_values(state):
+    return None if state is None else tuple(state[field] for field in FACET_FIELDS)
+
+
+@on_book_changes
+def books_changed(connection, changes):
+    if any(facet_values(old) != facet_values(new) for old, new in changes):
+        bump_versions(connection, [FACET_VERSION])
+
+
+@on_tables_changed
+def names_changed(connection, tables):
+    if tables & FACET_NAME_TABLES:
+        bump_versions(connection, [FACET_VERSION])
+
+
+index = None
+index_lock = threading.Lock()
+
+
+def facet_index():
+    # Built on first use and rebuilt after writes that bump FACET_VERSION; the version
+    # is read first, so a concurrent write only makes the index newer than its key
+    global index
+    versions = table_versions([FACET_VERSION])
+    if index is None or index.versions != versions:
+        with index_lock:
+            if index is None or index.versions != versions:
+                index = FacetIndex.load(versions)
+    return index
+
+
+# Number of matching books and the values of every facet with their counts under
+# the current filters (and search condition, if any)
+def facet_counts(filters, search=None):
+    current = facet_index()
+    search_ids = None
+    if search is not None:
+        search_ids = db.session.execute(select(Book.id).where(search)).scalars().all()
+    return current.facet_counts(filters, search_ids)
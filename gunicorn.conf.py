@@ -0,0 +1,54 @@
+"""Production server settings, read by gunicorn from the working directory:
+
+    gunicorn
+
+Every setting can be overridden from .env or on the command line
+(e.g. gunicorn --workers 4).
+"""
+import multiprocessing
+import os
+from dotenv import load_dotenv
+
+load_dotenv()
+
+wsgi_app = 'app:create_app()'
+bind = os.getenv('WEB_BIND', '0.0.0.0:8000')
+workers = int(os.getenv('WEB_WORKERS', multiprocessing.cpu_count() * 2 + 1))
+# Requests mostly wait on PostgreSQL, so each worker also serves a few at once on
+# threads; keep DB_POOL_SIZE (+ DB_MAX_OVERFLOW) at least this high
+worker_class = 'gthread'
+threads = int(os.getenv('WEB_THREADS', 4))
+timeout = int(os.getenv('WEB_TIMEOUT', 60))
+# On SIGTERM workers stop accepting and get this long to finish in-flight requests
+graceful_timeout = int(os.getenv('WEB_GRACEFUL_TIMEOUT', 30))
+keepalive = 5
+# Recycle workers now and then to bound memory growth; jitter avoids restarting them all at once
+max_requests = int(os.getenv('WEB_MAX_REQUESTS', 10000))
+max_requests_jitter = max_requests // 10
+preload_app = True
+accesslog = os.getenv('WEB_ACCESS_LOG', '-') or None
+
+
+def post_fork(server, worker):
+    # The app (and its engine) is loaded once in the master; each worker starts its own
+    # pool rather than inheriting connections opened before the fork
+    from models import db
+    import replicas
+    with server.app.wsgi().app_context():
+        db.engine.dispose(close=False)
+    if replicas.router is not None:
+        replicas.router.dispose(close=False)
+
+
+def worker_exit(server, worker):
+    # Close pooled connections on shutdown instead of leaving PostgreSQL to time them out
+    from models import db
+    from async_queries import shutdown_async_queries
+    from jobs import shutdown_jobs
+    import replicas
+    shutdown_jobs()
+    with server.app.wsgi().app_context():
+        db.engine.dispose()
+    if replicas.router is not None:
+        replicas.router.dispose()
+    shutdown_async_queries()
@@ -0,0 +1,260 @@
+import csv
+import json
+import re
+from collections import Counter
+from itertools import islice
+from sqlalchemy import insert, select, tuple_
+from sqlalchemy.exc import SQLAlchemyError
+from sqlhelpers import dialect_insert
+from changes import publish, STATE_COLUMNS
+from models import (db, Book, Author, Publisher, Series, Genre, Topic, Category,
+                    book_authors, book_genres, book_topics)
+
+# Rows per transaction; a failing chunk is retried row by row so one bad row
+# doesn't discard the rest of the batch
+CHUNK_SIZE = 1000
+READING_STATUSES = ('unread', 'reading', 'completed')
+
+# Accept the column names written by the CSV/JSON exports as well as the model's
+ALIASES = {
+    'year': 'publication_year',
+    'status': 'reading_status',
+    'author': 'authors',
+    'genre': 'genres',
+    'topic': 'topics',
+}
+INT_FIELDS = ('publication_year', 'pages', 'current_page', 'series_position')
+TEXT_FIELDS = ('isbn', 'language', 'description', 'notes')
+
+
+class RowError(ValueError):
+    pass
+
+
+def detect_format(filename=None, mimetype=None):
+    name = (filename or '').lower()
+    if name.endswith('.csv') or mimetype == 'text/csv':
+        return 'csv'
+    if name.endswith(('.ndjson', '.jsonl')) or mimetype in ('application/x-ndjson', 'application/jsonl'):
+        return 'ndjson'
+    return None
+
+
+def read_rows(stream, fmt):
+    if fmt == 'csv':
+        yield from csv.DictReader(stream)
+    elif fmt == 'ndjson':
+        for line in stream:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield json.loads(line)
+            except ValueError as e:
+                yield RowError(f'Invalid JSON: {e}')
+    else:
+        raise ValueError(f'Unsupported import format: {fmt}')
+
+
+def split_names(value):
+    if value is None:
+        return []
+    if isinstance(value, (list, tuple)):
+        names = value
+    else:
+        names = re.split(r'[;,]', str(value))
+    return list(dict.fromkeys(n.strip() for n in names if n and str(n).strip()))
+
+
+def split_author(name):
+    # Same convention as the quick-add form: first word, then the rest as last name
+    parts = name.split()
+    return parts[0], ' '.join(parts[1:]) or parts[0]
+
+
+def parse_row(raw):
+    if isinstance(raw, RowError):
+        raise raw
+    if not isinstance(raw, dict):
+        raise RowError('Row must be an object')
+    data = {ALIASES.get(k.strip().lower(), k.strip().lower()): v
+            for k, v in raw.items() if k is not None}
+    data = {k: (v.strip() if isinstance(v, str) else v) for k, v in data.items()}
+    data = {k: v for k, v in data.items() if v not in ('', None)}
+
+    if not data.get('title'):
+        raise RowError('title is required')
+    if not data.get('publisher'):
+        raise RowError('publisher is required')
+
+    book = {'title': str(data['title'])}
+    for field in TEXT_FIELDS:
+        if field in data:
+            book[field] = str(data[field])
+    for field in INT_FIELDS:
+        if field in data:
+            try:
+                book[field] = int(data[field])
+            except (TypeError, ValueError):
+                raise RowError(f'{field} must be an integer')
+    if 'rating' in data:
+        try:
+            book['rating'] = float(data['rating'])
+        except (TypeError, ValueError):
+            raise RowError('rating must be a number')
+        if not 0 <= book['rating'] <= 5:
+            raise RowError('rating must be between 0 and 5')
+    book['reading_status'] = data.get('reading_status', 'unread')
+    if book['reading_status'] not in READING_STATUSES:
+        raise RowError(f'reading_status must be one of {", ".join(READING_STATUSES)}')
+    book.setdefault('current_page', 0)
+
+    return {
+        'book': book,
+        'publisher': str(data['publisher']),
+        'category': str(data['category']) if 'category' in data else None,
+        'series': str(data['series']) if 'series' in data else None,
+        'authors': [split_author(n) for n in split_names(data.get('authors'))],
+        'genres': split_names(data.get('genres')),
+        'topics': split_names(data.get('topics')),
+    }
+
+
+def upsert_by_name(model, names, created):
+    # name -> id for a model with a unique name, inserting the missing ones
+    names = set(names)
+    if not names:
+        return {}
+    ids = dict(db.session.execute(select(model.name, model.id).where(model.name.in_(names))).all())
+    missing = names - ids.keys()
+    if missing:
+        db.session.execute(dialect_insert(db.session.connection(), model).on_conflict_do_nothing(),
+                           [{'name': n} for n in sorted(missing)])
+        found = db.session.execute(select(model.name, model.id).where(model.name.in_(missing))).all()
+        ids.update(found)
+        created[model.__tablename__] += len(found)
+    return ids
+
+
+def upsert_series(names, created):
+    # series names aren't unique; reuse the lowest id for a name
+    names = set(names)
+    if not names:
+        return {}
+    ids = {}
+    for name, id in db.session.execute(select(Series.name, Series.id)
+                                       .where(Series.name.in_(names)).order_by(Series.id)):
+        ids.setdefault(name, id)
+    missing = sorted(names - ids.keys())
+    if missing:
+        rows = db.session.execute(insert(Series).returning(Series.id, sort_by_parameter_order=True),
+                                  [{'name': n} for n in missing]).scalars().all()
+        ids.update(zip(missing, rows))
+        created[Series.__tablename__] += len(rows)
+    return ids
+
+
+def upsert_authors(keys, created):
+    # (first_name, last_name) -> id
+    keys = set(keys)
+    if not keys:
+        return {}
+    ids = {}
+    key = tuple_(Author.first_name, Author.last_name)
+    for first, last, id in db.session.execute(select(Author.first_name, Author.last_name, Author.id)
+                                              .where(key.in_(keys)).order_by(Author.id)):
+        ids.setdefault((first, last), id)
+    missing = sorted(keys - ids.keys())
+    if missing:
+        rows = db.session.execute(insert(Author).returning(Author.id, sort_by_parameter_order=True),
+                                  [{'first_name': f, 'last_name': l} for f, l in missing]).scalars().all()
+        ids.update(zip(missing, rows))
+        created[Author.__tablename__] += len(rows)
+    return ids
+
+
+def insert_rows(rows):
+    created = Counter()
+    publishers = upsert_by_name(Publisher, (r['publisher'] for r in rows), created)
+    categories = upsert_by_name(Category, (r['category'] for r in rows if r['category']), created)
+    genres = upsert_by_name(Genre, (g for r in rows for g in r['genres']), created)
+    topics = upsert_by_name(Topic, (t for r in rows for t in r['topics']), created)
+    series = upsert_series((r['series'] for r in rows if r['series']), created)
+    authors = upsert_authors((a for r in rows for a in r['authors']), created)
+
+    values = []
+    for r in rows:
+        book = dict(r['book'], publisher_id=publishers[r['publisher']])
+        book['category_id'] = categories[r['category']] if r['category'] else None
+        book['series_id'] = series[r['series']] if r['series'] else None
+        values.append(book)
+
+    # Every row needs the same keys for a single executemany
+    keys = set().union(*values)
+    values = [{k: v.get(k) for k in keys} for v in values]
+    book_ids = db.session.execute(insert(Book).returning(Book.id, sort_by_parameter_order=True),
+                                  values).scalars().all()
+
+    links = {book_authors: [], book_genres: [], book_topics: []}
+    states = []
+    for book_id, r, v in zip(book_ids, rows, values):
+        links[book_authors] += [{'book_id': book_id, 'author_id': authors[a]} for a in r['authors']]
+        links[book_genres] += [{'book_id': book_id, 'genre_id': genres[g]} for g in r['genres']]
+        links[book_topics] += [{'book_id': book_id, 'topic_id': topics[t]} for t in r['topics']]
+        state = {'id': book_id, **{c: v.get(c) for c in STATE_COLUMNS}}
+        state['author_ids'] = sorted({authors[a] for a in r['authors']})
+        state['genre_ids'] = sorted({genres[g] for g in r['genres']})
+        state['topic_ids'] = sorted({topics[t] for t in r['topics']})
+        states.append(state)
+    for table, params in links.items():
+        if params:
+            db.session.execute(table.insert(), params)
+
+    # Keep derived data (recommendation profile, statistics) in step with the bulk insert
+    publish(db.session.connection(), [(None, state) for state in states],
+            tables=[t.name for t in links], counts=created)
+    return book_ids
+
+
+def import_chunk(chunk, report):
+    parsed = []
+    for line, raw in chunk:
+        try:
+            parsed.append((line, parse_row(raw)))
+        except RowError as e:
+            report['errors'].append({'row': line, 'error': str(e)})
+    if not parsed:
+        return
+
+    try:
+        insert_rows([row for _, row in parsed])
+        db.session.commit()
+        report['imported'] += len(parsed)
+        return
+    except SQLAlchemyError:
+        db.session.rollback()
+
+    # Isolate the rows the database rejected
+    for line, row in parsed:
+        try:
+            with db.session.begin_nested():
+                insert_rows([row])
+            report['imported'] += 1
+        except SQLAlchemyError as e:
+            report['errors'].append({'row': line, 'error': str(getattr(e, 'orig', e)).strip()})
+    db.session.commit()
+
+
+def import_books(rows, chunk_size=CHUNK_SIZE):
+    # rows: iterable of dicts (CSV/NDJSON records). Returns a report with a
+    # 1-based row number for every rejected row.
+    report = {'processed': 0, 'imported': 0, 'errors': []}
+    numbered = enumerate(rows, 1)
+    while True:
+        chunk = list(islice(numbered, chunk_size))
+        if not chunk:
+            break
+        report['processed'] += len(chunk)
+        import_chunk(chunk, report)
+    report['errors'].sort(key=lambda e: e['row'])
+    return report
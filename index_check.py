@@ -0,0 +1,121 @@
+import json
+from sqlalchemy import event
+from models import db
+
+# Read endpoints that filter or sort books; each must be served by indexes. Listings
+# of whole reference tables and the exports read everything by design and aren't checked.
+CHECKED_URLS = [
+    '/api/books?limit=1',
+    '/api/books?limit=1&sort=-created_at',
+    '/api/books?limit=1&sort=rating',
+    '/api/books?limit=1&sort=-rating',
+    '/api/books?limit=1&sort=publication_year',
+    '/api/books?limit=1&status=completed',
+    '/api/books?limit=1&status=reading&sort=-created_at',
+    '/api/books?limit=1&genre=1&sort=-created_at',
+    '/api/books?limit=1&author=1&facets=1',
+    '/api/library/stats',
+    '/api/recommendations',
+]
+# Searches only have indexes on PostgreSQL; elsewhere they are a substring scan
+POSTGRESQL_URLS = ['/api/books?limit=1&search=the']
+# Tables that grow with the library. Reference, recommendation and counter tables
+# stay small and may be read in full.
+LIBRARY_TABLES = {'books', 'book_authors', 'book_genres', 'book_topics'}
+# PostgreSQL plans from the real table sizes, so a dev database with a handful of
+# books gets padded (inside the rolled-back EXPLAIN transaction) to library size
+PAD_BOOKS = 20000
+PAD_SQL = [
+    """INSERT INTO books (title, publisher_id, reading_status, current_page, rating,
+                          publication_year, created_at, notes)
+       SELECT 'Index check ' || g, (SELECT min(id) FROM publishers),
+              (ARRAY['unread', 'reading', 'completed'])[mod(g, 3) + 1], 0,
+              CASE WHEN mod(g, 4) > 0 THEN mod(g, 5) + 1 END, 1900 + mod(g, 120),
+              now() - g * interval '1 minute', 'index check'
+       FROM generate_series(1, %(books)s) AS g
+       WHERE EXISTS (SELECT 1 FROM publishers)""",
+    *[f"""INSERT INTO {table} (book_id, {column})
+        SELECT b.id, r.id FROM books b CROSS JOIN (SELECT min(id) AS id FROM {ref}) r
+        WHERE b.notes = 'index check' AND r.id IS NOT NULL"""
+      for table, column, ref in [('book_authors', 'author_id', 'authors'),
+                                 ('book_genres', 'genre_id', 'genres'),
+                                 ('book_topics', 'topic_id', 'topics')]],
+    'ANALYZE books, book_authors, book_genres, book_topics',
+]
+
+
+def capture_statements(client, url):
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith(('SELECT', 'WITH')):
+            statements.append((statement, parameters))
+
+    event.listen(db.engine, 'before_cursor_execute', record)
+    try:
+        response = client.get(url)
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', record)
+    if response.status_code != 200:
+        raise RuntimeError(f'{url} returned {response.status_code}')
+    return response, statements
+
+
+def follow_cursor(url, response):
+    # Also check the keyset condition used for every page after the first
+    cursor = (response.get_json(silent=True) or {}).get('next_cursor')
+    return f'{url}&cursor={cursor}' if cursor else None
+
+
+def postgresql_scans(conn, statement, parameters):
+    plan = conn.exec_driver_sql(f'EXPLAIN (FORMAT JSON) {statement}', parameters).scalar()
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    # A full index scan whose order isn't used (the rows get sorted afterwards) reads
+    # the whole table too. An ordered scan that filters and stops at the LIMIT is fine.
+    nodes, scans = [(plan[0]['Plan'], False)], []
+    while nodes:
+        node, sorted_above = nodes.pop()
+        kind = node['Node Type']
+        full_index_scan = kind in ('Index Scan', 'Index Only Scan') and 'Index Cond' not in node and sorted_above
+        if kind == 'Seq Scan' or full_index_scan:
+            scans.append(node['Relation Name'])
+        sorted_above = sorted_above or kind == 'Sort'
+        nodes.extend((child, sorted_above) for child in node.get('Plans', []))
+    return scans
+
+
+def sqlite_scans(conn, statement, parameters):
+    scans = []
+    for row in conn.exec_driver_sql(f'EXPLAIN QUERY PLAN {statement}', parameters):
+        detail = row[-1]
+        if detail.startswith('SCAN ') and 'USING' not in detail and 'CONSTANT' not in detail:
+            scans.append(detail.split()[1])
+    return scans
+
+
+# Runs each checked endpoint, EXPLAINs every SELECT it issued and returns
+# [(url, statement, tables read in full)] for the offending ones.
+def check_indexes(client):
+    postgresql = db.engine.dialect.name == 'postgresql'
+    statements = []
+    for url in CHECKED_URLS + (POSTGRESQL_URLS if postgresql else []):
+        # The first request also fills caches (catalogue snapshot, statements); check the steady state
+        client.get(url)
+        while url:
+            response, captured = capture_statements(client, url)
+            statements += [(url, s, p) for s, p in captured]
+            url = follow_cursor(url, response) if '/api/books?' in url and 'cursor=' not in url else None
+
+    explain = postgresql_scans if postgresql else sqlite_scans
+    failures = []
+    with db.engine.connect() as conn:
+        if postgresql:
+            for sql in PAD_SQL:
+                conn.exec_driver_sql(sql, {'books': PAD_BOOKS})
+        for url, statement, parameters in statements:
+            scans = [t for t in explain(conn, statement, parameters) if t in LIBRARY_TABLES]
+            if scans:
+                failures.append((url, statement, scans))
+        conn.rollback()
+    return failures
@@ -1,11 +1,15 @@
-from app import app
+from app import create_app
 from models import db, Book, Author, Publisher, Series, Genre, Topic, Category, RecommendedBook
+from migrate import upgrade
+from recommendations import rebuild_profile
+from stats import rebuild_counters
 
 def init_sample_data():
-    with app.app_context():
+    with create_app().app_context():
         print("Clearing existing data...")
         db.drop_all()
         db.create_all()
+        upgrade()
 
         print("Creating sample data...")
         penguin = Publisher(name="Penguin Random House", country="USA")
@@ -234,6 +238,7 @@ def init_sample_data():
             ("Gulliver's Travels", "Jonathan Swift", 1726, 306, 3.6, ["Classic", "Fiction"]),
         ]
 
+        genres_by_name = {g.name: g for g in Genre.query.all()}
         for title, author, year, pages, rating, genre_names in recommended_books_data:
             rec_book = RecommendedBook(
                 title=title,
@@ -245,7 +250,7 @@ def init_sample_data():
             )
 
             for genre_name in genre_names:
-                genre = Genre.query.filter_by(name=genre_name).first()
+                genre = genres_by_name.get(genre_name)
                 if genre:
                     rec_book.genres.append(genre)
 
@@ -253,6 +258,10 @@ def init_sample_data():
 
         db.session.commit()
 
+        # Derived data the app otherwise maintains incrementally
+        rebuild_counters()
+        rebuild_profile()
+
         print("\nSample data created successfully!")
         print(f"\nCreated:")
         print(f"  - {Publisher.query.count()} publishers")
@@ -0,0 +1,224 @@
+import threading
+import time
+from collections import defaultdict
+from contextvars import ContextVar
+from flask import g, jsonify, request, Response
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import TimeoutError as PoolTimeout
+from sqlalchemy.pool import QueuePool
+from models import db
+from pooling import pool_capacity
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+STATEMENT_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200)
+ROW_BUCKETS = (1, 10, 100, 1000, 10000, 100000)
+
+
+def format_labels(labels):
+    return ','.join(f'{k}="{v}"' for k, v in labels)
+
+
+class Histogram:
+    def __init__(self, name, help, buckets):
+        self.name = name
+        self.help = help
+        self.buckets = buckets
+        self.series = defaultdict(lambda: [[0] * len(buckets), 0.0, 0])
+        self.lock = threading.Lock()
+
+    def observe(self, labels, value):
+        with self.lock:
+            counts, _, _ = series = self.series[labels]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} histogram']
+        with self.lock:
+            series = sorted((labels, counts[:], total, n) for labels, (counts, total, n) in self.series.items())
+        for labels, counts, total, n in series:
+            label_text = format_labels(labels)
+            for bound, count in zip(self.buckets, counts):
+                lines.append(f'{self.name}_bucket{{{label_text},le="{bound}"}} {count}')
+            lines.append(f'{self.name}_bucket{{{label_text},le="+Inf"}} {n}')
+            lines.append(f'{self.name}_sum{{{label_text}}} {total}')
+            lines.append(f'{self.name}_count{{{label_text}}} {n}')
+        return lines
+
+
+class Counter:
+    def __init__(self, name, help):
+        self.name = name
+        self.help = help
+        self.values = defaultdict(int)
+        self.lock = threading.Lock()
+
+    def inc(self, labels, value=1):
+        with self.lock:
+            self.values[labels] += value
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} counter']
+        with self.lock:
+            values = sorted(self.values.items())
+        for labels, value in values:
+            lines.append(f'{self.name}{{{format_labels(labels)}}} {value}' if labels else f'{self.name} {value}')
+        return lines
+
+
+REQUESTS = Counter('http_requests_total', 'Requests by route, method and status')
+DURATION = Histogram('http_request_duration_seconds', 'Wall time per request', DURATION_BUCKETS)
+DB_DURATION = Histogram('http_request_db_seconds', 'Time spent in SQL statements per request', DURATION_BUCKETS)
+STATEMENTS = Histogram('http_request_sql_statements', 'SQL statements per request', STATEMENT_BUCKETS)
+ROWS = Histogram('http_request_sql_rows', 'Rows returned by SQL statements per request', ROW_BUCKETS)
+POOL_EXHAUSTED = Counter('db_pool_exhausted_total', 'Connection checkouts that took the last free connection')
+POOL_TIMEOUTS = Counter('db_pool_timeouts_total', 'Requests that gave up waiting for a pooled connection')
+METRICS = [REQUESTS, DURATION, DB_DURATION, STATEMENTS, ROWS, POOL_EXHAUSTED, POOL_TIMEOUTS]
+
+
+class RequestMetrics:
+    def __init__(self, capture_sql):
+        self.start = time.perf_counter()
+        self.db_time = 0.0
+        self.statements = 0
+        self.rows = 0
+        # (statement, seconds) for the slow-request log
+        self.sql = [] if capture_sql else None
+        # Statements of one request may run on several threads (see async_queries.py)
+        self.lock = threading.Lock()
+
+    def record(self, statement, elapsed, rows):
+        with self.lock:
+            self.db_time += elapsed
+            self.statements += 1
+            self.rows += rows
+            if self.sql is not None:
+                self.sql.append((statement, elapsed))
+
+
+# Carries a request's metrics to code running outside its app context
+bound_metrics = ContextVar('bound_metrics', default=None)
+
+
+def bind_metrics(metrics):
+    bound_metrics.set(metrics)
+
+
+def current_metrics():
+    # Statements run outside a request (CLI commands, background work) aren't tracked
+    return g.get('request_metrics') if g else bound_metrics.get()
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _start_statement(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('statement_start', []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def _end_statement(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info['statement_start'].pop()
+    metrics = current_metrics()
+    if metrics is None:
+        return
+    # Drivers that don't report a row count for SELECTs (sqlite3) leave this at 0
+    rows = cursor.rowcount if cursor.description is not None and cursor.rowcount > 0 else 0
+    metrics.record(statement, elapsed, rows)
+
+
+@event.listens_for(Engine, 'handle_error')
+def _failed_statement(context):
+    # A failed statement never reaches after_cursor_execute; drop its start time
+    # so the connection doesn't carry it back into the pool
+    if context.connection is not None:
+        starts = context.connection.info.get('statement_start')
+        if starts:
+            starts.pop()
+
+
+def pool_gauges(pool, capacity):
+    if not capacity or not isinstance(pool, QueuePool):
+        return []
+    return ['# HELP db_pool_connections Connections in this process\'s pool by state',
+            '# TYPE db_pool_connections gauge',
+            f'db_pool_connections{{state="checked_out"}} {pool.checkedout()}',
+            f'db_pool_connections{{state="idle"}} {pool.checkedin()}',
+            '# HELP db_pool_capacity Pool size plus overflow',
+            '# TYPE db_pool_capacity gauge',
+            f'db_pool_capacity {capacity}']
+
+
+def route_labels():
+    rule = request.url_rule.rule if request.url_rule else 'unmatched'
+    return (('method', request.method), ('route', rule))
+
+
+def server_timing(metrics, total):
+    return (f'db;dur={metrics.db_time * 1000:.1f};desc="{metrics.statements} queries, {metrics.rows} rows", '
+            f'app;dur={max(total - metrics.db_time, 0) * 1000:.1f}, total;dur={total * 1000:.1f}')
+
+
+def log_slow_request(app, metrics, total):
+    lines = [f'Slow request: {request.method} {request.full_path} took {total * 1000:.0f} ms, '
+             f'{metrics.statements} queries ({metrics.db_time * 1000:.0f} ms), {metrics.rows} rows']
+    for statement, elapsed in metrics.sql:
+        lines.append(f'  {elapsed * 1000:8.1f} ms  {" ".join(statement.split())}')
+    app.logger.warning('\n'.join(lines))
+
+
+# Per-request wall time, SQL time, statement and row counts: sent back as a
+# Server-Timing header, aggregated per route on /metrics and, for requests over
+# SLOW_REQUEST_MS or SLOW_REQUEST_QUERIES, logged together with their SQL. Pool
+# saturation shows up as db_pool_* metrics and as 503s once DB_POOL_TIMEOUT passes.
+def instrument(app):
+    slow_ms = app.config.get('SLOW_REQUEST_MS')
+    slow_queries = app.config.get('SLOW_REQUEST_QUERIES')
+    capacity = pool_capacity(app.config.get('SQLALCHEMY_ENGINE_OPTIONS', {}))
+    # engine.pool is replaced when the engine is disposed (e.g. after a fork);
+    # listeners registered on the engine carry over to the new pool
+    with app.app_context():
+        engine = db.engine
+
+    if capacity and isinstance(engine.pool, QueuePool):
+        @event.listens_for(engine, 'checkout')
+        def check_saturation(dbapi_connection, connection_record, connection_proxy):
+            if engine.pool.checkedout() >= capacity:
+                POOL_EXHAUSTED.inc(())
+
+    @app.before_request
+    def start_request():
+        g.request_metrics = RequestMetrics(capture_sql=bool(slow_ms or slow_queries))
+
+    @app.after_request
+    def finish_request(response):
+        metrics = g.pop('request_metrics', None)
+        if metrics is None:
+            return response
+        total = time.perf_counter() - metrics.start
+        labels = route_labels()
+        REQUESTS.inc(labels + (('status', str(response.status_code)),))
+        DURATION.observe(labels, total)
+        DB_DURATION.observe(labels, metrics.db_time)
+        STATEMENTS.observe(labels, metrics.statements)
+        ROWS.observe(labels, metrics.rows)
+        response.headers['Server-Timing'] = server_timing(metrics, total)
+        if (slow_ms and total * 1000 >= slow_ms) or (slow_queries and metrics.statements >= slow_queries):
+            log_slow_request(app, metrics, total)
+        return response
+
+    @app.errorhandler(PoolTimeout)
+    def pool_timeout(error):
+        POOL_TIMEOUTS.inc(())
+        app.logger.warning(f'Connection pool exhausted: {request.method} {request.full_path}')
+        response = jsonify({'error': 'The database is busy, try again'})
+        response.status_code = 503
+        response.headers['Retry-After'] = '1'
+        return response
+
+    @app.route('/metrics')
+    def metrics():
+        lines = [line for metric in METRICS for line in metric.render()] + pool_gauges(engine.pool, capacity)
+        return Response('\n'.join(lines) + '\n', mimetype='text/plain; version=0.0.4')
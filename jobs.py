@@ -0,0 +1,285 @@
+import json
+import os
+import threading
+from flask import current_app
+from datetime import datetime, timedelta
+from sqlalchemy import and_, delete, func, or_, select, update
+from sqlalchemy.exc import OperationalError
+from dedupe import rebuild_match_keys
+from exports import EXPORT_BATCH, iter_export_books, csv_chunks, json_chunks, ndjson_chunks
+from models import db, Job
+from recommendations import REFRESH_JOB, rebuild_profile, refresh_scores
+from replicas import replica_reads
+from stats import book_total, rebuild_counters
+
+# A running job whose worker stopped beating for this long (killed, crashed) is
+# claimed again; it fails once it has been started MAX_ATTEMPTS times
+STALE_AFTER = timedelta(minutes=5)
+HEARTBEAT_SECONDS = 30
+MAX_ATTEMPTS = 3
+# Idle workers look for new jobs this often; jobs enqueued by the same process wake them at once
+POLL_SECONDS = 2
+# Finished jobs and their files are deleted after this long
+RETENTION = timedelta(days=1)
+EXPORT_FORMATS = {'csv': csv_chunks, 'json': json_chunks, 'ndjson': ndjson_chunks}
+
+# kind -> (function(run) returning the artifact file name or None, function(params) validating them)
+JOB_KINDS = {}
+workers = None
+
+
+class JobError(ValueError):
+    pass
+
+
+def job_kind(name, check=None):
+    def register(fn):
+        JOB_KINDS[name] = (fn, check)
+        return fn
+    return register
+
+
+class JobRun:
+    # What a job function gets: its parameters, the folder for its artifact and a way
+    # to report progress, written in its own transaction so clients see it at once
+    def __init__(self, id, params, folder):
+        self.id = id
+        self.params = params
+        self.folder = folder
+
+    def report(self, progress, total=None):
+        values = {'progress': progress}
+        if total is not None:
+            values['total'] = total
+        touch_job(self.id, values)
+
+
+def touch_job(id, values=None):
+    # Progress and heartbeats are best effort. SQLite can't take them while the job's
+    # own read is open (and would lock readers out while waiting), so it goes without.
+    table = Job.__table__
+    if db.engine.dialect.name == 'sqlite':
+        return
+    try:
+        with db.engine.begin() as connection:
+            connection.execute(update(table).where(table.c.id == id)
+                               .values(heartbeat_at=datetime.utcnow(), **(values or {})))
+    except OperationalError as e:
+        current_app.logger.warning(f'Job {id}: progress not recorded: {e}')
+
+
+def check_export(params):
+    if params.get('format') not in EXPORT_FORMATS:
+        raise JobError(f'params.format must be one of {", ".join(EXPORT_FORMATS)}')
+
+
+@job_kind('export', check_export)
+def export_job(run):
+    with replica_reads():
+        return write_export(run)
+
+
+def write_export(run):
+    fmt = run.params['format']
+    total = book_total()
+    run.report(0, total)
+
+    def books():
+        for i, book in enumerate(iter_export_books(), 1):
+            yield book
+            if i % EXPORT_BATCH == 0:
+                run.report(i)
+
+    chunks = json_chunks(books(), total) if fmt == 'json' else EXPORT_FORMATS[fmt](books())
+    name = f'job-{run.id}.{fmt}'
+    path = os.path.join(run.folder, name)
+    # Written under a temporary name so a download never sees a partial file
+    with open(path + '.part', 'w', encoding='utf-8', newline='') as f:
+        for chunk in chunks:
+            f.write(chunk)
+    os.replace(path + '.part', path)
+    return name
+
+
+@job_kind('rebuild_stats')
+def rebuild_stats_job(run):
+    rebuild_counters()
+
+
+@job_kind('rebuild_match_keys')
+def rebuild_match_keys_job(run):
+    rebuild_match_keys()
+
+
+@job_kind('rebuild_recommendations')
+def rebuild_recommendations_job(run):
+    rebuild_profile()
+
+
+# Queued by the writes that make the cached scores stale, see recommendations.py
+@job_kind(REFRESH_JOB)
+def refresh_recommendations_job(run):
+    refresh_scores()
+
+
+def enqueue(kind, params=None):
+    if kind not in JOB_KINDS:
+        raise JobError(f'kind must be one of {", ".join(JOB_KINDS)}')
+    params = {} if params is None else params
+    if not isinstance(params, dict):
+        raise JobError('params must be an object')
+    _, check = JOB_KINDS[kind]
+    if check:
+        check(params)
+    job = Job(kind=kind, params=json.dumps(params))
+    db.session.add(job)
+    db.session.commit()
+    if workers is not None:
+        workers.wake.set()
+    return job
+
+
+def claim_job():
+    # Takes the oldest queued (or abandoned) job. SKIP LOCKED lets any number of
+    # workers claim at once: each skips the rows another one is claiming instead
+    # of waiting on its lock, so no two get the same job.
+    table = Job.__table__
+    now = datetime.utcnow()
+    pending = or_(table.c.status == 'queued',
+                  and_(table.c.status == 'running', table.c.heartbeat_at < now - STALE_AFTER))
+    candidate = (select(table.c.id).where(pending).order_by(table.c.id).limit(1)
+                 .with_for_update(skip_locked=True).scalar_subquery())
+    with db.engine.begin() as connection:
+        return connection.execute(
+            update(table).where(table.c.id == candidate)
+            .values(status='running', attempts=table.c.attempts + 1, started_at=now, heartbeat_at=now)
+            .returning(table.c.id, table.c.kind, table.c.params, table.c.attempts)
+        ).first()
+
+
+def finish_job(id, status, artifact=None, error=None):
+    table = Job.__table__
+    with db.engine.begin() as connection:
+        connection.execute(update(table).where(table.c.id == id).values(
+            status=status, artifact=artifact, error=error, finished_at=datetime.utcnow(),
+            progress=func.coalesce(table.c.total, table.c.progress) if status == 'done' else table.c.progress))
+
+
+def heartbeat(app, id, stopped):
+    # Keeps a job that doesn't report progress from looking abandoned
+    with app.app_context():
+        while not stopped.wait(HEARTBEAT_SECONDS):
+            touch_job(id)
+
+
+# Runs the next job, if any, in the current app context; returns whether there was one
+def run_next_job(app, folder):
+    claimed = claim_job()
+    if claimed is None:
+        return False
+    id, kind, params, attempts = claimed
+    if attempts > MAX_ATTEMPTS:
+        finish_job(id, 'failed', error=f'Abandoned by its worker {MAX_ATTEMPTS} times')
+        return True
+    if kind not in JOB_KINDS:
+        finish_job(id, 'failed', error=f'Unknown job kind {kind}')
+        return True
+
+    stopped = threading.Event()
+    threading.Thread(target=heartbeat, args=(app, id, stopped), daemon=True).start()
+    try:
+        artifact = JOB_KINDS[kind][0](JobRun(id, json.loads(params), folder))
+    except Exception as e:
+        db.session.rollback()
+        app.logger.exception(f'Job {id} ({kind}) failed')
+        finish_job(id, 'failed', error=str(e) or type(e).__name__)
+    else:
+        finish_job(id, 'done', artifact=artifact)
+    finally:
+        stopped.set()
+    return True
+
+
+def purge_jobs(folder):
+    table = Job.__table__
+    with db.engine.begin() as connection:
+        expired = connection.execute(
+            delete(table).where(table.c.status.in_(('done', 'failed')),
+                                table.c.finished_at < datetime.utcnow() - RETENTION)
+            .returning(table.c.artifact)
+        ).scalars().all()
+    for artifact in expired:
+        if artifact and os.path.exists(os.path.join(folder, artifact)):
+            os.remove(os.path.join(folder, artifact))
+
+
+class JobWorkers:
+    # Threads that claim and run jobs, in a web worker or in `flask run-jobs`
+    def __init__(self, app, threads, folder):
+        self.app = app
+        self.threads = threads
+        self.folder = folder
+        self.wake = threading.Event()
+        self.stopping = threading.Event()
+        self.lock = threading.Lock()
+        self.pid = None
+
+    def start(self):
+        # Started lazily, and again in a forked worker: threads don't survive a fork
+        with self.lock:
+            if self.pid == os.getpid():
+                return
+            self.pid = os.getpid()
+            os.makedirs(self.folder, exist_ok=True)
+            for i in range(self.threads):
+                threading.Thread(target=self.loop, name=f'jobs-{i}', daemon=True).start()
+
+    def loop(self):
+        last_purge = None
+        while not self.stopping.is_set():
+            try:
+                with self.app.app_context():
+                    if run_next_job(self.app, self.folder):
+                        continue
+                    if last_purge is None or datetime.utcnow() - last_purge > timedelta(hours=1):
+                        purge_jobs(self.folder)
+                        last_purge = datetime.utcnow()
+            except Exception:
+                self.app.logger.exception('Job worker error')
+            self.wake.wait(POLL_SECONDS)
+            self.wake.clear()
+
+    def stop(self):
+        # Jobs already running finish; no new ones are claimed
+        self.stopping.set()
+        self.wake.set()
+
+
+def init_jobs(app, threads):
+    global workers
+    workers = JobWorkers(app, threads, app.config['JOB_FOLDER'])
+    if threads:
+        app.before_request(workers.start)
+
+
+def shutdown_jobs():
+    if workers is not None:
+        workers.stop()
+
+
+def serialize_job(job):
+    data = {
+        'id': job.id,
+        'kind': job.kind,
+        'params': json.loads(job.params),
+        'status': job.status,
+        'progress': job.progress,
+        'total': job.total,
+        'error': job.error,
+        'created_at': job.created_at.isoformat() if job.created_at else None,
+        'started_at': job.started_at.isoformat() if job.started_at else None,
+        'finished_at': job.finished_at.isoformat() if job.finished_at else None,
+    }
+    if job.status == 'done' and job.artifact:
+        data['download_url'] = f'/api/jobs/{job.id}/download'
+    return data
@@ -0,0 +1,83 @@
+from flask import Blueprint, render_template, request, jsonify
+from pagination import PaginationError
+from recommendations import recommendations_summary, recommendations_summary_queries, build_recommendations_summary
+from stats import library_summary, library_summary_queries, build_library_summary
+from caching import cached_get, STATS_TABLES, RECOMMENDATION_TABLES, BOOTSTRAP_TABLES, SUGGEST_TABLES
+from references import REFERENCE_MODELS, reference_lists_query, build_reference_lists
+from async_queries import run_batches
+from catalogue import current_catalogue
+from suggest import SUGGEST_ENTITIES, suggest
+from book_routes import book_list_payload
+
+bp = Blueprint('library', __name__)
+
+BOOTSTRAP_PARTS = ('stats', 'books', *REFERENCE_MODELS, 'recommendations')
+
+
+@bp.route('/')
+def index():
+    return render_template('index.html')
+
+
+# Type-ahead for the book form and the search box: the best matches for q, so the page
+# never loads a whole table of authors, publishers or series
+@bp.route('/api/suggest/<entity>')
+@cached_get(*SUGGEST_TABLES)
+def suggestions(entity):
+    if entity not in SUGGEST_ENTITIES:
+        return jsonify({'error': f'entity must be one of {", ".join(SUGGEST_ENTITIES)}'}), 404
+    try:
+        return jsonify(suggest(entity, request.args.get('q', ''), request.args.get('limit')))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+
+@bp.route('/api/library/stats')
+@cached_get(*STATS_TABLES)
+def library_stats():
+    catalogue = current_catalogue()
+    return jsonify(catalogue.library_summary() if catalogue else library_summary())
+
+
+@bp.route('/api/recommendations')
+@cached_get(*RECOMMENDATION_TABLES)
+def get_recommendations():
+    return jsonify(recommendations_summary())
+
+
+# Everything the page needs on load in one response; include= picks the parts and the
+# books part takes the same parameters as /api/books
+@bp.route('/api/bootstrap')
+@cached_get(*BOOTSTRAP_TABLES)
+def bootstrap():
+    include = [p.strip() for p in request.args.get('include', '').split(',') if p.strip()] or BOOTSTRAP_PARTS
+    unknown = [p for p in include if p not in BOOTSTRAP_PARTS]
+    if unknown:
+        return jsonify({'error': f'Unknown parts: {", ".join(unknown)}'}), 400
+
+    payload = {}
+    if 'books' in include:
+        try:
+            payload['books'] = book_list_payload(request.args)
+        except (ValueError, PaginationError) as e:
+            return jsonify({'error': str(e)}), 400
+    # The other parts' queries are independent of each other and run as one batch
+    catalogue = current_catalogue()
+    batches = {}
+    kinds = [p for p in include if p in REFERENCE_MODELS]
+    if catalogue is not None:
+        if 'stats' in include:
+            payload['stats'] = catalogue.library_summary()
+        payload.update(catalogue.reference_lists(kinds))
+    else:
+        if 'stats' in include:
+            batches['stats'] = (library_summary_queries(), build_library_summary)
+        if kinds:
+            batches['references'] = ([(reference_lists_query(kinds), 'all')],
+                                     lambda rows: build_reference_lists(kinds, rows))
+    if 'recommendations' in include:
+        batches['recommendations'] = (recommendations_summary_queries(), build_recommendations_summary)
+    results = run_batches(batches)
+    payload.update(results.pop('references', {}))
+    payload.update(results)
+    return jsonify(payload)
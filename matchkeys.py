@@ -0,0 +1,84 @@
+import hashlib
+import re
+import unicodedata
+
+# Normalized keys stored next to the columns they are computed from, so duplicate
+# detection and the owned-book check compare indexed columns instead of free text.
+# They are set on insert by column defaults (models.py), on ORM updates by
+# dedupe.refresh_match_keys and by the bulk update paths through match_keys().
+
+# A leading article doesn't tell titles apart: "The Hobbit" matches "Hobbit"
+TITLE_ARTICLES = ('the', 'a', 'an')
+
+
+def isbn13_check_digit(digits):
+    return str(-sum(int(d) * (3 if i % 2 else 1) for i, d in enumerate(digits)) % 10)
+
+
+# ISBN-10 or ISBN-13, with any hyphens or spaces, as ISBN-13 digits; None when it
+# isn't a valid ISBN
+def normalize_isbn(value):
+    chars = re.sub(r'[^0-9X]', '', (value or '').upper())
+    if re.fullmatch(r'\d{9}[\dX]', chars):
+        check = sum((10 - i) * (10 if c == 'X' else int(c)) for i, c in enumerate(chars))
+        if check % 11:
+            return None
+        return '978' + chars[:9] + isbn13_check_digit('978' + chars[:9])
+    if re.fullmatch(r'97[89]\d{10}', chars) and isbn13_check_digit(chars[:12]) == chars[12]:
+        return chars
+    return None
+
+
+def normalize_words(value):
+    # Lower case words without accents or punctuation
+    text = unicodedata.normalize('NFKD', value or '')
+    return re.findall(r'\w+', ''.join(c for c in text if not unicodedata.combining(c)).lower())
+
+
+def short_hash(text):
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()[:16]
+
+
+def title_key(title):
+    words = normalize_words(title)
+    if len(words) > 1 and words[0] in TITLE_ARTICLES:
+        words = words[1:]
+    return short_hash(' '.join(words)) if words else None
+
+
+def person_key(*names):
+    # "J.R.R. Tolkien", "J. R. R." + "Tolkien" -> "j r r tolkien"
+    words = normalize_words(' '.join(n for n in names if n))
+    return ' '.join(words) or None
+
+
+def authors_key(name_keys):
+    # Order-independent hash of a book's authors
+    return short_hash('|'.join(sorted(set(name_keys))))
+
+
+# table -> key column -> (function, source columns)
+MATCH_KEYS = {
+    'books': {'isbn_key': (normalize_isbn, ('isbn',)),
+              'title_key': (title_key, ('title',))},
+    'recommended_books': {'isbn_key': (normalize_isbn, ('isbn',)),
+                          'title_key': (title_key, ('title',)),
+                          'author_key': (person_key, ('author_name',))},
+    'authors': {'name_key': (person_key, ('first_name', 'last_name'))},
+}
+
+
+def match_keys(table, values):
+    # The keys of table whose source columns are all in values
+    return {key: fn(*[values[c] for c in sources])
+            for key, (fn, sources) in MATCH_KEYS[table].items() if all(c in values for c in sources)}
+
+
+def match_key_default(table, key):
+    # Column default computing key from the inserted row
+    fn, sources = MATCH_KEYS[table][key]
+
+    def default(context):
+        params = context.get_current_parameters()
+        return fn(*[params.get(c) for c in sources])
+    return default
@@ -0,0 +1,35 @@
+import os
+from datetime import datetime
+from models import db, SchemaMigration
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'migrations')
+
+
+def migration_files():
+    return sorted(f for f in os.listdir(MIGRATIONS_DIR) if f.endswith('.sql'))
+
+
+# Migrations are PostgreSQL-only and idempotent, so they are safe to run on a schema
+# freshly built by db.create_all(). Other databases only get the create_all() schema.
+def upgrade():
+    engine = db.engine
+    if engine.dialect.name != 'postgresql':
+        return []
+
+    SchemaMigration.__table__.create(engine, checkfirst=True)
+    applied = {m.version for m in SchemaMigration.query.all()}
+    db.session.remove()
+
+    done = []
+    for name in migration_files():
+        version = name[:-len('.sql')]
+        if version in applied:
+            continue
+        with open(os.path.join(MIGRATIONS_DIR, name), encoding='utf-8') as f:
+            sql = f.read()
+        with engine.begin() as conn:
+            # Run the file through the driver directly so it can hold several statements
+            conn.connection.cursor().execute(sql)
+            conn.execute(SchemaMigration.__table__.insert().values(version=version, applied_at=datetime.utcnow()))
+        done.append(version)
+    return done
@@ -0,0 +1,111 @@
+-- Full-text search over books: a tsvector maintained by triggers (title, authors,
+-- genres/topics, description/notes) plus trigram indexes for substring and fuzzy matching.
+
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+ALTER TABLE books ADD COLUMN IF NOT EXISTS search_vector tsvector;
+
+CREATE OR REPLACE FUNCTION books_search_document(p_id integer, p_title text, p_description text, p_notes text)
+RETURNS tsvector LANGUAGE sql STABLE AS $$
+    SELECT setweight(to_tsvector('simple', coalesce(p_title, '')), 'A')
+        || setweight(to_tsvector('simple', coalesce((
+               SELECT string_agg(a.first_name || ' ' || a.last_name, ' ')
+               FROM book_authors ba JOIN authors a ON a.id = ba.author_id
+               WHERE ba.book_id = p_id), '')), 'B')
+        || setweight(to_tsvector('simple', coalesce((
+               SELECT string_agg(g.name, ' ')
+               FROM book_genres bg JOIN genres g ON g.id = bg.genre_id
+               WHERE bg.book_id = p_id), '') || ' ' || coalesce((
+               SELECT string_agg(t.name, ' ')
+               FROM book_topics bt JOIN topics t ON t.id = bt.topic_id
+               WHERE bt.book_id = p_id), '')), 'C')
+        || setweight(to_tsvector('simple', coalesce(p_description, '') || ' ' || coalesce(p_notes, '')), 'D')
+$$;
+
+CREATE OR REPLACE FUNCTION books_refresh_search(p_ids integer[])
+RETURNS void LANGUAGE sql AS $$
+    UPDATE books SET search_vector = books_search_document(id, title, description, notes)
+    WHERE id = ANY(p_ids)
+$$;
+
+CREATE OR REPLACE FUNCTION books_search_row() RETURNS trigger LANGUAGE plpgsql AS $$
+BEGIN
+    NEW.search_vector := books_search_document(NEW.id, NEW.title, NEW.description, NEW.notes);
+    RETURN NEW;
+END $$;
+
+DROP TRIGGER IF EXISTS books_search_row ON books;
+CREATE TRIGGER books_search_row BEFORE INSERT OR UPDATE OF title, description, notes ON books
+    FOR EACH ROW EXECUTE FUNCTION books_search_row();
+
+-- Association rows change in bulk (bulk import, relationship reassignment), so these
+-- triggers are statement level and refresh each affected book once.
+CREATE OR REPLACE FUNCTION book_links_search_refresh() RETURNS trigger LANGUAGE plpgsql AS $$
+BEGIN
+    IF TG_OP = 'DELETE' THEN
+        PERFORM books_refresh_search(ARRAY(SELECT DISTINCT book_id FROM old_rows));
+    ELSE
+        PERFORM books_refresh_search(ARRAY(SELECT DISTINCT book_id FROM new_rows));
+    END IF;
+    RETURN NULL;
+END $$;
+
+DROP TRIGGER IF EXISTS book_authors_search_insert ON book_authors;
+CREATE TRIGGER book_authors_search_insert AFTER INSERT ON book_authors
+    REFERENCING NEW TABLE AS new_rows FOR EACH STATEMENT EXECUTE FUNCTION book_links_search_refresh();
+DROP TRIGGER IF EXISTS book_authors_search_delete ON book_authors;
+CREATE TRIGGER book_authors_search_delete AFTER DELETE ON book_authors
+    REFERENCING OLD TABLE AS old_rows FOR EACH STATEMENT EXECUTE FUNCTION book_links_search_refresh();
+
+DROP TRIGGER IF EXISTS book_genres_search_insert ON book_genres;
+CREATE TRIGGER book_genres_search_insert AFTER INSERT ON book_genres
+    REFERENCING NEW TABLE AS new_rows FOR EACH STATEMENT EXECUTE FUNCTION book_links_search_refresh();
+DROP TRIGGER IF EXISTS book_genres_search_delete ON book_genres;
+CREATE TRIGGER book_genres_search_delete AFTER DELETE ON book_genres
+    REFERENCING OLD TABLE AS old_rows FOR EACH STATEMENT EXECUTE FUNCTION book_links_search_refresh();
+
+DROP TRIGGER IF EXISTS book_topics_search_insert ON book_topics;
+CREATE TRIGGER book_topics_search_insert AFTER INSERT ON book_topics
+    REFERENCING NEW TABLE AS new_rows FOR EACH STATEMENT EXECUTE FUNCTION book_links_search_refresh();
+DROP TRIGGER IF EXISTS book_topics_search_delete ON book_topics;
+CREATE TRIGGER book_topics_search_delete AFTER DELETE ON book_topics
+    REFERENCING OLD TABLE AS old_rows FOR EACH STATEMENT EXECUTE FUNCTION book_links_search_refresh();
+
+-- Renaming an author, genre or topic changes the document of every book linked to it.
+CREATE OR REPLACE FUNCTION authors_search_refresh() RETURNS trigger LANGUAGE plpgsql AS $$
+BEGIN
+    PERFORM books_refresh_search(ARRAY(
+        SELECT DISTINCT ba.book_id FROM book_authors ba JOIN new_rows n ON n.id = ba.author_id));
+    RETURN NULL;
+END $$;
+
+CREATE OR REPLACE FUNCTION genres_search_refresh() RETURNS trigger LANGUAGE plpgsql AS $$
+BEGIN
+    PERFORM books_refresh_search(ARRAY(
+        SELECT DISTINCT bg.book_id FROM book_genres bg JOIN new_rows n ON n.id = bg.genre_id));
+    RETURN NULL;
+END $$;
+
+CREATE OR REPLACE FUNCTION topics_search_refresh() RETURNS trigger LANGUAGE plpgsql AS $$
+BEGIN
+    PERFORM books_refresh_search(ARRAY(
+        SELECT DISTINCT bt.book_id FROM book_topics bt JOIN new_rows n ON n.id = bt.topic_id));
+    RETURN NULL;
+END $$;
+
+DROP TRIGGER IF EXISTS authors_search_refresh ON authors;
+CREATE TRIGGER authors_search_refresh AFTER UPDATE ON authors
+    REFERENCING NEW TABLE AS new_rows FOR EACH STATEMENT EXECUTE FUNCTION authors_search_refresh();
+DROP TRIGGER IF EXISTS genres_search_refresh ON genres;
+CREATE TRIGGER genres_search_refresh AFTER UPDATE ON genres
+    REFERENCING NEW TABLE AS new_rows FOR EACH STATEMENT EXECUTE FUNCTION genres_search_refresh();
+DROP TRIGGER IF EXISTS topics_search_refresh ON topics;
+CREATE TRIGGER topics_search_refresh AFTER UPDATE ON topics
+    REFERENCING NEW TABLE AS new_rows FOR EACH STATEMENT EXECUTE FUNCTION topics_search_refresh();
+
+CREATE INDEX IF NOT EXISTS ix_books_search_vector ON books USING gin (search_vector);
+CREATE INDEX IF NOT EXISTS ix_books_title_trgm ON books USING gin (title gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS ix_books_description_trgm ON books USING gin (description gin_trgm_ops);
+
+UPDATE books SET search_vector = books_search_document(id, title, description, notes)
+WHERE search_vector IS NULL;
@@ -0,0 +1,35 @@
+-- Tables added next to the original schema: the reader profile and cached scores
+-- (recommendations.py), the statistics counters (stats.py), the ETag versions
+-- (caching.py) and the recommended books' topics. They match models.py, so a database
+-- built by db.create_all() already has them and this is a no-op. The name sorts
+-- between 001 and 002 so that the indexes in 002_indexes.sql find the tables.
+
+CREATE TABLE IF NOT EXISTS recommended_book_topics (
+    recommended_book_id INTEGER NOT NULL REFERENCES recommended_books (id) ON DELETE CASCADE,
+    topic_id INTEGER NOT NULL REFERENCES topics (id) ON DELETE CASCADE,
+    PRIMARY KEY (recommended_book_id, topic_id)
+);
+
+CREATE TABLE IF NOT EXISTS reader_affinity (
+    kind VARCHAR(10) NOT NULL,
+    ref_id INTEGER NOT NULL,
+    weight DOUBLE PRECISION NOT NULL DEFAULT 0,
+    PRIMARY KEY (kind, ref_id)
+);
+
+CREATE TABLE IF NOT EXISTS recommendation_scores (
+    recommended_book_id INTEGER PRIMARY KEY REFERENCES recommended_books (id) ON DELETE CASCADE,
+    score DOUBLE PRECISION NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS ix_recommendation_scores_score ON recommendation_scores (score);
+
+CREATE TABLE IF NOT EXISTS library_counters (
+    key VARCHAR(150) PRIMARY KEY,
+    value DOUBLE PRECISION NOT NULL DEFAULT 0
+);
+
+CREATE TABLE IF NOT EXISTS table_versions (
+    name VARCHAR(100) PRIMARY KEY,
+    version INTEGER NOT NULL
+);
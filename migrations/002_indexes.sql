@@ -0,0 +1,34 @@
+-- Indexes for the API's filters, sorts and joins. Names match models.py so a
+-- database built by db.create_all() already has them and this is a no-op.
+
+-- Foreign keys and lookups
+CREATE INDEX IF NOT EXISTS ix_books_publisher_id ON books (publisher_id);
+CREATE INDEX IF NOT EXISTS ix_books_series_id ON books (series_id);
+CREATE INDEX IF NOT EXISTS ix_books_category_id ON books (category_id);
+CREATE INDEX IF NOT EXISTS ix_books_isbn ON books (isbn);
+
+-- Keyset pagination: (sort key, id), with and without the status filter.
+-- The coalesce() expressions must match the sort keys in pagination.py.
+CREATE INDEX IF NOT EXISTS ix_books_title_id ON books (title, id);
+CREATE INDEX IF NOT EXISTS ix_books_created_at_id ON books (created_at, id);
+CREATE INDEX IF NOT EXISTS ix_books_rating_sort ON books (coalesce(rating, -1.0), id);
+CREATE INDEX IF NOT EXISTS ix_books_year_sort ON books (coalesce(publication_year, -100000), id);
+CREATE INDEX IF NOT EXISTS ix_books_status_title_id ON books (reading_status, title, id);
+CREATE INDEX IF NOT EXISTS ix_books_status_created_at_id ON books (reading_status, created_at, id);
+
+-- Completed books drive the recommendation profile and statistics
+CREATE INDEX IF NOT EXISTS ix_books_completed ON books (id) WHERE reading_status = 'completed';
+
+-- Reverse side of the association tables (the primary keys lead with book_id)
+CREATE INDEX IF NOT EXISTS ix_book_authors_author_id ON book_authors (author_id);
+CREATE INDEX IF NOT EXISTS ix_book_genres_genre_id ON book_genres (genre_id);
+CREATE INDEX IF NOT EXISTS ix_book_topics_topic_id ON book_topics (topic_id);
+CREATE INDEX IF NOT EXISTS ix_series_authors_author_id ON series_authors (author_id);
+CREATE INDEX IF NOT EXISTS ix_recommended_book_genres_genre_id ON recommended_book_genres (genre_id);
+CREATE INDEX IF NOT EXISTS ix_recommended_book_topics_topic_id ON recommended_book_topics (topic_id);
+
+-- Recommendations
+CREATE INDEX IF NOT EXISTS ix_recommended_books_average_rating ON recommended_books (average_rating);
+CREATE INDEX IF NOT EXISTS ix_reader_affinity_kind_weight ON reader_affinity (kind, weight);
+
+ANALYZE books;
@@ -0,0 +1,20 @@
+-- Background job queue (jobs.py). Matches the Job model, so a database built by
+-- db.create_all() already has it and this is a no-op.
+
+CREATE TABLE IF NOT EXISTS jobs (
+    id SERIAL PRIMARY KEY,
+    kind VARCHAR(50) NOT NULL,
+    params TEXT NOT NULL DEFAULT '{}',
+    status VARCHAR(20) NOT NULL DEFAULT 'queued',
+    progress INTEGER NOT NULL DEFAULT 0,
+    total INTEGER,
+    error TEXT,
+    artifact VARCHAR(300),
+    attempts INTEGER NOT NULL DEFAULT 0,
+    created_at TIMESTAMP,
+    started_at TIMESTAMP,
+    heartbeat_at TIMESTAMP,
+    finished_at TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS ix_jobs_pending ON jobs (id) WHERE status IN ('queued', 'running');
@@ -0,0 +1,28 @@
+-- Link rows are deleted with either side (ON DELETE CASCADE), as declared in models.py.
+-- The constraints keep PostgreSQL's default names, which db.create_all() also gets,
+-- so rerunning this only recreates them.
+
+ALTER TABLE book_authors DROP CONSTRAINT IF EXISTS book_authors_book_id_fkey,
+    ADD CONSTRAINT book_authors_book_id_fkey FOREIGN KEY (book_id) REFERENCES books (id) ON DELETE CASCADE;
+ALTER TABLE book_authors DROP CONSTRAINT IF EXISTS book_authors_author_id_fkey,
+    ADD CONSTRAINT book_authors_author_id_fkey FOREIGN KEY (author_id) REFERENCES authors (id) ON DELETE CASCADE;
+ALTER TABLE book_genres DROP CONSTRAINT IF EXISTS book_genres_book_id_fkey,
+    ADD CONSTRAINT book_genres_book_id_fkey FOREIGN KEY (book_id) REFERENCES books (id) ON DELETE CASCADE;
+ALTER TABLE book_genres DROP CONSTRAINT IF EXISTS book_genres_genre_id_fkey,
+    ADD CONSTRAINT book_genres_genre_id_fkey FOREIGN KEY (genre_id) REFERENCES genres (id) ON DELETE CASCADE;
+ALTER TABLE book_topics DROP CONSTRAINT IF EXISTS book_topics_book_id_fkey,
+    ADD CONSTRAINT book_topics_book_id_fkey FOREIGN KEY (book_id) REFERENCES books (id) ON DELETE CASCADE;
+ALTER TABLE book_topics DROP CONSTRAINT IF EXISTS book_topics_topic_id_fkey,
+    ADD CONSTRAINT book_topics_topic_id_fkey FOREIGN KEY (topic_id) REFERENCES topics (id) ON DELETE CASCADE;
+ALTER TABLE series_authors DROP CONSTRAINT IF EXISTS series_authors_series_id_fkey,
+    ADD CONSTRAINT series_authors_series_id_fkey FOREIGN KEY (series_id) REFERENCES series (id) ON DELETE CASCADE;
+ALTER TABLE series_authors DROP CONSTRAINT IF EXISTS series_authors_author_id_fkey,
+    ADD CONSTRAINT series_authors_author_id_fkey FOREIGN KEY (author_id) REFERENCES authors (id) ON DELETE CASCADE;
+ALTER TABLE recommended_book_genres DROP CONSTRAINT IF EXISTS recommended_book_genres_recommended_book_id_fkey,
+    ADD CONSTRAINT recommended_book_genres_recommended_book_id_fkey FOREIGN KEY (recommended_book_id) REFERENCES recommended_books (id) ON DELETE CASCADE;
+ALTER TABLE recommended_book_genres DROP CONSTRAINT IF EXISTS recommended_book_genres_genre_id_fkey,
+    ADD CONSTRAINT recommended_book_genres_genre_id_fkey FOREIGN KEY (genre_id) REFERENCES genres (id) ON DELETE CASCADE;
+ALTER TABLE recommended_book_topics DROP CONSTRAINT IF EXISTS recommended_book_topics_recommended_book_id_fkey,
+    ADD CONSTRAINT recommended_book_topics_recommended_book_id_fkey FOREIGN KEY (recommended_book_id) REFERENCES recommended_books (id) ON DELETE CASCADE;
+ALTER TABLE recommended_book_topics DROP CONSTRAINT IF EXISTS recommended_book_topics_topic_id_fkey,
+    ADD CONSTRAINT recommended_book_topics_topic_id_fkey FOREIGN KEY (topic_id) REFERENCES topics (id) ON DELETE CASCADE;
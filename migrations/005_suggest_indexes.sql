@@ -0,0 +1,22 @@
+-- Indexes for the type-ahead endpoints (/api/suggest/<entity>, suggest.py): lower()
+-- prefix indexes for names typed from the start, trigram indexes for substring and
+-- typo matches. The expressions must match SUGGEST_ENTITIES.
+
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+CREATE INDEX IF NOT EXISTS ix_authors_full_name_prefix ON authors (lower(first_name || ' ' || last_name) text_pattern_ops);
+CREATE INDEX IF NOT EXISTS ix_authors_last_name_prefix ON authors (lower(last_name) text_pattern_ops);
+CREATE INDEX IF NOT EXISTS ix_authors_full_name_trgm ON authors USING gin ((first_name || ' ' || last_name) gin_trgm_ops);
+
+CREATE INDEX IF NOT EXISTS ix_publishers_name_prefix ON publishers (lower(name) text_pattern_ops);
+CREATE INDEX IF NOT EXISTS ix_publishers_name_trgm ON publishers USING gin (name gin_trgm_ops);
+
+CREATE INDEX IF NOT EXISTS ix_series_name_prefix ON series (lower(name) text_pattern_ops);
+CREATE INDEX IF NOT EXISTS ix_series_name_trgm ON series USING gin (name gin_trgm_ops);
+
+-- ix_books_title_trgm comes from 001_book_search.sql
+CREATE INDEX IF NOT EXISTS ix_books_title_prefix ON books (lower(title) text_pattern_ops);
+
+ANALYZE authors;
+ANALYZE publishers;
+ANALYZE series;
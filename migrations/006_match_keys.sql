@@ -0,0 +1,14 @@
+-- Normalized match keys (matchkeys.py) for duplicate detection and for hiding owned
+-- books from the recommendations. They are computed in Python, so existing rows are
+-- filled by running `flask rebuild-match-keys` after this migration.
+
+ALTER TABLE books ADD COLUMN IF NOT EXISTS isbn_key varchar(13);
+ALTER TABLE books ADD COLUMN IF NOT EXISTS title_key varchar(16);
+ALTER TABLE authors ADD COLUMN IF NOT EXISTS name_key varchar(200);
+ALTER TABLE recommended_books ADD COLUMN IF NOT EXISTS isbn_key varchar(13);
+ALTER TABLE recommended_books ADD COLUMN IF NOT EXISTS title_key varchar(16);
+ALTER TABLE recommended_books ADD COLUMN IF NOT EXISTS author_key varchar(200);
+
+CREATE INDEX IF NOT EXISTS ix_books_isbn_key ON books (isbn_key);
+CREATE INDEX IF NOT EXISTS ix_books_title_key ON books (title_key);
+CREATE INDEX IF NOT EXISTS ix_authors_name_key ON authors (name_key);
@@ -0,0 +1,6 @@
+-- The created_at sort pages by (created_at, id), which skips rows whose created_at
+-- is NULL, and its cursors carry the value. Books without one get the time of the
+-- upgrade, and the column becomes NOT NULL to match models.py.
+
+UPDATE books SET created_at = now() WHERE created_at IS NULL;
+ALTER TABLE books ALTER COLUMN created_at SET NOT NULL;
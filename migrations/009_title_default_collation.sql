@@ -0,0 +1,13 @@
+-- Undoes 007_title_collation, which gave books.title the "C" collation and has been
+-- withdrawn: titles sort by the database's collation again. Only databases that ran
+-- it are altered; elsewhere the indexes on title would be rebuilt for nothing.
+
+DO $$
+BEGIN
+    IF EXISTS (SELECT 1 FROM information_schema.columns
+               WHERE table_schema = current_schema() AND table_name = 'books'
+                 AND column_name = 'title' AND collation_name = 'C') THEN
+        ALTER TABLE books ALTER COLUMN title TYPE varchar(300) COLLATE "default";
+    END IF;
+END
+$$;
@@ -1,31 +1,49 @@
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy.dialects.postgresql import TSVECTOR
+from sqlalchemy.orm import configure_mappers
 from datetime import datetime
+from matchkeys import match_key_default
+from replicas import RoutingSession
 
-db = SQLAlchemy()
+# Reads may go to a replica, see replicas.py
+db = SQLAlchemy(session_options={'class_': RoutingSession})
 
 book_authors = db.Table('book_authors',
-    db.Column('book_id', db.Integer, db.ForeignKey('books.id'), primary_key=True),
-    db.Column('author_id', db.Integer, db.ForeignKey('authors.id'), primary_key=True)
+    db.Column('book_id', db.Integer, db.ForeignKey('books.id', ondelete='CASCADE'), primary_key=True),
+    db.Column('author_id', db.Integer, db.ForeignKey('authors.id', ondelete='CASCADE'),
+              primary_key=True, index=True)
 )
 
 book_genres = db.Table('book_genres',
-    db.Column('book_id', db.Integer, db.ForeignKey('books.id'), primary_key=True),
-    db.Column('genre_id', db.Integer, db.ForeignKey('genres.id'), primary_key=True)
+    db.Column('book_id', db.Integer, db.ForeignKey('books.id', ondelete='CASCADE'), primary_key=True),
+    db.Column('genre_id', db.Integer, db.ForeignKey('genres.id', ondelete='CASCADE'),
+              primary_key=True, index=True)
 )
 
 book_topics = db.Table('book_topics',
-    db.Column('book_id', db.Integer, db.ForeignKey('books.id'), primary_key=True),
-    db.Column('topic_id', db.Integer, db.ForeignKey('topics.id'), primary_key=True)
+    db.Column('book_id', db.Integer, db.ForeignKey('books.id', ondelete='CASCADE'), primary_key=True),
+    db.Column('topic_id', db.Integer, db.ForeignKey('topics.id', ondelete='CASCADE'),
+              primary_key=True, index=True)
 )
 
 series_authors = db.Table('series_authors',
-    db.Column('series_id', db.Integer, db.ForeignKey('series.id'), primary_key=True),
-    db.Column('author_id', db.Integer, db.ForeignKey('authors.id'), primary_key=True)
+    db.Column('series_id', db.Integer, db.ForeignKey('series.id', ondelete='CASCADE'), primary_key=True),
+    db.Column('author_id', db.Integer, db.ForeignKey('authors.id', ondelete='CASCADE'),
+              primary_key=True, index=True)
 )
 
 recommended_book_genres = db.Table('recommended_book_genres',
-    db.Column('recommended_book_id', db.Integer, db.ForeignKey('recommended_books.id'), primary_key=True),
-    db.Column('genre_id', db.Integer, db.ForeignKey('genres.id'), primary_key=True)
+    db.Column('recommended_book_id', db.Integer, db.ForeignKey('recommended_books.id', ondelete='CASCADE'),
+              primary_key=True),
+    db.Column('genre_id', db.Integer, db.ForeignKey('genres.id', ondelete='CASCADE'),
+              primary_key=True, index=True)
+)
+
+recommended_book_topics = db.Table('recommended_book_topics',
+    db.Column('recommended_book_id', db.Integer, db.ForeignKey('recommended_books.id', ondelete='CASCADE'),
+              primary_key=True),
+    db.Column('topic_id', db.Integer, db.ForeignKey('topics.id', ondelete='CASCADE'),
+              primary_key=True, index=True)
 )
 
 
@@ -35,6 +53,8 @@ class Author(db.Model):
     first_name = db.Column(db.String(100), nullable=False)
     last_name = db.Column(db.String(100), nullable=False)
     biography = db.Column(db.Text)
+    # Normalized full name, see matchkeys.py
+    name_key = db.Column(db.String(200), index=True, default=match_key_default('authors', 'name_key'))
 
     def __repr__(self):
         return f'<Author {self.first_name} {self.last_name}>'
@@ -89,7 +109,8 @@ class Series(db.Model):
     description = db.Column(db.Text)
     total_books = db.Column(db.Integer)
     books = db.relationship('Book', backref='series', lazy=True)
-    authors = db.relationship('Author', secondary=series_authors, backref='series')
+    authors = db.relationship('Author', secondary=series_authors, passive_deletes=True,
+                              backref=db.backref('series', passive_deletes=True))
 
     def __repr__(self):
         return f'<Series {self.name}>'
@@ -97,14 +118,30 @@ class Series(db.Model):
 
 class Book(db.Model):
     __tablename__ = 'books'
+    # Keyset pagination orders by (sort key, id), optionally filtered by status;
+    # the coalesce() expressions must match the sort keys in pagination.py
+    __table_args__ = (
+        db.Index('ix_books_title_id', 'title', 'id'),
+        db.Index('ix_books_created_at_id', 'created_at', 'id'),
+        db.Index('ix_books_rating_sort', db.text('coalesce(rating, -1.0)'), 'id'),
+        db.Index('ix_books_year_sort', db.text('coalesce(publication_year, -100000)'), 'id'),
+        db.Index('ix_books_status_title_id', 'reading_status', 'title', 'id'),
+        db.Index('ix_books_status_created_at_id', 'reading_status', 'created_at', 'id'),
+        db.Index('ix_books_completed', 'id',
+                 postgresql_where=db.text("reading_status = 'completed'"),
+                 sqlite_where=db.text("reading_status = 'completed'")),
+    )
     id = db.Column(db.Integer, primary_key=True)
 
     title = db.Column(db.String(300), nullable=False)
-    isbn = db.Column(db.String(13))
+    isbn = db.Column(db.String(13), index=True)
     publication_year = db.Column(db.Integer)
     pages = db.Column(db.Integer)
     language = db.Column(db.String(50))
     description = db.Column(db.Text)
+    # Canonical ISBN-13 and normalized title hash for duplicate detection, see matchkeys.py
+    isbn_key = db.Column(db.String(13), index=True, default=match_key_default('books', 'isbn_key'))
+    title_key = db.Column(db.String(16), index=True, default=match_key_default('books', 'title_key'))
 
     reading_status = db.Column(db.String(20), default='unread')  # unread, reading, completed
     current_page = db.Column(db.Integer, default=0)
@@ -113,16 +150,25 @@ class Book(db.Model):
     date_started = db.Column(db.Date)
     date_completed = db.Column(db.Date)
 
-    publisher_id = db.Column(db.Integer, db.ForeignKey('publishers.id'), nullable=False)
-    series_id = db.Column(db.Integer, db.ForeignKey('series.id'))
+    publisher_id = db.Column(db.Integer, db.ForeignKey('publishers.id'), nullable=False, index=True)
+    series_id = db.Column(db.Integer, db.ForeignKey('series.id'), index=True)
     series_position = db.Column(db.Integer)
-    category_id = db.Column(db.Integer, db.ForeignKey('categories.id'))
+    category_id = db.Column(db.Integer, db.ForeignKey('categories.id'), index=True)
 
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    # NOT NULL: the created_at sort's keyset and cursors need a value on every book
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    # Maintained by database triggers, see migrations/001_book_search.sql
+    search_vector = db.deferred(db.Column(db.Text().with_variant(TSVECTOR(), 'postgresql')))
 
-    authors = db.relationship('Author', secondary=book_authors, backref='books')
-    genres = db.relationship('Genre', secondary=book_genres, backref='books')
-    topics = db.relationship('Topic', secondary=book_topics, backref='books')
+    # The link rows go with either side through ON DELETE CASCADE, so deletes don't
+    # load the collections to remove them one by one
+    authors = db.relationship('Author', secondary=book_authors, passive_deletes=True,
+                              backref=db.backref('books', passive_deletes=True))
+    genres = db.relationship('Genre', secondary=book_genres, passive_deletes=True,
+                             backref=db.backref('books', passive_deletes=True))
+    topics = db.relationship('Topic', secondary=book_topics, passive_deletes=True,
+                             backref=db.backref('books', passive_deletes=True))
 
     def __repr__(self):
         return f'<Book {self.title}>'
@@ -139,9 +185,101 @@ class RecommendedBook(db.Model):
     pages = db.Column(db.Integer)
     language = db.Column(db.String(50), default='English')
     description = db.Column(db.Text)
-    average_rating = db.Column(db.Float)
+    average_rating = db.Column(db.Float, index=True)
+    # Looked up in the books' key indexes to leave owned books out of recommendations,
+    # see matchkeys.py
+    isbn_key = db.Column(db.String(13), default=match_key_default('recommended_books', 'isbn_key'))
+    title_key = db.Column(db.String(16), default=match_key_default('recommended_books', 'title_key'))
+    author_key = db.Column(db.String(200), default=match_key_default('recommended_books', 'author_key'))
 
     genres = db.relationship('Genre', secondary=recommended_book_genres, backref='recommended_books')
+    topics = db.relationship('Topic', secondary=recommended_book_topics, backref='recommended_books')
 
     def __repr__(self):
         return f'<RecommendedBook {self.title}>'
+
+
+class ReaderAffinity(db.Model):
+    # Reader profile: summed book weights per genre/topic/author, see recommendations.py
+    __tablename__ = 'reader_affinity'
+    __table_args__ = (db.Index('ix_reader_affinity_kind_weight', 'kind', 'weight'),)
+    kind = db.Column(db.String(10), primary_key=True)  # genre, topic, author
+    ref_id = db.Column(db.Integer, primary_key=True)
+    weight = db.Column(db.Float, nullable=False, default=0)
+
+    def __repr__(self):
+        return f'<ReaderAffinity {self.kind} {self.ref_id}={self.weight}>'
+
+
+class RecommendationScore(db.Model):
+    # Candidate scores, recomputed by a refresh_recommendations job that writes queue when
+    # the profile or the candidate catalogue changes; reads rank by them, see recommendations.py
+    __tablename__ = 'recommendation_scores'
+    recommended_book_id = db.Column(db.Integer, db.ForeignKey('recommended_books.id', ondelete='CASCADE'),
+                                    primary_key=True)
+    score = db.Column(db.Float, nullable=False, index=True)
+
+    recommended_book = db.relationship('RecommendedBook')
+
+    def __repr__(self):
+        return f'<RecommendationScore {self.recommended_book_id}={self.score}>'
+
+
+class SchemaMigration(db.Model):
+    __tablename__ = 'schema_migrations'
+    version = db.Column(db.String(100), primary_key=True)
+    applied_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<SchemaMigration {self.version}>'
+
+
+class LibraryCounter(db.Model):
+    # Precomputed library statistics, see stats.py
+    __tablename__ = 'library_counters'
+    key = db.Column(db.String(150), primary_key=True)
+    value = db.Column(db.Float, nullable=False, default=0)
+
+    def __repr__(self):
+        return f'<LibraryCounter {self.key}={self.value}>'
+
+
+class TableVersion(db.Model):
+    # Bumped on every write to a table; backs the HTTP ETags, see caching.py
+    __tablename__ = 'table_versions'
+    name = db.Column(db.String(100), primary_key=True)
+    version = db.Column(db.Integer, nullable=False)
+
+    def __repr__(self):
+        return f'<TableVersion {self.name}={self.version}>'
+
+
+class Job(db.Model):
+    # Background work queue, see jobs.py
+    __tablename__ = 'jobs'
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(50), nullable=False)
+    params = db.Column(db.Text, nullable=False, default='{}')  # JSON
+    status = db.Column(db.String(20), nullable=False, default='queued')  # queued, running, done, failed
+    progress = db.Column(db.Integer, nullable=False, default=0)
+    total = db.Column(db.Integer)
+    error = db.Column(db.Text)
+    artifact = db.Column(db.String(300))  # file name in the job folder
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime)
+    heartbeat_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+
+    __table_args__ = (
+        # Workers claim the oldest waiting or abandoned job
+        db.Index('ix_jobs_pending', 'id', postgresql_where=db.text("status IN ('queued', 'running')")),
+    )
+
+    def __repr__(self):
+        return f'<Job {self.id} {self.kind} {self.status}>'
+
+
+# Create the backref attributes (Book.publisher, Book.series, ...) now; the query
+# builders in serializers.py reference them before the first query would.
+configure_mappers()
@@ -0,0 +1,108 @@
+import base64
+import json
+from datetime import datetime
+from sqlalchemy import func, literal, literal_column, tuple_
+from models import Book
+
+DEFAULT_LIMIT = 50
+MAX_LIMIT = 200
+
+# sort name -> (SQL sort key, value of that key for a loaded Book, attributes the key needs)
+# Nullable columns are coalesced so (key, id) is always comparable for the keyset; the
+# sentinels are inlined so the expressions match the books indexes in models.py.
+SORTS = {
+    'title': (Book.title, lambda b: b.title, ('title',)),
+    'created_at': (Book.created_at, lambda b: b.created_at.isoformat(), ('created_at',)),
+    'rating': (func.coalesce(Book.rating, literal_column('-1.0')),
+               lambda b: b.rating if b.rating is not None else -1.0, ('rating',)),
+    'publication_year': (func.coalesce(Book.publication_year, literal_column('-100000')),
+                         lambda b: b.publication_year if b.publication_year is not None else -100000,
+                         ('publication_year',)),
+}
+DEFAULT_SORT = 'title'
+# Only available on searches, where the key is the search rank
+RELEVANCE = 'relevance'
+
+
+class PaginationError(ValueError):
+    pass
+
+
+def parse_sort(value):
+    value = value or DEFAULT_SORT
+    descending = value.startswith('-')
+    name = value.lstrip('-')
+    if name not in SORTS and name != RELEVANCE:
+        raise PaginationError(f'Unknown sort: {name}')
+    return name, descending
+
+
+def parse_limit(value):
+    if value in (None, ''):
+        return DEFAULT_LIMIT
+    try:
+        limit = int(value)
+    except ValueError:
+        raise PaginationError('limit must be an integer')
+    if limit < 1:
+        raise PaginationError('limit must be positive')
+    return min(limit, MAX_LIMIT)
+
+
+def encode_cursor(sort, value, id):
+    raw = json.dumps({'s': sort, 'v': value, 'id': id}, separators=(',', ':'))
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor, sort):
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        data = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+        value, id = data['v'], int(data['id'])
+        if data.get('s') == sort and sort.lstrip('-') == 'created_at':
+            value = datetime.fromisoformat(value)
+    except (ValueError, KeyError, TypeError):
+        raise PaginationError('Invalid cursor')
+    if data.get('s') != sort:
+        raise PaginationError('Cursor does not match sort order')
+    return value, id
+
+
+def sort_columns(sort):
+    name = sort.lstrip('-')
+    return SORTS[name][2] if name in SORTS else ()
+
+
+def paginate(query, sort=None, cursor=None, limit=None, rank=None):
+    if rank is not None and not sort:
+        sort = f'-{RELEVANCE}'
+    name, descending = parse_sort(sort)
+    limit = parse_limit(limit)
+    cursor_name = f'-{name}' if descending else name
+
+    if name == RELEVANCE:
+        if rank is None:
+            raise PaginationError('relevance sort requires a search')
+        key = rank
+        query = query.add_columns(rank.label(RELEVANCE))
+        key_value = lambda row: getattr(row, RELEVANCE)
+    else:
+        key, key_value, _ = SORTS[name]
+
+    if cursor:
+        value, last_id = decode_cursor(cursor, cursor_name)
+        position = tuple_(key, Book.id)
+        last = tuple_(literal(value, key.type), literal(last_id, Book.id.type))
+        query = query.filter(position < last if descending else position > last)
+
+    if descending:
+        query = query.order_by(key.desc(), Book.id.desc())
+    else:
+        query = query.order_by(key.asc(), Book.id.asc())
+
+    rows = query.limit(limit + 1).all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    books = [row[0] for row in rows] if name == RELEVANCE else rows
+    next_cursor = encode_cursor(cursor_name, key_value(rows[-1]), books[-1].id) if has_more else None
+    return books, next_cursor, has_more
@@ -0,0 +1,40 @@
+import os
+from sqlalchemy.engine import make_url
+
+
+def env_int(name, default):
+    value = os.getenv(name)
+    return int(value) if value not in (None, '') else default
+
+
+def env_flag(name, default):
+    value = os.getenv(name)
+    return value.strip().lower() not in ('0', 'false', 'no', 'off') if value not in (None, '') else default
+
+
+# SQLALCHEMY_ENGINE_OPTIONS from .env. The pool is per process: each gunicorn worker
+# holds up to DB_POOL_SIZE + DB_MAX_OVERFLOW connections, which should cover its
+# WEB_THREADS, and workers x that total must fit in PostgreSQL's max_connections.
+def engine_options(database_url):
+    options = {
+        # Test connections on checkout so a restarted database or a dropped idle
+        # connection costs a reconnect instead of a failed request
+        'pool_pre_ping': env_flag('DB_POOL_PRE_PING', True),
+        'pool_recycle': env_int('DB_POOL_RECYCLE', 1800),
+    }
+    backend = make_url(database_url).get_backend_name()
+    if backend == 'sqlite':
+        return options
+    options.update(
+        pool_size=env_int('DB_POOL_SIZE', 5),
+        max_overflow=env_int('DB_MAX_OVERFLOW', 5),
+        pool_timeout=env_int('DB_POOL_TIMEOUT', 10),
+    )
+    statement_timeout = env_int('DB_STATEMENT_TIMEOUT_MS', 0)
+    if backend == 'postgresql' and statement_timeout:
+        options['connect_args'] = {'options': f'-c statement_timeout={statement_timeout}'}
+    return options
+
+
+def pool_capacity(options):
+    return options.get('pool_size', 0) + options.get('max_overflow', 0)
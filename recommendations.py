@@ -0,0 +1,245 @@
+import math
+from collections import Counter, defaultdict
+from datetime import datetime
+from sqlalchemy import delete, exists, func, literal, select
+from async_queries import run_queries
+from changes import on_book_changes, on_tables_changed, load_book_states, publish
+from models import (db, Author, Book, Genre, Job, RecommendedBook, ReaderAffinity, RecommendationScore,
+                    book_authors, recommended_book_genres, recommended_book_topics)
+from replicas import read_from_primary
+from serializers import recommendations_query, serialize_recommendation
+from sqlhelpers import upsert_add
+
+RECOMMENDATION_LIMIT = 3
+FAVORITE_GENRES = 3
+PROFILE_KINDS = {'genre': 'genre_ids', 'topic': 'topic_ids', 'author': 'author_ids'}
+# A candidate's score: its similarity to the profile for each kind plus its average
+# rating, weighted. With an empty profile this reduces to "top rated".
+SCORE_WEIGHTS = {'genre': 0.5, 'topic': 0.2, 'author': 0.15, 'rating': 0.15}
+# Job kind (jobs.py) that recomputes the scores after the profile or the candidates change
+REFRESH_JOB = 'refresh_recommendations'
+# Tables whose changes make cached scores stale even if the profile didn't move
+CANDIDATE_TABLES = {'recommended_books', 'recommended_book_genres', 'recommended_book_topics',
+                    'genres', 'topics', 'authors'}
+REBUILD_BATCH = 5000
+# Top-scored candidates read per recommendation when leaving out owned books; when
+# more of them than that are owned the whole ranking is read
+OWNED_WINDOW = 10
+
+
+def book_weight(state):
+    # How much a book says about the reader's taste: finished books count fully,
+    # scaled by rating (5 stars -> 2, 3 -> 1, 1 -> 0); books in progress count half
+    if state is None:
+        return 0.0
+    if state['reading_status'] == 'completed':
+        rating = state['rating']
+        return 1.0 if rating is None else max(0.0, 1.0 + (rating - 3) / 2)
+    if state['reading_status'] == 'reading':
+        return 0.5
+    return 0.0
+
+
+def contribution(state):
+    weight = book_weight(state)
+    if not weight:
+        return Counter()
+    return Counter({(kind, ref_id): weight
+                    for kind, key in PROFILE_KINDS.items() for ref_id in state[key]})
+
+
+def request_refresh(connection):
+    # The scores are recomputed by a job; until it runs, reads keep ranking by the old
+    # ones. One waiting job covers any number of writes.
+    table = Job.__table__
+    waiting = select(table.c.id).where(table.c.kind == REFRESH_JOB, table.c.status == 'queued')
+    connection.execute(table.insert().from_select(
+        ['kind', 'params', 'status', 'progress', 'attempts', 'created_at'],
+        select(literal(REFRESH_JOB), literal('{}'), literal('queued'), literal(0), literal(0),
+               literal(datetime.utcnow(), table.c.created_at.type))
+        .where(~waiting.exists())))
+
+
+def apply_delta(connection, delta):
+    table = ReaderAffinity.__table__
+    # In (kind, ref_id) order, so concurrent profile updates lock the rows in the same
+    # order instead of deadlocking on each other
+    upsert_add(connection, table, ['kind', 'ref_id'],
+               [{'kind': kind, 'ref_id': ref_id, 'weight': delta[kind, ref_id]} for kind, ref_id in sorted(delta)],
+               'weight')
+    connection.execute(delete(table).where(table.c.weight < 1e-9))
+
+
+@on_book_changes
+def update_profile(connection, changes):
+    delta = Counter()
+    for old, new in changes:
+        delta.update(contribution(new))
+        delta.subtract(contribution(old))
+    delta = {key: w for key, w in delta.items() if abs(w) > 1e-9}
+    if delta:
+        apply_delta(connection, delta)
+        request_refresh(connection)
+
+
+@on_tables_changed
+def candidates_changed(connection, tables):
+    if tables & CANDIDATE_TABLES:
+        request_refresh(connection)
+
+
+# Recomputes the profile and the scores; for `flask rebuild-recommendations` and jobs
+def rebuild_profile():
+    connection = db.session.connection()
+    connection.execute(delete(ReaderAffinity.__table__))
+    ids = db.session.execute(select(Book.id).where(Book.reading_status.in_(('completed', 'reading')))
+                             .order_by(Book.id)).scalars().all()
+    profile = Counter()
+    for start in range(0, len(ids), REBUILD_BATCH):
+        for state in load_book_states(connection, ids[start:start + REBUILD_BATCH]).values():
+            profile.update(contribution(state))
+    if profile:
+        apply_delta(connection, profile)
+    db.session.commit()
+    refresh_scores()
+    return len(ids)
+
+
+def load_profile():
+    profile = defaultdict(dict)
+    for kind, ref_id, weight in db.session.execute(
+            select(ReaderAffinity.kind, ReaderAffinity.ref_id, ReaderAffinity.weight)):
+        profile[kind][ref_id] = weight
+    return profile
+
+
+def cosine(ids, weights, norm):
+    # Similarity between a candidate's (unweighted) set of ids and the weighted profile
+    if not ids or not norm:
+        return 0.0
+    return sum(weights.get(i, 0.0) for i in ids) / (norm * math.sqrt(len(ids)))
+
+
+def links_by_candidate(table, column):
+    grouped = defaultdict(list)
+    for rec_id, ref_id in db.session.execute(select(table.c.recommended_book_id, table.c[column])):
+        grouped[rec_id].append(ref_id)
+    return grouped
+
+
+def compute_scores():
+    profile = load_profile()
+    norms = {kind: math.sqrt(sum(w * w for w in profile[kind].values())) for kind in PROFILE_KINDS}
+    genres = links_by_candidate(recommended_book_genres, 'genre_id')
+    topics = links_by_candidate(recommended_book_topics, 'topic_id')
+
+    # Candidates only carry an author name, so match it against the profile's authors
+    author_weights = {}
+    if profile['author']:
+        for id, first, last in db.session.execute(select(Author.id, Author.first_name, Author.last_name)
+                                                  .where(Author.id.in_(profile['author']))):
+            author_weights[f'{first} {last}'.lower()] = profile['author'][id]
+    top_author = max(author_weights.values(), default=0.0)
+
+    scores = {}
+    for id, author_name, rating in db.session.execute(
+            select(RecommendedBook.id, RecommendedBook.author_name, RecommendedBook.average_rating)):
+        name = (author_name or '').lower()
+        author = max((w for a, w in author_weights.items() if a in name), default=0.0)
+        scores[id] = (SCORE_WEIGHTS['genre'] * cosine(genres[id], profile['genre'], norms['genre'])
+                      + SCORE_WEIGHTS['topic'] * cosine(topics[id], profile['topic'], norms['topic'])
+                      + SCORE_WEIGHTS['author'] * (author / top_author if top_author else 0.0)
+                      + SCORE_WEIGHTS['rating'] * (rating or 0.0) / 5)
+    return scores
+
+
+# Run by the refresh job, never by a request: it reads every candidate
+def refresh_scores():
+    read_from_primary()
+    scores = compute_scores()
+    connection = db.session.connection()
+    table = RecommendationScore.__table__
+    connection.execute(delete(table))
+    if scores:
+        connection.execute(table.insert(), [{'recommended_book_id': id, 'score': score}
+                                            for id, score in scores.items()])
+    # New scores change the recommendations' ETag
+    publish(connection, tables=[table.name])
+    db.session.commit()
+    return len(scores)
+
+
+def scores_built():
+    # Every candidate gets a score, so any score (or no candidates) means they were computed
+    return db.session.execute(select(exists(select(RecommendationScore.recommended_book_id))
+                                     | ~exists(select(RecommendedBook.id)))).scalar()
+
+
+def owned_condition():
+    # A candidate the reader already has: a book with its ISBN, or with its title and
+    # author. Both are probes of the books' key indexes (matchkeys.py), so the scores
+    # stay cached for every candidate and owned ones drop out as they are read.
+    same_isbn = exists().where(Book.isbn_key == RecommendedBook.isbn_key)
+    same_title_author = (exists().where(Book.title_key == RecommendedBook.title_key)
+                         .where(book_authors.c.book_id == Book.id, Author.id == book_authors.c.author_id,
+                                Author.name_key == RecommendedBook.author_key))
+    return same_isbn | same_title_author
+
+
+def recommend_query(limit=RECOMMENDATION_LIMIT, window=RECOMMENDATION_LIMIT * OWNED_WINDOW):
+    # The LIMIT of the ranked subquery keeps the planner from checking every candidate
+    # for ownership before it sorts
+    ranked = select(RecommendationScore.recommended_book_id.label('id'), RecommendationScore.score) \
+        .order_by(RecommendationScore.score.desc(), RecommendationScore.recommended_book_id)
+    if window is not None:
+        ranked = ranked.limit(window)
+    ranked = ranked.subquery()
+    return recommendations_query().join(ranked, ranked.c.id == RecommendedBook.id) \
+        .filter(~owned_condition()).order_by(ranked.c.score.desc(), RecommendedBook.id).limit(limit)
+
+
+def top_rated_query(limit=RECOMMENDATION_LIMIT):
+    return recommendations_query().filter(~owned_condition()) \
+        .order_by(RecommendedBook.average_rating.desc().nulls_last(), RecommendedBook.id).limit(limit)
+
+
+def recommend(limit=RECOMMENDATION_LIMIT, recommendations=None):
+    query = recommend_query(limit)
+    if recommendations is None:
+        recommendations = query.all()
+    if len(recommendations) < limit:
+        recommendations = recommend_query(limit, window=None).all()
+    # Before the first refresh job has run (fresh install) there is nothing to rank by
+    if not recommendations and not db.session.execute(select(exists(select(RecommendationScore.score)))).scalar():
+        recommendations = top_rated_query(limit).all()
+    return recommendations
+
+
+def favorite_genres_select(limit=FAVORITE_GENRES):
+    return (select(Genre.name)
+            .join(ReaderAffinity, (ReaderAffinity.kind == 'genre') & (ReaderAffinity.ref_id == Genre.id))
+            .order_by(ReaderAffinity.weight.desc(), Genre.id).limit(limit))
+
+
+def completed_count_select():
+    return select(func.count()).select_from(Book).where(Book.reading_status == 'completed')
+
+
+def recommendations_summary_queries():
+    return [(completed_count_select(), 'scalar'),
+            (favorite_genres_select(), 'scalars'),
+            (recommend_query().statement, 'scalars')]
+
+
+def build_recommendations_summary(completed, genres, recommendations):
+    return {
+        'user_reading_stats': {
+            'completed_books': completed,
+            'favorite_genres': genres
+        },
+        'recommendations': [serialize_recommendation(rec) for rec in recommend(recommendations=recommendations)]
+    }
+
+
+def recommendations_summary():
+    return build_recommendations_summary(*run_queries(*recommendations_summary_queries()))
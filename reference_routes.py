@@ -0,0 +1,129 @@
+from flask import Blueprint, request, jsonify
+from models import db, Author, Publisher, Series, Genre, Topic, Category
+from caching import cached_get, REFERENCE_TABLES
+from references import reference_rows
+from catalogue import current_catalogue
+from deletes import DeleteError, delete_reference
+
+bp = Blueprint('references', __name__)
+
+
+def reference_list(kind):
+    catalogue = current_catalogue()
+    return catalogue.reference_lists([kind])[kind] if catalogue else reference_rows(kind)
+
+
+def reference_deleted(model, id):
+    try:
+        if not delete_reference(model, id):
+            return jsonify({'error': f'{model.__name__} not found'}), 404
+    except DeleteError as e:
+        return jsonify({'error': str(e)}), 409
+    db.session.commit()
+    return '', 204
+
+
+@bp.route('/api/authors', methods=['GET', 'POST'])
+@cached_get(*REFERENCE_TABLES['authors'])
+def authors():
+    if request.method == 'GET':
+        return jsonify(reference_list('authors'))
+    else:
+        data = request.json
+        author = Author(first_name=data['first_name'], last_name=data['last_name'], biography=data.get('biography'))
+        db.session.add(author)
+        db.session.commit()
+        return jsonify({'id': author.id}), 201
+
+
+@bp.route('/api/authors/<int:id>', methods=['PUT', 'DELETE'])
+def author(id):
+    author = Author.query.get_or_404(id)
+    if request.method == 'PUT':
+        data = request.json
+        author.first_name = data.get('first_name', author.first_name)
+        author.last_name = data.get('last_name', author.last_name)
+        author.biography = data.get('biography', author.biography)
+        db.session.commit()
+        return jsonify({'message': 'Author updated'})
+    else:
+        return reference_deleted(Author, id)
+
+
+@bp.route('/api/publishers', methods=['GET', 'POST'])
+@cached_get(*REFERENCE_TABLES['publishers'])
+def publishers():
+    if request.method == 'GET':
+        return jsonify(reference_list('publishers'))
+    else:
+        data = request.json
+        pub = Publisher(name=data['name'], country=data.get('country'))
+        db.session.add(pub)
+        db.session.commit()
+        return jsonify({'id': pub.id}), 201
+
+
+@bp.route('/api/publishers/<int:id>', methods=['DELETE'])
+def delete_publisher(id):
+    return reference_deleted(Publisher, id)
+
+
+@bp.route('/api/genres', methods=['GET', 'POST'])
+@cached_get(*REFERENCE_TABLES['genres'])
+def genres():
+    if request.method == 'GET':
+        return jsonify(reference_list('genres'))
+    else:
+        genre = Genre(name=request.json['name'], description=request.json.get('description'))
+        db.session.add(genre)
+        db.session.commit()
+        return jsonify({'id': genre.id}), 201
+
+
+@bp.route('/api/genres/<int:id>', methods=['DELETE'])
+def delete_genre(id):
+    return reference_deleted(Genre, id)
+
+
+@bp.route('/api/topics', methods=['GET', 'POST'])
+@cached_get(*REFERENCE_TABLES['topics'])
+def topics():
+    if request.method == 'GET':
+        return jsonify(reference_list('topics'))
+    else:
+        topic = Topic(name=request.json['name'], description=request.json.get('description'))
+        db.session.add(topic)
+        db.session.commit()
+        return jsonify({'id': topic.id}), 201
+
+
+@bp.route('/api/topics/<int:id>', methods=['DELETE'])
+def delete_topic(id):
+    return reference_deleted(Topic, id)
+
+
+@bp.route('/api/categories', methods=['GET', 'POST'])
+@cached_get(*REFERENCE_TABLES['categories'])
+def categories():
+    if request.method == 'GET':
+        return jsonify(reference_list('categories'))
+    else:
+        category = Category(name=request.json['name'], description=request.json.get('description'))
+        db.session.add(category)
+        db.session.commit()
+        return jsonify({'id': category.id}), 201
+
+
+@bp.route('/api/series', methods=['GET', 'POST'])
+@cached_get(*REFERENCE_TABLES['series'])
+def series():
+    if request.method == 'GET':
+        return jsonify(reference_list('series'))
+    else:
+        data = request.json
+        ser = Series(name=data['name'], description=data.get('description'), total_books=data.get('total_books'))
+        if 'author_ids' in data:
+            ser.authors = Author.query.filter(Author.id.in_(data['author_ids'])).all()
+        db.session.add(ser)
+        db.session.commit()
+        return jsonify({'id': ser.id}), 201
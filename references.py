@@ -0,0 +1,57 @@
+from sqlalchemy import String, cast, literal, select, union_all
+from models import db, Author, Publisher, Genre, Topic, Category, Series
+from serializers import serialize_author, serialize_ref
+
+REFERENCE_MODELS = {
+    'authors': Author,
+    'publishers': Publisher,
+    'genres': Genre,
+    'topics': Topic,
+    'categories': Category,
+    'series': Series,
+}
+# Union of the columns the lists need; models without one select NULL
+REFERENCE_COLUMNS = ('name', 'first_name', 'last_name', 'country')
+REFERENCE_SERIALIZERS = {
+    'authors': serialize_author,
+    'publishers': lambda p: {'id': p.id, 'name': p.name, 'country': p.country},
+}
+
+
+def reference_select(kind):
+    model = REFERENCE_MODELS[kind]
+    columns = [getattr(model, c) if hasattr(model, c) else cast(None, String) for c in REFERENCE_COLUMNS]
+    return select(literal(kind).label('kind'), model.id,
+                     *[c.label(name) for c, name in zip(columns, REFERENCE_COLUMNS)])
+
+
+def reference_lists_query(kinds):
+    return union_all(*[reference_select(kind) for kind in kinds])
+
+
+def build_reference_lists(kinds, rows):
+    lists = {kind: [] for kind in kinds}
+    for row in sorted(rows, key=lambda r: r.id):
+        lists[row.kind].append(REFERENCE_SERIALIZERS.get(row.kind, serialize_ref)(row))
+    return lists
+
+
+def reference_rows(kind):
+    # One list as rows labeled like its serialized objects; the JSON provider
+    # encodes them directly
+    model = REFERENCE_MODELS[kind]
+    if kind == 'authors':
+        columns = (model.id, model.first_name, model.last_name,
+                   (model.first_name + ' ' + model.last_name).label('full_name'))
+    elif kind == 'publishers':
+        columns = (model.id, model.name, model.country)
+    else:
+        columns = (model.id, model.name)
+    return db.session.execute(select(*columns).order_by(model.id)).all()
+
+
+def reference_lists(kinds):
+    # kind -> serialized list for any of REFERENCE_MODELS, read with a single query
+    if not kinds:
+        return {}
+    return build_reference_lists(kinds, db.session.execute(reference_lists_query(kinds)).all())
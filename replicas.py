@@ -0,0 +1,193 @@
+import itertools
+import threading
+import time
+from contextlib import contextmanager
+from flask import current_app, g, jsonify, request
+from flask_sqlalchemy.session import Session
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import DBAPIError, OperationalError
+from sqlalchemy.sql.dml import UpdateBase
+from sqlalchemy.sql.elements import TextClause
+from pooling import engine_options
+
+# Requests that may read from a replica; anything else runs on the primary
+READ_METHODS = ('GET', 'HEAD')
+# Set on a client that wrote, so its reads stay on the primary until the replicas have
+# caught up with the write (the value is when it may go back to them)
+STICKY_COOKIE = 'db_primary_until'
+# Replay lag of a streaming replica in seconds; 0 on a server that isn't one
+LAG_QUERY = text(
+    "SELECT CASE WHEN NOT pg_is_in_recovery() OR pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+    "ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0) END"
+)
+
+router = None
+
+
+def replica_options(url, connect_timeout):
+    options = engine_options(url)
+    if make_url(url).get_backend_name() == 'postgresql':
+        # A replica that doesn't answer should cost a request seconds, not the TCP timeout
+        options['connect_args'] = dict(options.get('connect_args', {}), connect_timeout=connect_timeout)
+    return options
+
+
+class Replica:
+    def __init__(self, url, connect_timeout):
+        self.url = url
+        self.connect_timeout = connect_timeout
+        self.name = make_url(url).render_as_string(hide_password=True)
+        self._engine = None
+        self.healthy = True
+        self.lag = 0.0
+        self.checked_at = None
+        self.checking = threading.Lock()
+
+    @property
+    def engine(self):
+        # Created by the first check, in the worker that serves the reads
+        if self._engine is None:
+            self._engine = create_engine(self.url, **replica_options(self.url, self.connect_timeout))
+        return self._engine
+
+
+class ReplicaRouter:
+    # Picks the replica for a request, round robin over the healthy ones. A replica is
+    # checked (reachable, replay lag under max_lag) at most every check_seconds, by
+    # whichever request needs it first, and right away when a read on it fails;
+    # with no healthy replica the reads fall back to the primary.
+    def __init__(self, urls, max_lag, check_seconds, connect_timeout):
+        self.replicas = [Replica(url, connect_timeout) for url in urls]
+        self.max_lag = max_lag
+        self.check_seconds = check_seconds
+        self.turn = itertools.count()
+
+    def check(self, replica):
+        try:
+            with replica.engine.connect() as connection:
+                if connection.dialect.name == 'postgresql':
+                    replica.lag = float(connection.execute(LAG_QUERY).scalar())
+                else:
+                    connection.execute(text('SELECT 1'))
+                    replica.lag = 0.0
+            healthy, reason = replica.lag <= self.max_lag, f'{replica.lag:.1f} s behind the primary'
+        except DBAPIError as e:
+            healthy, reason = False, str(e.orig).strip() or type(e.orig).__name__
+        if healthy != replica.healthy:
+            current_app.logger.warning(f'Read replica {replica.name} is back' if healthy else
+                                       f'Read replica {replica.name} is out of rotation: {reason}')
+        replica.healthy = healthy
+        replica.checked_at = time.monotonic()
+        return healthy
+
+    def due(self, replica):
+        return replica.checked_at is None or time.monotonic() - replica.checked_at >= self.check_seconds
+
+    def pick(self):
+        start = next(self.turn)
+        for i in range(len(self.replicas)):
+            replica = self.replicas[(start + i) % len(self.replicas)]
+            # Another thread checking it answers with its last known state
+            if self.due(replica) and replica.checking.acquire(blocking=False):
+                try:
+                    self.check(replica)
+                finally:
+                    replica.checking.release()
+            if replica.healthy:
+                return replica
+        return None
+
+    def dispose(self, close=True):
+        for replica in self.replicas:
+            if replica._engine is not None:
+                replica._engine.dispose(close=close)
+
+
+class RoutingSession(Session):
+    # db.session: statements go to the replica chosen for the current request or job
+    # (g.db_replica) if they only read. Flushes, DML, raw SQL and connection(), which
+    # the bulk write paths use, go to the primary, and so does the rest of the request.
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        replica = g.get('db_replica') if g else None
+        if replica is not None and bind is None:
+            if not self._flushing and not isinstance(clause, (UpdateBase, TextClause)):
+                return replica.engine
+            g.db_replica = None
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+    def connection(self, *args, **kwargs):
+        read_from_primary()
+        return super().connection(*args, **kwargs)
+
+
+@event.listens_for(RoutingSession, 'after_commit')
+def remember_write(session):
+    if g:
+        g.db_wrote = True
+
+
+def current_replica():
+    return g.get('db_replica') if g else None
+
+
+@contextmanager
+def replica_reads():
+    # For work outside a GET request that only reads, like export jobs
+    previous = g.get('db_replica')
+    g.db_replica = router.pick() if router is not None else None
+    try:
+        yield
+    finally:
+        g.db_replica = previous
+
+
+def read_from_primary():
+    # For the rest of the request or job: before reads whose results are written back
+    # (derived data) or checked against state the primary already has, which a lagging
+    # replica would make stale
+    if g:
+        g.db_replica = None
+
+
+def sticky():
+    try:
+        return float(request.cookies.get(STICKY_COOKIE, 0)) > time.time()
+    except ValueError:
+        return False
+
+
+def init_replicas(app):
+    global router
+    router = None
+    urls = app.config.get('DATABASE_REPLICA_URLS')
+    if not urls:
+        return
+    config = app.config
+    router = ReplicaRouter(urls, config['DB_REPLICA_MAX_LAG'], config['DB_REPLICA_CHECK_SECONDS'],
+                           config['DB_REPLICA_CONNECT_TIMEOUT'])
+    sticky_seconds = config['DB_REPLICA_STICKY_SECONDS']
+
+    @app.before_request
+    def route_reads():
+        if request.method in READ_METHODS and not sticky():
+            g.db_replica = router.pick()
+
+    @app.after_request
+    def stick_to_primary(response):
+        if g.get('db_wrote') and sticky_seconds:
+            response.set_cookie(STICKY_COOKIE, f'{time.time() + sticky_seconds:.3f}', max_age=sticky_seconds,
+                                httponly=True, samesite='Lax')
+        return response
+
+    @app.errorhandler(OperationalError)
+    def replica_failed(error):
+        # A failed read on a replica that no longer passes its check takes it out of
+        # rotation; the client retries on the next healthy one or the primary
+        replica = current_replica()
+        if replica is None or router.check(replica):
+            raise error
+        response = jsonify({'error': 'A database replica failed, try again'})
+        response.status_code = 503
+        response.headers['Retry-After'] = '1'
+        return response
@@ -0,0 +1,52 @@
+import re
+from sqlalchemy import func, or_
+from models import db, Book
+
+# Weight given to title similarity next to ts_rank, so near-miss titles (typos)
+# still rank, below documents that actually match the query terms.
+SIMILARITY_WEIGHT = 0.5
+
+
+def search_terms(q):
+    return re.findall(r'\w+', q.lower())
+
+
+def prefix_tsquery(q):
+    # 'harr pot' -> 'harr:* & pot:*', so type-ahead matches partial words
+    terms = search_terms(q)
+    if not terms:
+        return None
+    return func.to_tsquery('simple', ' & '.join(f'{t}:*' for t in terms))
+
+
+def substring_match(q):
+    return or_(
+        Book.title.ilike(f'%{q}%'),
+        Book.description.ilike(f'%{q}%')
+    )
+
+
+def uses_full_text():
+    return db.engine.dialect.name == 'postgresql'
+
+
+# Returns (condition, rank expression or None). On PostgreSQL a book matches when
+# its search document matches the prefix tsquery, when title/description contain q (the
+# original ILIKE behaviour, now served by the trigram indexes) or when its title is
+# trigram-similar to q. Other databases keep the plain substring match and have no rank.
+def search_filter(q):
+    if not uses_full_text():
+        return substring_match(q), None
+
+    tsquery = prefix_tsquery(q)
+    conditions = [substring_match(q), Book.title.op('%')(q)]
+    rank = func.similarity(Book.title, q) * SIMILARITY_WEIGHT
+    if tsquery is not None:
+        conditions.append(Book.search_vector.op('@@')(tsquery))
+        rank = func.ts_rank(Book.search_vector, tsquery) + rank
+    return or_(*conditions), rank
+
+
+def apply_search(query, q):
+    condition, rank = search_filter(q)
+    return query.filter(condition), rank
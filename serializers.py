@@ -0,0 +1,169 @@
+from sqlalchemy.orm import joinedload, load_only, selectinload
+from models import Book, RecommendedBook
+
+
+def author_name(a):
+    return f'{a.first_name} {a.last_name}'
+
+
+def serialize_ref(obj):
+    return {'id': obj.id, 'name': obj.name} if obj else None
+
+
+# field name -> (Book columns it reads, eager load it needs, value getter)
+BOOK_FIELDS = {
+    'id': ((), None, lambda b: b.id),
+    'title': (('title',), None, lambda b: b.title),
+    'isbn': (('isbn',), None, lambda b: b.isbn),
+    'publication_year': (('publication_year',), None, lambda b: b.publication_year),
+    'pages': (('pages',), None, lambda b: b.pages),
+    'reading_status': (('reading_status',), None, lambda b: b.reading_status),
+    'current_page': (('current_page',), None, lambda b: b.current_page),
+    'rating': (('rating',), None, lambda b: b.rating),
+    'publisher': (('publisher_id',), lambda: joinedload(Book.publisher),
+                  lambda b: serialize_ref(b.publisher)),
+    'authors': ((), lambda: selectinload(Book.authors),
+                lambda b: [{'id': a.id, 'name': author_name(a)} for a in b.authors]),
+    'genres': ((), lambda: selectinload(Book.genres),
+               lambda b: [serialize_ref(g) for g in b.genres]),
+    'series': (('series_id',), lambda: joinedload(Book.series),
+               lambda b: serialize_ref(b.series)),
+    'category': (('category_id',), lambda: joinedload(Book.category),
+                 lambda b: serialize_ref(b.category)),
+}
+BOOK_LIST_FIELDS = tuple(BOOK_FIELDS)
+
+
+def parse_fields(value):
+    if not value:
+        return BOOK_LIST_FIELDS
+    fields = tuple(f for f in (part.strip() for part in value.split(',')) if f)
+    unknown = [f for f in fields if f not in BOOK_FIELDS]
+    if unknown:
+        raise ValueError(f'Unknown fields: {", ".join(unknown)}')
+    return fields if 'id' in fields else ('id',) + fields
+
+
+def book_list_query(fields=BOOK_LIST_FIELDS, extra_columns=()):
+    columns = set(extra_columns)
+    options = []
+    for field in fields:
+        field_columns, loader, _ = BOOK_FIELDS[field]
+        columns.update(field_columns)
+        if loader:
+            options.append(loader())
+    if columns:
+        options.append(load_only(*[getattr(Book, c) for c in sorted(columns)]))
+    return Book.query.options(*options)
+
+
+def book_detail_query():
+    return Book.query.options(
+        joinedload(Book.publisher),
+        joinedload(Book.series),
+        selectinload(Book.authors),
+        selectinload(Book.genres),
+        selectinload(Book.topics)
+    )
+
+
+def book_export_query():
+    return Book.query.options(
+        joinedload(Book.publisher),
+        selectinload(Book.authors)
+    )
+
+
+def recent_books_query(limit=5):
+    return Book.query.options(
+        selectinload(Book.authors)
+    ).order_by(Book.created_at.desc()).limit(limit)
+
+
+def recommendations_query():
+    return RecommendedBook.query.options(
+        selectinload(RecommendedBook.genres)
+    )
+
+
+def serialize_author(a):
+    return {'id': a.id, 'first_name': a.first_name, 'last_name': a.last_name, 'full_name': author_name(a)}
+
+
+def serialize_book(b, fields=BOOK_LIST_FIELDS):
+    return {field: BOOK_FIELDS[field][2](b) for field in fields}
+
+
+def serialize_book_detail(book):
+    return {
+        'id': book.id,
+        'title': book.title,
+        'isbn': book.isbn,
+        'publication_year': book.publication_year,
+        'pages': book.pages,
+        'language': book.language,
+        'description': book.description,
+        'reading_status': book.reading_status,
+        'current_page': book.current_page,
+        'notes': book.notes,
+        'rating': book.rating,
+        'date_started': book.date_started.isoformat() if book.date_started else None,
+        'date_completed': book.date_completed.isoformat() if book.date_completed else None,
+        'publisher_id': book.publisher_id,
+        'series_id': book.series_id,
+        'series_position': book.series_position,
+        'category_id': book.category_id,
+        'author_ids': [a.id for a in book.authors],
+        'genre_ids': [g.id for g in book.genres],
+        'topic_ids': [t.id for t in book.topics],
+        # Names for the form's type-ahead fields, which hold no lists to look them up in
+        'publisher': serialize_ref(book.publisher),
+        'series': serialize_ref(book.series),
+        'authors': [{'id': a.id, 'name': author_name(a)} for a in book.authors]
+    }
+
+
+def serialize_recent_book(b):
+    return {
+        'id': b.id,
+        'title': b.title,
+        'authors': [author_name(a) for a in b.authors]
+    }
+
+
+CSV_HEADER = ['ID', 'Title', 'ISBN', 'Year', 'Pages', 'Authors', 'Publisher', 'Status', 'Rating']
+
+
+def book_csv_row(book):
+    return [
+        book.id, book.title, book.isbn, book.publication_year, book.pages,
+        ', '.join([author_name(a) for a in book.authors]),
+        book.publisher.name if book.publisher else '',
+        book.reading_status, book.rating
+    ]
+
+
+def serialize_book_export(b):
+    return {
+        'title': b.title,
+        'isbn': b.isbn,
+        'year': b.publication_year,
+        'pages': b.pages,
+        'authors': [author_name(a) for a in b.authors],
+        'publisher': b.publisher.name if b.publisher else None,
+        'status': b.reading_status,
+        'rating': b.rating
+    }
+
+
+def serialize_recommendation(rec):
+    return {
+        'id': rec.id,
+        'title': rec.title,
+        'author': rec.author_name,
+        'publication_year': rec.publication_year,
+        'pages': rec.pages,
+        'rating': rec.average_rating,
+        'description': rec.description,
+        'genres': [serialize_ref(g) for g in rec.genres]
+    }
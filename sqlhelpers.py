@@ -0,0 +1,24 @@
+from sqlalchemy import Integer, any_, literal
+from sqlalchemy.dialects import postgresql, sqlite
+
+
+def dialect_insert(bind, table):
+    # INSERT construct with ON CONFLICT support for the bind's dialect (PostgreSQL or SQLite)
+    return (sqlite if bind.dialect.name == 'sqlite' else postgresql).insert(table)
+
+
+def upsert_add(bind, table, key_columns, rows, value_column):
+    # Upsert rows, adding value_column onto the existing value on conflict
+    stmt = dialect_insert(bind, table)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=key_columns,
+        set_={value_column: table.c[value_column] + stmt.excluded[value_column]}
+    )
+    bind.execute(stmt, rows)
+
+
+def id_in(bind, column, ids):
+    # column IN ids; on PostgreSQL as = ANY(array), one parameter however many ids
+    if bind.dialect.name == 'postgresql':
+        return column == any_(literal(list(ids), postgresql.ARRAY(Integer)))
+    return column.in_(ids)
@@ -0,0 +1,187 @@
+from collections import Counter, defaultdict
+from flask import current_app
+from sqlalchemy import Integer, case, cast, delete, func, literal, select, union_all
+from async_queries import run_queries
+from changes import on_book_changes, on_row_counts
+from models import db, Author, Book, Category, Genre, Publisher, LibraryCounter, book_genres
+from replicas import read_from_primary
+from serializers import recent_books_query, serialize_recent_book
+from sqlhelpers import upsert_add
+
+# Present once the counters have been computed from the tables. `flask init-db` and
+# `flask db-upgrade` build them; reads never do, so a GET stays a read on a replica.
+BUILT = 'built'
+TOTALS = {'books': Book, 'authors': Author, 'publishers': Publisher}
+# Breakdown counters are stored as '<prefix>:<value>'
+BREAKDOWNS = {'genre': Genre, 'category': Category, 'publisher': Publisher}
+RECENT_BOOKS = 5
+
+
+def pages_read(state):
+    if state['reading_status'] == 'completed':
+        # coalesce(pages, current_page, 0): a book of 0 pages counts 0
+        return state['pages'] if state['pages'] is not None else (state['current_page'] or 0)
+    if state['reading_status'] == 'reading':
+        return state['current_page'] or 0
+    return 0
+
+
+def book_counters(state):
+    if state is None:
+        return Counter()
+    counters = Counter({'books': 1})
+    # The rebuild only counts statuses that are set
+    if state['reading_status'] is not None:
+        counters[f'status:{state["reading_status"]}'] += 1
+    for genre_id in state['genre_ids']:
+        counters[f'genre:{genre_id}'] += 1
+    for key, column in (('category', 'category_id'), ('publisher', 'publisher_id'),
+                        ('year', 'publication_year'), ('language', 'language')):
+        if state[column] is not None and state[column] != '':
+            counters[f'{key}:{state[column]}'] += 1
+    counters['pages_read'] += pages_read(state)
+    if state['rating'] is not None:
+        counters['rating_sum'] += state['rating']
+        counters['rating_count'] += 1
+    return counters
+
+
+def apply_delta(connection, delta):
+    delta = {key: value for key, value in delta.items() if value}
+    if not delta:
+        return
+    table = LibraryCounter.__table__
+    # In key order, so concurrent writes lock the counter rows in the same order
+    # instead of deadlocking on each other
+    upsert_add(connection, table, ['key'], [{'key': k, 'value': delta[k]} for k in sorted(delta)], 'value')
+    connection.execute(delete(table).where(table.c.key.contains(':'), func.abs(table.c.value) < 1e-9))
+
+
+@on_book_changes
+def books_changed(connection, changes):
+    delta = Counter()
+    for old, new in changes:
+        delta.update(book_counters(new))
+        delta.subtract(book_counters(old))
+    apply_delta(connection, delta)
+
+
+@on_row_counts
+def rows_changed(connection, counts):
+    apply_delta(connection, {key: counts[model.__tablename__] for key, model in TOTALS.items()
+                             if key != 'books' and counts.get(model.__tablename__)})
+
+
+def counters_built():
+    return db.session.execute(select(LibraryCounter.value).where(LibraryCounter.key == BUILT)).first() is not None
+
+
+def book_total():
+    # The maintained counter, or a count while the counters aren't built
+    values = dict(db.session.execute(counters_select().where(LibraryCounter.key.in_(['books', BUILT]))).all())
+    if BUILT in values:
+        return int(values.get('books', 0))
+    return db.session.execute(select(func.count()).select_from(Book)).scalar()
+
+
+def rebuild_counters():
+    read_from_primary()
+    values = Counter({key: db.session.execute(select(func.count()).select_from(model)).scalar()
+                      for key, model in TOTALS.items()})
+    values[BUILT] = 1
+
+    grouped = {
+        'status': Book.reading_status,
+        'category': Book.category_id,
+        'publisher': Book.publisher_id,
+        'year': Book.publication_year,
+        'language': Book.language,
+    }
+    for prefix, column in grouped.items():
+        for value, count in db.session.execute(select(column, func.count()).where(column.isnot(None))
+                                               .group_by(column)):
+            if value != '':
+                values[f'{prefix}:{value}'] = count
+    for genre_id, count in db.session.execute(select(book_genres.c.genre_id, func.count())
+                                              .group_by(book_genres.c.genre_id)):
+        values[f'genre:{genre_id}'] = count
+
+    # Must match pages_read() above
+    pages = case(
+        (Book.reading_status == 'completed', func.coalesce(Book.pages, Book.current_page, 0)),
+        (Book.reading_status == 'reading', func.coalesce(Book.current_page, 0)),
+        else_=0
+    )
+    pages_total, rating_sum, rating_count = db.session.execute(
+        select(func.coalesce(func.sum(pages), 0), func.coalesce(func.sum(Book.rating), 0), func.count(Book.rating))
+    ).one()
+    values.update({'pages_read': pages_total, 'rating_sum': rating_sum, 'rating_count': rating_count})
+
+    table = LibraryCounter.__table__
+    db.session.execute(delete(table))
+    db.session.execute(table.insert(), [{'key': k, 'value': v} for k, v in values.items()])
+    db.session.commit()
+    return values
+
+
+def counters_select():
+    return select(LibraryCounter.key, LibraryCounter.value)
+
+
+def reference_names_select():
+    # Names of the genres, categories and publishers that have counters; selected by
+    # counter key rather than by id list so it can run alongside the counters query
+    selects = []
+    for prefix, model in BREAKDOWNS.items():
+        ids = (select(cast(func.substr(LibraryCounter.key, len(prefix) + 2), Integer))
+               .where(LibraryCounter.key.like(f'{prefix}:%')))
+        selects.append(select(literal(prefix).label('prefix'), model.id, model.name).where(model.id.in_(ids)))
+    return union_all(*selects)
+
+
+def library_summary_queries():
+    return [(counters_select(), 'all'),
+            (reference_names_select(), 'all'),
+            (recent_books_query(RECENT_BOOKS).statement, 'scalars')]
+
+
+def build_library_summary(counter_rows, name_rows, recent_books):
+    values = dict(counter_rows)
+    if BUILT not in values:
+        current_app.logger.warning('Library counters are not built; run `flask rebuild-stats`')
+    names = {(prefix, id): name for prefix, id, name in name_rows}
+    return summarize(values, names, [serialize_recent_book(b) for b in recent_books])
+
+
+# values: counter key -> value; names: (breakdown prefix, id) -> name
+def summarize(values, names, recent_books):
+    breakdowns = defaultdict(dict)
+    for key, value in values.items():
+        prefix, sep, rest = key.partition(':')
+        if sep and value:
+            breakdowns[prefix][rest] = int(value)
+
+    def ranked(prefix):
+        items = [{'id': int(id), 'name': names.get((prefix, int(id))), 'count': count}
+                 for id, count in breakdowns[prefix].items()]
+        return sorted(items, key=lambda item: (-item['count'], item['id']))
+
+    rating_count = values.get('rating_count', 0)
+    return {
+        'total_books': int(values.get('books', 0)),
+        'total_authors': int(values.get('authors', 0)),
+        'total_publishers': int(values.get('publishers', 0)),
+        'reading_status': breakdowns['status'],
+        'pages_read': int(values.get('pages_read', 0)),
+        'average_rating': round(values['rating_sum'] / rating_count, 2) if rating_count else None,
+        'by_year': dict(sorted(breakdowns['year'].items(), key=lambda item: int(item[0]))),
+        'by_language': dict(sorted(breakdowns['language'].items(), key=lambda item: -item[1])),
+        'by_genre': ranked('genre'),
+        'by_category': ranked('category'),
+        'by_publisher': ranked('publisher'),
+        'recent_books': recent_books
+    }
+
+
+def library_summary():
+    return build_library_summary(*run_queries(*library_summary_queries()))
@@ -0,0 +1,89 @@
+from sqlalchemy import case, func, literal, literal_column, or_, select
+from models import db, Author, Book, Publisher, Series, book_authors
+from search import uses_full_text
+
+SUGGEST_LIMIT = 10
+MAX_SUGGEST_LIMIT = 50
+# Shorter queries only match the start of a name (the prefix indexes); substring and
+# typo matches go through the trigram indexes, which need three characters
+TRIGRAM_MIN_LENGTH = 3
+# Match quality, best first
+EXACT, PREFIX, WORD_PREFIX, SUBSTRING, SIMILAR = range(5)
+
+# The full name with an inline ' ', so it matches the expression of the author indexes
+author_full_name = Author.first_name + literal_column("' '") + Author.last_name
+
+# entity -> (model, label, expressions matched by prefix (each has a lower() prefix index
+# in migrations/005_suggest_indexes.sql, as has the label a trigram index), book count or None)
+SUGGEST_ENTITIES = {
+    'authors': (Author, author_full_name, (author_full_name, Author.last_name),
+                select(func.count()).where(book_authors.c.author_id == Author.id)),
+    'publishers': (Publisher, Publisher.name, (Publisher.name,),
+                   select(func.count()).where(Book.publisher_id == Publisher.id)),
+    'series': (Series, Series.name, (Series.name,),
+               select(func.count()).where(Book.series_id == Series.id)),
+    'titles': (Book, Book.title, (Book.title,), None),
+}
+
+
+class SuggestError(ValueError):
+    pass
+
+
+def escape_like(value):
+    return value.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+
+def parse_limit(value):
+    if value is None:
+        return SUGGEST_LIMIT
+    try:
+        limit = int(value)
+    except ValueError:
+        raise SuggestError('limit must be an integer')
+    if not 1 <= limit <= MAX_SUGGEST_LIMIT:
+        raise SuggestError(f'limit must be between 1 and {MAX_SUGGEST_LIMIT}')
+    return limit
+
+
+# Rows of (id, name[, book_count]) for the names matching q, best matches first: exact,
+# then prefix, word prefix, substring and (on PostgreSQL) trigram-similar names. Within
+# a level the most used come first, except similar names, ordered by similarity.
+def suggest(entity, q, limit=None):
+    model, label, prefixed, count = SUGGEST_ENTITIES[entity]
+    limit = parse_limit(limit)
+    q = ' '.join(q.lower().split())
+    if not q:
+        return []
+    pattern = escape_like(q)
+    lowered = func.lower(label)
+
+    def starts(expression, prefix=''):
+        return func.lower(expression).like(f'{prefix}{pattern}%', escape='\\')
+
+    conditions = [starts(expression) for expression in prefixed]
+    fuzzy = uses_full_text() and len(q) >= TRIGRAM_MIN_LENGTH
+    if fuzzy:
+        conditions += [label.ilike(f'%{pattern}%', escape='\\'), label.self_group().op('%')(q)]
+    elif len(q) >= TRIGRAM_MIN_LENGTH:
+        conditions.append(lowered.like(f'%{pattern}%', escape='\\'))
+    match = case(
+        (lowered == q, EXACT),
+        (starts(label), PREFIX),
+        (or_(*[starts(expression) for expression in prefixed[1:]], starts(label, '% ')), WORD_PREFIX),
+        (lowered.like(f'%{pattern}%', escape='\\'), SUBSTRING),
+        else_=SIMILAR,
+    )
+    columns = [model.id.label('id'), label.label('name'), match.label('match'),
+               (func.similarity(label, q) if fuzzy else literal(0)).label('similarity')]
+    if count is not None:
+        columns.append(count.scalar_subquery().label('book_count'))
+    candidates = select(*columns).where(or_(*conditions)).subquery()
+
+    c = candidates.c
+    order = [c.match, case((c.match == SIMILAR, c.similarity), else_=0).desc()]
+    if count is not None:
+        order.append(c.book_count.desc())
+    query = (select(c.id, c.name, *([c.book_count] if count is not None else []))
+             .order_by(*order, c.name, c.id).limit(limit))
+    return db.session.execute(query).all()
@@ -0,0 +1,93 @@
+import os
+import sys
+
+import pytest
+from sqlalchemy import event
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app
+from models import db, Author, Book, Genre, Publisher, Topic, book_authors, book_genres, book_topics
+
+
+def pytest_addoption(parser):
+    parser.addoption('--runslow', action='store_true', help='also run the tests marked slow')
+
+
+def pytest_configure(config):
+    config.addinivalue_line('markers', 'slow: takes minutes, only runs with --runslow')
+
+
+def pytest_collection_modifyitems(config, items):
+    if config.getoption('--runslow'):
+        return
+    skip = pytest.mark.skip(reason='slow, run with --runslow')
+    for item in items:
+        if 'slow' in item.keywords:
+            item.add_marker(skip)
+
+
+@pytest.fixture
+def app(tmp_path):
+    # A scratch SQLite file per test; no job threads, so nothing runs behind the test's back
+    app = create_app({
+        'SQLALCHEMY_DATABASE_URI': 'sqlite:///' + str(tmp_path / 'library.db'),
+        'JOB_WORKERS': 0,
+        'JOB_FOLDER': str(tmp_path / 'jobs'),
+        'CATALOGUE_SNAPSHOT': False,
+        'ASYNC_QUERIES': False,
+        'TESTING': True,
+    })
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.session.remove()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+# Adds books `start` to `total` with an author, a genre and a topic each, in bulk. The
+# first call (start=1) also creates the publisher, authors, genres and topics.
+def fill_library(total, start=1, batch=10000):
+    if start == 1:
+        db.session.execute(Publisher.__table__.insert(), [{'id': 1, 'name': 'Test Press'}])
+        db.session.execute(Author.__table__.insert(),
+                           [{'id': i, 'first_name': 'Author', 'last_name': str(i)} for i in range(1, 101)])
+        db.session.execute(Genre.__table__.insert(), [{'id': i, 'name': f'Genre {i}'} for i in range(1, 11)])
+        db.session.execute(Topic.__table__.insert(), [{'id': i, 'name': f'Topic {i}'} for i in range(1, 11)])
+    for first in range(start, total + 1, batch):
+        ids = range(first, min(first + batch, total + 1))
+        db.session.execute(Book.__table__.insert(), [{
+            'id': i, 'title': f'Book {i}', 'isbn': f'{i:013d}', 'publication_year': 1900 + i % 120,
+            'pages': 100 + i % 900, 'publisher_id': 1, 'reading_status': 'unread', 'current_page': 0,
+            'language': 'English',
+        } for i in ids])
+        db.session.execute(book_authors.insert(), [{'book_id': i, 'author_id': 1 + i % 100} for i in ids])
+        db.session.execute(book_genres.insert(), [{'book_id': i, 'genre_id': 1 + i % 10} for i in ids])
+        db.session.execute(book_topics.insert(), [{'book_id': i, 'topic_id': 1 + i % 10} for i in ids])
+    db.session.commit()
+
+
+class StatementCounter:
+    def __init__(self):
+        self.statements = []
+
+    def __call__(self, conn, cursor, statement, parameters, context, executemany):
+        self.statements.append(statement)
+
+    def __len__(self):
+        return len(self.statements)
+
+    def writes(self):
+        return [s for s in self.statements if not s.lstrip().upper().startswith('SELECT')]
+
+
+@pytest.fixture
+def count_statements(app):
+    counter = StatementCounter()
+    event.listen(db.engine, 'before_cursor_execute', counter)
+    yield counter
+    event.remove(db.engine, 'before_cursor_execute', counter)
@@ -0,0 +1,60 @@
+import pytest
+from conftest import fill_library
+from models import db, Book, LibraryCounter
+
+
+def patch(client, updates):
+    return client.patch('/api/books/batch', json={'updates': updates})
+
+
+def test_batch_update_converts_values_like_the_import(app, client):
+    fill_library(3)
+    response = patch(client, [{'id': 1, 'rating': '4.5', 'pages': '320'}, {'id': 2, 'reading_status': 'reading'}])
+    assert response.status_code == 200
+    assert response.get_json()['ids'] == [1, 2]
+    db.session.expire_all()
+    assert (db.session.get(Book, 1).rating, db.session.get(Book, 1).pages) == (4.5, 320)
+    assert db.session.get(Book, 2).reading_status == 'reading'
+
+
+@pytest.mark.parametrize('update, error', [
+    ({'id': 1, 'rating': 'abc'}, 'rating must be a number'),
+    ({'id': 1, 'rating': 7}, 'rating must be between 0 and 5'),
+    ({'id': 1, 'reading_status': 'lost'}, 'reading_status must be one of'),
+    ({'id': 1, 'reading_status': None}, 'reading_status is required'),
+    ({'id': 1, 'pages': 'many'}, 'pages must be an integer'),
+    ({'id': 1, 'current_page': -3}, 'current_page must not be negative'),
+    ({'id': 1, 'title': ''}, 'title is required'),
+    ({'id': 1, 'notes': {'a': 1}}, 'notes must be a string'),
+])
+def test_batch_update_rejects_invalid_values(app, client, update, error):
+    fill_library(2)
+    response = patch(client, [{'id': 2, 'rating': 3}, update])
+    assert response.status_code == 400
+    assert response.get_json()['error'].startswith('updates[1]: ' + error)
+    db.session.expire_all()
+    assert db.session.get(Book, 2).rating is None
+    assert not LibraryCounter.query.filter(LibraryCounter.key == 'status:lost').count()
+
+
+def test_progress_takes_the_same_values_as_a_batch_update(app, client):
+    fill_library(2)
+    response = client.post('/api/books/1/progress', json={'current_page': '42'})
+    assert response.status_code == 200
+    assert response.get_json() == {'id': 1, 'current_page': 42, 'reading_status': 'reading'}
+    assert patch(client, [{'id': 2, 'current_page': '42'}]).status_code == 200
+    db.session.expire_all()
+    assert db.session.get(Book, 1).current_page == db.session.get(Book, 2).current_page == 42
+
+
+@pytest.mark.parametrize('body, error', [
+    ({}, 'current_page is required'),
+    ({'current_page': 'many'}, 'current_page must be an integer'),
+    ({'current_page': -3}, 'current_page must not be negative'),
+    ({'current_page': 5, 'reading_status': 'lost'}, 'reading_status must be one of'),
+])
+def test_progress_rejects_invalid_values(app, client, body, error):
+    fill_library(1)
+    response = client.post('/api/books/1/progress', json=body)
+    assert response.status_code == 400
+    assert response.get_json()['error'].startswith(error)
@@ -0,0 +1,53 @@
+import base64
+import json
+
+import pytest
+from conftest import fill_library
+
+# Table versions for the ETag, the page, then one selectin load per collection
+BOOK_LIST_STATEMENTS = 4
+
+
+def book_list_statements(client, counter, url):
+    del counter.statements[:]
+    response = client.get(url)
+    assert response.status_code == 200
+    return len(counter), response.get_json()
+
+
+@pytest.mark.parametrize('total', [20, 200])
+def test_book_list_statement_count_does_not_grow_with_rows(app, client, count_statements, total):
+    fill_library(total)
+    statements, payload = book_list_statements(client, count_statements, '/api/books?limit=200')
+    assert len(payload['books']) == total
+    assert statements == BOOK_LIST_STATEMENTS
+
+
+def test_book_list_next_page_statement_count(app, client, count_statements):
+    fill_library(200)
+    _, payload = book_list_statements(client, count_statements, '/api/books?limit=50&sort=-created_at')
+    statements, payload = book_list_statements(
+        client, count_statements, f'/api/books?limit=50&sort=-created_at&cursor={payload["next_cursor"]}')
+    assert len(payload['books']) == 50
+    assert statements == BOOK_LIST_STATEMENTS
+    book = payload['books'][0]
+    assert book['publisher']
+    assert len(book['authors']) == 1 and len(book['genres']) == 1
+
+
+def cursor(data):
+    return base64.urlsafe_b64encode(json.dumps(data).encode('utf-8')).decode('ascii').rstrip('=')
+
+
+@pytest.mark.parametrize('data', [
+    {'s': '-created_at', 'v': 1, 'id': 1},
+    {'s': '-created_at', 'v': 'yesterday', 'id': 1},
+    {'s': 'title', 'v': 'a', 'id': 'x'},
+    ['-created_at', 1],
+])
+def test_malformed_cursor_is_a_bad_request(app, client, data):
+    fill_library(3)
+    sort = data['s'] if isinstance(data, dict) else '-created_at'
+    response = client.get(f'/api/books?sort={sort}&cursor={cursor(data)}')
+    assert response.status_code == 400
+    assert response.get_json()['error'] == 'Invalid cursor'
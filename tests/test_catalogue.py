@@ -0,0 +1,82 @@
+import threading
+
+import pytest
+from sqlalchemy import event
+
+import catalogue
+from app import create_app
+from conftest import StatementCounter
+from models import db, Book, Publisher
+
+
+@pytest.fixture
+def snapshot_app(tmp_path):
+    app = create_app({
+        'SQLALCHEMY_DATABASE_URI': 'sqlite:///' + str(tmp_path / 'library.db'),
+        'JOB_WORKERS': 0,
+        'CATALOGUE_SNAPSHOT': True,
+        'TESTING': True,
+    })
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.session.remove()
+    catalogue.enabled = False
+
+
+TITLES = ['apple', 'Zebra', 'Éclair', 'eclair', 'Ångström', 'zoo', '10 Days', 'Apple', 'äpfel', '_under']
+
+
+def all_pages(client, url):
+    books, cursor = [], None
+    while True:
+        payload = client.get(url + (f'&cursor={cursor}' if cursor else '')).get_json()
+        books += [b['id'] for b in payload['books']]
+        cursor = payload['next_cursor']
+        if not cursor:
+            return books
+
+
+@pytest.mark.parametrize('sort', ['title', '-title'])
+def test_snapshot_and_database_page_in_the_same_title_order(snapshot_app, sort):
+    db.session.add(Publisher(id=1, name='Press'))
+    db.session.add_all(Book(title=title, publisher_id=1) for title in TITLES * 3)
+    db.session.commit()
+    client = snapshot_app.test_client()
+    url = f'/api/books?limit=4&sort={sort}&fields=id,title'
+    from_snapshot = all_pages(client, url)
+    catalogue.enabled = False
+    from_database = all_pages(client, url)
+    assert from_snapshot == from_database
+    assert sorted(from_snapshot) == list(range(1, len(TITLES) * 3 + 1))
+
+
+def test_reads_wait_for_a_rebuild_in_another_thread(snapshot_app):
+    db.session.add(Publisher(id=1, name='Press'))
+    db.session.commit()
+    catalogue.snapshot = None
+    catalogue.lock.acquire()
+    released = threading.Timer(0.2, catalogue.lock.release)
+    released.start()
+    try:
+        assert catalogue.current_catalogue() is not None
+    finally:
+        released.join()
+
+
+def test_title_sorts_go_to_the_database_under_a_linguistic_collation(snapshot_app):
+    count_statements = StatementCounter()
+    event.listen(db.engine, 'before_cursor_execute', count_statements)
+    db.session.add(Publisher(id=1, name='Press'))
+    db.session.add_all(Book(title=title, publisher_id=1) for title in TITLES)
+    db.session.commit()
+    client = snapshot_app.test_client()
+    client.get('/api/books?limit=4')
+    catalogue.snapshot.code_point_titles = False
+
+    del count_statements.statements[:]
+    assert len(client.get('/api/books?limit=4&sort=-created_at').get_json()['books']) == 4
+    assert not any('FROM books' in s for s in count_statements.statements)
+    del count_statements.statements[:]
+    assert len(client.get('/api/books?limit=4').get_json()['books']) == 4
+    assert any('FROM books' in s for s in count_statements.statements)
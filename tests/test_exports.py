@@ -0,0 +1,54 @@
+import json
+import tracemalloc
+
+import pytest
+
+from conftest import fill_library
+from stats import rebuild_counters
+
+FORMATS = ['csv', 'json', 'ndjson']
+# Everything the streamed export holds at once: a few fetch batches of rows and
+# the chunk being written
+PEAK_CEILING = 16 * 1024 * 1024
+
+
+def export_peak(client, fmt):
+    tracemalloc.start()
+    try:
+        response = client.get(f'/api/export/{fmt}?async=0')
+        assert response.status_code == 200
+        size = sum(len(chunk) for chunk in response.response)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return size, peak
+
+
+def export_peaks(client):
+    return {fmt: export_peak(client, fmt) for fmt in FORMATS}
+
+
+# 20k rows by default; the 100k case takes minutes under tracemalloc
+@pytest.mark.parametrize('total', [20000, pytest.param(100000, marks=pytest.mark.slow)])
+def test_export_memory_does_not_grow_with_rows(app, client, total):
+    fill_library(2000)
+    # The first export also fills SQLAlchemy's statement caches
+    export_peaks(client)
+    small = export_peaks(client)
+    fill_library(total, start=2001)
+    large = export_peaks(client)
+    for fmt in FORMATS:
+        (small_size, small_peak), (large_size, large_peak) = small[fmt], large[fmt]
+        assert large_size > 0.9 * total / 2000 * small_size
+        assert large_peak < PEAK_CEILING
+        assert large_peak < 1.5 * small_peak, f'{fmt} export peak grew from {small_peak} to {large_peak} bytes'
+
+
+def test_json_export_takes_the_total_from_the_counters(app, client, count_statements):
+    fill_library(30)
+    rebuild_counters()
+    count_statements.statements.clear()
+    response = client.get('/api/export/json')
+    data = json.loads(response.get_data(as_text=True))
+    assert data['total'] == len(data['books']) == 30
+    assert not [s for s in count_statements.statements if 'count(' in s.lower()]
@@ -0,0 +1,40 @@
+import facets
+from conftest import fill_library
+from models import db, Genre
+
+
+def facet_payload(client, url='/api/books?facets=1&limit=1'):
+    response = client.get(url)
+    assert response.status_code == 200
+    return response.get_json()
+
+
+def test_reading_progress_keeps_the_facet_index(app, client):
+    fill_library(30)
+    client.patch('/api/books/batch', json={'updates': [{'id': 1, 'reading_status': 'reading'}]})
+    assert facet_payload(client)['total'] == 30
+    index = facets.index
+    for page in (10, 20, 30):
+        assert client.post('/api/books/1/progress', json={'current_page': page}).status_code == 200
+    assert client.patch('/api/books/batch', json={'updates': [{'id': 2, 'notes': 'Lent to a friend'}]}).status_code == 200
+    facet_payload(client)
+    assert facets.index is index
+
+
+def test_facet_changes_rebuild_the_facet_index(app, client):
+    fill_library(30)
+    facet_payload(client)
+    index = facets.index
+    client.patch('/api/books/batch', json={'updates': [{'id': 10, 'genre_ids': [2]}, {'id': 3, 'rating': 5}]})
+    payload = facet_payload(client, '/api/books?facets=1&limit=1&rating_min=5')
+    assert facets.index is not index
+    assert payload['total'] == 1
+    genres = {g['id']: g['count'] for g in facet_payload(client)['facets']['genre']}
+    assert genres[2] == 4 and genres[1] == 2
+
+    index = facets.index
+    db.session.get(Genre, 2).name = 'Renamed'
+    db.session.commit()
+    genres = {g['id']: g['name'] for g in facet_payload(client)['facets']['genre']}
+    assert facets.index is not index
+    assert genres[2] == 'Renamed'
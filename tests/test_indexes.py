@@ -0,0 +1,15 @@
+from conftest import fill_library
+from index_check import check_indexes, sqlite_scans
+from models import db
+
+
+def test_checked_queries_use_indexes(app, client):
+    fill_library(500)
+    assert check_indexes(client) == []
+
+
+def test_sqlite_scans_reports_full_table_reads(app):
+    fill_library(10)
+    with db.engine.connect() as conn:
+        assert sqlite_scans(conn, 'SELECT * FROM books WHERE notes = ?', ('x',)) == ['books']
+        assert sqlite_scans(conn, 'SELECT * FROM books WHERE publisher_id = ?', (1,)) == []
@@ -0,0 +1,14 @@
+import pytest
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+
+from models import db
+
+
+def test_failed_statement_leaves_no_start_time(app):
+    with db.engine.connect() as conn:
+        with pytest.raises(OperationalError):
+            conn.execute(text('SELECT * FROM no_such_table'))
+        assert conn.info['statement_start'] == []
+        conn.execute(text('SELECT 1'))
+        assert conn.info['statement_start'] == []
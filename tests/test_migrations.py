@@ -0,0 +1,26 @@
+import os
+import re
+
+from migrate import MIGRATIONS_DIR, migration_files
+from models import db
+
+# Tables of the original schema, which `flask db-upgrade` finds on an existing database
+BASELINE_TABLES = {'authors', 'publishers', 'genres', 'topics', 'categories', 'series', 'books',
+                   'recommended_books', 'book_authors', 'book_genres', 'book_topics', 'series_authors',
+                   'recommended_book_genres'}
+CREATE_TABLE = re.compile(r'CREATE TABLE IF NOT EXISTS (\w+)', re.IGNORECASE)
+TABLE_USE = re.compile(r'(?:CREATE (?:UNIQUE )?INDEX[^;]*? ON|ALTER TABLE|ANALYZE) (\w+)', re.IGNORECASE)
+
+
+def test_migrations_create_tables_before_using_them():
+    # upgrade() itself only creates schema_migrations
+    tables = BASELINE_TABLES | {'schema_migrations'}
+    for name in migration_files():
+        with open(os.path.join(MIGRATIONS_DIR, name), encoding='utf-8') as f:
+            sql = re.sub(r'--[^\n]*', '', f.read())
+        statements = sql.split(';')
+        for statement in statements:
+            tables.update(CREATE_TABLE.findall(statement))
+            for table in TABLE_USE.findall(statement):
+                assert table in tables, f'{name} uses {table} before any migration creates it'
+    assert set(db.metadata.tables) <= tables
@@ -0,0 +1,53 @@
+from jobs import run_next_job
+from models import db, Genre, Job, RecommendedBook, RecommendationScore
+from recommendations import REFRESH_JOB, rebuild_profile
+from conftest import fill_library
+
+
+def add_candidates():
+    genres = Genre.query.order_by(Genre.id).limit(2).all()
+    db.session.add_all(RecommendedBook(title=f'Candidate {i}', author_name='Someone Else', average_rating=i,
+                                       genres=[genres[i % 2]]) for i in range(1, 5))
+    db.session.commit()
+
+
+def test_recommendations_request_only_reads(app, client, count_statements):
+    fill_library(20)
+    add_candidates()
+    rebuild_profile()
+    client.patch('/api/books/batch', json={'updates': [{'id': 1, 'reading_status': 'completed'}]})
+    # The write left the old scores in place and queued one refresh
+    assert RecommendationScore.query.count() == 4
+    assert Job.query.filter_by(kind=REFRESH_JOB, status='queued').count() == 1
+
+    del count_statements.statements[:]
+    response = client.get('/api/recommendations')
+    assert response.status_code == 200
+    assert len(response.get_json()['recommendations']) == 3
+    assert count_statements.writes() == []
+
+
+def test_refresh_job_recomputes_scores_and_changes_the_etag(app, client):
+    fill_library(20)
+    add_candidates()
+    etag = client.get('/api/recommendations').headers['ETag']
+    assert RecommendationScore.query.count() == 0
+    client.patch('/api/books/batch', json={'updates': [{'id': 1, 'reading_status': 'completed'},
+                                                       {'id': 2, 'reading_status': 'completed'}]})
+    assert Job.query.filter_by(kind=REFRESH_JOB).count() == 1
+
+    assert run_next_job(app, app.config['JOB_FOLDER'])
+    db.session.expire_all()
+    assert Job.query.filter_by(kind=REFRESH_JOB).one().status == 'done'
+    assert RecommendationScore.query.count() == 4
+    response = client.get('/api/recommendations', headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert len(response.get_json()['recommendations']) == 3
+
+
+def test_recommendations_fall_back_to_top_rated_before_the_first_refresh(app, client):
+    fill_library(5)
+    add_candidates()
+    assert RecommendationScore.query.count() == 0
+    titles = [r['title'] for r in client.get('/api/recommendations').get_json()['recommendations']]
+    assert titles == ['Candidate 4', 'Candidate 3', 'Candidate 2']
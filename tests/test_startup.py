@@ -0,0 +1,35 @@
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Import plus create_app() of a fresh process. Looser than the benchmark's default
+# budget, which is meant for a quiet machine, so a busy test runner doesn't flake.
+STARTUP_BUDGET_MS = 2000
+RUNS = 3
+
+
+def cold_start(tmp_path):
+    env = dict(os.environ, DATABASE_URL='sqlite:///' + str(tmp_path / 'startup.db'),
+               CATALOGUE_SNAPSHOT='0', JOB_WORKERS='0')
+    output = subprocess.run([sys.executable, os.path.join(ROOT, 'benchmarks', 'startup_bench.py'),
+                             '--child', '--url', ''],
+                            cwd=ROOT, env=env, capture_output=True, text=True, check=True).stdout
+    return json.loads(output.splitlines()[-1])
+
+
+def test_create_app_runs_no_sql_and_fits_the_budget(tmp_path):
+    runs = [cold_start(tmp_path) for _ in range(RUNS)]
+    assert runs[0]['startup_sql'] == []
+    startup_ms = statistics.median(run['import_ms'] + run['create_app_ms'] for run in runs)
+    assert startup_ms < STARTUP_BUDGET_MS
+
+
+def test_optional_engines_load_on_first_use(tmp_path):
+    code = ('from app import create_app; import sys; '
+            f'create_app({{"SQLALCHEMY_DATABASE_URI": "sqlite:///{tmp_path / "lazy.db"}", "JOB_WORKERS": 0}}); '
+            'print("sqlalchemy.ext.asyncio" in sys.modules)')
+    output = subprocess.run([sys.executable, '-c', code], cwd=ROOT, capture_output=True, text=True, check=True)
+    assert output.stdout.strip() == 'False'
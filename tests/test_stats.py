@@ -0,0 +1,38 @@
+from conftest import fill_library
+from models import db, Book, LibraryCounter
+from stats import rebuild_counters
+
+
+def counters():
+    return {row.key: row.value for row in LibraryCounter.query.all()}
+
+
+def test_incremental_counters_match_a_rebuild(app, client):
+    fill_library(20)
+    rebuild_counters()
+    response = client.patch('/api/books/batch', json={'updates': [
+        {'id': 1, 'reading_status': 'completed', 'pages': 0, 'current_page': 50},
+        {'id': 2, 'reading_status': 'completed', 'pages': None, 'current_page': 40},
+        {'id': 3, 'reading_status': 'reading', 'current_page': 12, 'rating': 4},
+    ]})
+    assert response.status_code == 200
+    book = db.session.get(Book, 4)
+    book.reading_status = None
+    db.session.commit()
+
+    incremental = counters()
+    assert 'status:None' not in incremental
+    assert incremental['pages_read'] == 40 + 12
+    assert rebuild_counters() and counters() == incremental
+
+
+def test_stats_request_only_reads(app, client, count_statements):
+    fill_library(20)
+    del count_statements.statements[:]
+    # Counters that were never built are reported as they are, not rebuilt
+    response = client.get('/api/library/stats')
+    assert response.status_code == 200
+    assert response.get_json()['total_books'] == 0
+    assert count_statements.writes() == []
+    rebuild_counters()
+    assert client.get('/api/library/stats').get_json()['total_books'] == 20
@@ -0,0 +1,88 @@
+from flask import Blueprint, current_app, request, jsonify, send_from_directory
+from models import db, Job
+from exports import (iter_export_books, csv_chunks, json_chunks, ndjson_chunks, streaming_download,
+                     export_filename)
+from importer import import_books, read_rows, detect_format
+from jobs import JobError, enqueue, serialize_job
+from stats import book_total
+import io
+
+bp = Blueprint('transfers', __name__)
+
+
+def export_response(fmt, mimetype, chunks):
+    # Exports of large libraries (or with async=1) run as a background job and
+    # answer 202 with the job; smaller ones (or with async=0) stream. chunks gets the
+    # book total, taken once from the counters
+    mode = request.args.get('async')
+    if mode == '1':
+        return job_accepted(enqueue('export', {'format': fmt}))
+    total = book_total()
+    if mode != '0' and total > current_app.config['EXPORT_ASYNC_ROWS']:
+        return job_accepted(enqueue('export', {'format': fmt}))
+    return streaming_download(chunks(total), mimetype, fmt)
+
+
+@bp.route('/api/export/csv')
+def export_csv():
+    return export_response('csv', 'text/csv', lambda total: csv_chunks(iter_export_books()))
+
+
+@bp.route('/api/export/json')
+def export_json():
+    return export_response('json', 'application/json',
+                           lambda total: json_chunks(iter_export_books(), total))
+
+
+@bp.route('/api/export/ndjson')
+def export_ndjson():
+    return export_response('ndjson', 'application/x-ndjson', lambda total: ndjson_chunks(iter_export_books()))
+
+
+def job_accepted(job):
+    response = jsonify(serialize_job(job))
+    response.status_code = 202
+    response.headers['Location'] = f'/api/jobs/{job.id}'
+    return response
+
+
+@bp.route('/api/jobs', methods=['POST'])
+def create_job():
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return jsonify({'error': 'Expected a JSON object with kind and params'}), 400
+    try:
+        return job_accepted(enqueue(data.get('kind'), data.get('params')))
+    except JobError as e:
+        return jsonify({'error': str(e)}), 400
+
+
+@bp.route('/api/jobs/<int:id>')
+def get_job(id):
+    return jsonify(serialize_job(db.get_or_404(Job, id)))
+
+
+@bp.route('/api/jobs/<int:id>/download')
+def download_job(id):
+    job = db.get_or_404(Job, id)
+    if job.status != 'done' or not job.artifact:
+        return jsonify({'error': f'Job {id} has no file ({job.status})'}), 409
+    extension = job.artifact.rsplit('.', 1)[-1]
+    return send_from_directory(current_app.config['JOB_FOLDER'], job.artifact, as_attachment=True,
+                               download_name=export_filename(extension))
+
+
+@bp.route('/api/import', methods=['POST'])
+def import_data():
+    upload = request.files.get('file')
+    if upload:
+        fmt = request.args.get('format') or detect_format(upload.filename, upload.mimetype)
+        stream = upload.stream
+    else:
+        fmt = request.args.get('format') or detect_format(mimetype=request.mimetype)
+        stream = request.stream
+    if fmt not in ('csv', 'ndjson'):
+        return jsonify({'error': 'Specify format=csv or format=ndjson'}), 400
+
+    rows = read_rows(io.TextIOWrapper(stream, encoding='utf-8-sig', newline=''), fmt)
+    return jsonify(import_books(rows))